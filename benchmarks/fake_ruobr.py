@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import base64
+import random
+from datetime import date, timedelta
+
+from aiohttp import web
+
+WRONG_PASSWORD = 'wrong'
+SUBJECTS = (
+    'Математика', 'Русский язык', 'Литература', 'Физика', 'Химия',
+    'История', 'Английский язык', 'Биология', 'География', 'Информатика',
+)
+# Периоды с итоговыми оценками, текущий период и будущий
+PERIODS = ('1 четверть', '2 четверть', '3 четверть', '4 четверть')
+CLOSED_PERIODS = 2
+CURRENT_PERIOD = 3
+
+
+def make_child(child_id: int, number: int) -> dict:
+    return {
+        'birth_date': '2012-09-01',
+        'first_name': f'Ребенок{number}',
+        'group': '5А',
+        'id': child_id,
+        'last_name': 'Тестов',
+        'middle_name': 'Тестович',
+        'readonly': 0,
+        'school': 'МБОУ "СОШ №1"',
+        'school_is_food': 0,
+        'school_is_tourniquet': 0,
+        'school_terrirtory_id': 1,
+        'user_img': '',
+    }
+
+
+def make_lesson(
+        day: date, number: int, child_id: int, tasks: int, task_size: int
+) -> dict:
+    lesson_id = child_id * 100_000 + day.toordinal() % 10_000 * 10 + number
+    start = 8 * 60 + number * 55
+    return {
+        'date': day.isoformat(),
+        'division_subject': number,
+        'division_subject_str': '',
+        'docs_for_lesson': [],
+        'id': lesson_id,
+        'lesson_status_cancel': 0,
+        'staff': 'Иванова И. И.',
+        'staff_id': 1,
+        'subject': SUBJECTS[number % len(SUBJECTS)],
+        'task': [
+            {
+                'deadline': day.isoformat(),
+                'doc': False,
+                'done': 0,
+                'id': lesson_id * 10 + task,
+                'requires_solutions': False,
+                'test_id': None,
+                'title': f'Упражнение {task + 1}: ' + 'x' * task_size,
+                'type': 'task',
+            }
+            for task in range(tasks)
+        ],
+        'time_end': f'{(start + 45) // 60:02}:{(start + 45) % 60:02}:00',
+        'time_start': f'{start // 60:02}:{start % 60:02}:00',
+        'topic': None,
+    }
+
+
+def make_marks(child_id: int, period: int, subject_id: int) -> list[dict]:
+    """Оценки ребенка по предмету: одинаковые при каждом запросе."""
+    if period > CURRENT_PERIOD:
+        return []
+    generator = random.Random(f'{child_id}:{period}:{subject_id}')
+    first_day = date(2022, 9, 1) + timedelta(days=(period - 1) * 63)
+    return [
+        {
+            'id': (child_id * 100 + period * 10 + subject_id) * 100 + number,
+            'date': (first_day + timedelta(days=number * 4)).isoformat(),
+            'mark': str(generator.choice((2, 3, 4, 4, 5, 5))),
+            'question_type': 'Работа на уроке',
+        }
+        for number in range(generator.randint(4, 12))
+    ]
+
+
+class FakeRuobr:
+    """Заменитель API ruobr для нагрузочного тестирования.
+
+    Любой логин и пароль, кроме WRONG_PASSWORD, считается верным.
+    У логинов, начинающихся с multi, двое детей. Ответы отдаются
+    с задержкой latency +- jitter секунд, доля error_rate запросов
+    завершается ошибкой 502. Оценки за первые две четверти закрыты
+    итоговыми, третья четверть - текущая.
+    """
+
+    def __init__(
+            self,
+            latency: float = 0.2,
+            jitter: float = 0.1,
+            error_rate: float = 0.0,
+            lessons: int = 6,
+            tasks: int = 2,
+            task_size: int = 100,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.lessons = lessons
+        self.tasks = tasks
+        self.task_size = task_size
+        self.requests = 0
+        self.errors = 0
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/user/', self.user)
+        app.router.add_get('/timetable2/', self.timetable)
+        app.router.add_get('/controlmark/', self.control_marks)
+        app.router.add_get('/all_marks/{period}/{subject}/', self.all_marks)
+        return app
+
+    async def _delay(self) -> None:
+        self.requests += 1
+        await asyncio.sleep(max(
+            0.0, self.latency + random.uniform(-self.jitter, self.jitter)
+        ))
+        if random.random() < self.error_rate:
+            self.errors += 1
+            raise web.HTTPBadGateway()
+
+    @staticmethod
+    def _username(request: web.Request) -> str:
+        return base64.b64decode(request.headers['username']).decode()
+
+    async def user(self, request: web.Request) -> web.Response:
+        await self._delay()
+        password = base64.b64decode(request.headers['password']).decode()
+        if password == WRONG_PASSWORD:
+            return web.json_response({'success': False, 'error_type': 'auth'})
+        username = self._username(request)
+        # Одинаковый логин - одинаковые id детей
+        base_id = int.from_bytes(username.encode()[-6:], 'big') % 10_000_000
+        children = 2 if username.startswith('MULTI') else 1
+        return web.json_response({
+            'status': 'applicant',
+            'success': True,
+            'childs': [
+                make_child(base_id * 10 + number, number)
+                for number in range(1, children + 1)
+            ],
+        })
+
+    async def timetable(self, request: web.Request) -> web.Response:
+        await self._delay()
+        start = date.fromisoformat(request.query['start'])
+        end = date.fromisoformat(request.query['end'])
+        child_id = int(request.query['child'])
+        lessons = []
+        day = start
+        while day <= end:
+            if day.weekday() < 6:
+                lessons.extend(
+                    make_lesson(
+                        day, number, child_id, self.tasks, self.task_size
+                    )
+                    for number in range(self.lessons)
+                )
+            day += timedelta(days=1)
+        return web.json_response({'success': True, 'lessons': lessons})
+
+    async def control_marks(self, request: web.Request) -> web.Response:
+        await self._delay()
+        child_id = int(request.query['child'])
+        return web.json_response([
+            {
+                'period': period,
+                'title': title,
+                'marks': [
+                    {
+                        'subject_id': subject_id,
+                        'subject': subject,
+                        'mark': (
+                            str(random.Random(
+                                f'{child_id}:{period}:{subject_id}'
+                            ).randint(3, 5))
+                            if period <= CLOSED_PERIODS else None
+                        ),
+                    }
+                    for subject_id, subject in enumerate(SUBJECTS, 1)
+                ],
+            }
+            for period, title in enumerate(PERIODS, 1)
+        ])
+
+    async def all_marks(self, request: web.Request) -> web.Response:
+        await self._delay()
+        child_id = int(request.query['child'])
+        period = int(request.match_info['period'])
+        subject_id = int(request.match_info['subject'])
+        return web.json_response({
+            'success': True,
+            'data': {
+                'subject': SUBJECTS[subject_id - 1],
+                'marks': make_marks(child_id, period, subject_id),
+            },
+        })
+
+
+async def start_fake_ruobr(
+        fake: FakeRuobr, host: str = '127.0.0.1', port: int = 0
+) -> tuple[web.AppRunner, str]:
+    """Запустить сервер и вернуть runner и базовый адрес."""
+    runner = web.AppRunner(fake.create_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner, f'http://{host}:{runner.addresses[0][1]}'
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--ruobr-latency', type=float, default=0.2)
+    parser.add_argument('--ruobr-jitter', type=float, default=0.1)
+    parser.add_argument('--ruobr-error-rate', type=float, default=0.0)
+    parser.add_argument('--lessons', type=int, default=6)
+    parser.add_argument('--tasks', type=int, default=2)
+    parser.add_argument('--task-size', type=int, default=100)
+
+
+def from_arguments(args: argparse.Namespace) -> FakeRuobr:
+    return FakeRuobr(
+        latency=args.ruobr_latency,
+        jitter=args.ruobr_jitter,
+        error_rate=args.ruobr_error_rate,
+        lessons=args.lessons,
+        tasks=args.tasks,
+        task_size=args.task_size,
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake ruobr API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    add_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(
+        from_arguments(args).create_app(), host=args.host, port=args.port
+    )
@@ -0,0 +1,81 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+from aiohttp import web
+
+BOT_ID = 42
+BOT_TOKEN = f'{BOT_ID}:BENCHMARK'
+
+
+class FakeTelegram:
+    """Заменитель Telegram Bot API: на любой метод отвечает успехом
+    с задержкой latency секунд и считает вызовы.
+    """
+
+    def __init__(self, latency: float = 0.03):
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self.sent_bytes = 0
+        self._message_id = 0
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        return app
+
+    def _message(self, params: dict) -> dict:
+        self._message_id += 1
+        return {
+            'message_id': params.get('message_id', self._message_id),
+            'date': int(time.time()),
+            'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+            'text': params.get('text', ''),
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method'].lower()
+        self.calls[method] += 1
+        if request.content_type == 'application/json':
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        self.sent_bytes += len(params.get('text', '').encode())
+        await asyncio.sleep(self.latency)
+        if method == 'getme':
+            result = {
+                'id': BOT_ID, 'is_bot': True, 'first_name': 'Benchmark',
+                'username': 'benchmark_bot',
+            }
+        elif method in ('sendmessage', 'editmessagetext'):
+            result = self._message(params)
+        else:
+            result = True
+        return web.Response(
+            text=json.dumps({'ok': True, 'result': result}),
+            content_type='application/json',
+        )
+
+
+async def start_fake_telegram(
+        fake: FakeTelegram, host: str = '127.0.0.1', port: int = 0
+) -> tuple[web.AppRunner, str]:
+    """Запустить сервер и вернуть runner и базовый адрес."""
+    runner = web.AppRunner(fake.create_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner, f'http://{host}:{runner.addresses[0][1]}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake Telegram Bot API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--latency', type=float, default=0.03)
+    args = parser.parse_args()
+    web.run_app(
+        FakeTelegram(args.latency).create_app(),
+        host=args.host, port=args.port,
+    )
@@ -0,0 +1,261 @@
+"""Нагрузочный тест обработчиков бота.
+
+Поднимает фальшивые ruobr и Telegram Bot API (или использует уже
+запущенные), собирает Dispatcher так же, как bot.py, и прогоняет через
+него сценарии тысяч чатов: вход, выбор ребенка, запросы ДЗ
+и расписания. В конце печатает задержки p50/p95/p99 по типам
+обновлений, пропускную способность и пиковое потребление памяти.
+
+    python -m benchmarks.load --chats 2000 --concurrency 200
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import resource
+import time
+from collections import Counter, defaultdict
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.types import Update
+from cryptography.fernet import Fernet
+from redis.asyncio.client import Redis
+
+from bot import close_dispatcher, create_dispatcher
+from config_data.config import load_config
+from benchmarks import fake_ruobr
+from benchmarks.fake_ruobr import start_fake_ruobr
+from benchmarks.fake_telegram import (
+    BOT_TOKEN, FakeTelegram, start_fake_telegram,
+)
+
+# Доля действий пользователя после входа
+ACTIONS = {
+    'hw_tomorrow': 40,
+    'sch_week': 15,
+    'hw_today': 15,
+    'hw_week': 10,
+    'sch_tomorrow': 10,
+    'child': 5,
+    '/homework': 5,
+    '/marks': 5,
+}
+
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+
+def message_update(chat_id: int, text: str) -> Update:
+    return Update(
+        update_id=next(_update_ids),
+        message={
+            'message_id': next(_message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'User'},
+            'text': text,
+        },
+    )
+
+
+def callback_update(chat_id: int, data: str) -> Update:
+    return Update(
+        update_id=next(_update_ids),
+        callback_query={
+            'id': str(next(_update_ids)),
+            'chat_instance': str(chat_id),
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'User'},
+            'data': data,
+            'message': {
+                'message_id': 1,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': 'menu',
+            },
+        },
+    )
+
+
+def child_button(number: int) -> str:
+    """Кнопка ребенка, 0 - все дети."""
+    return f'child {number} Ребенок{number} Тестов'
+
+
+def build_scenario(
+        chat_id: int, multi: bool, actions: int
+) -> list[tuple[str, Update]]:
+    """Сценарий одного чата: вход и случайные действия."""
+    username = f'multi{chat_id}' if multi else f'user{chat_id}'
+    scenario = [
+        ('/start', message_update(chat_id, '/start')),
+        ('login', message_update(chat_id, f'{username} secret')),
+    ]
+    if multi:
+        scenario.append(('child', callback_update(chat_id, child_button(1))))
+    for action in random.choices(
+            list(ACTIONS), weights=list(ACTIONS.values()), k=actions
+    ):
+        if action == 'child':
+            if not multi:
+                continue
+            update = callback_update(
+                chat_id, child_button(random.randint(0, 2))
+            )
+        elif action.startswith('/'):
+            update = message_update(chat_id, action)
+        else:
+            update = callback_update(chat_id, action)
+        scenario.append((action, update))
+    return scenario
+
+
+def percentile(values: list[float], share: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def print_report(
+        latencies: dict[str, list[float]],
+        errors: Counter[str],
+        elapsed: float,
+) -> None:
+    total = sum(len(values) for values in latencies.values())
+    print(f'{"update":<14}{"count":>8}{"p50, ms":>10}'
+          f'{"p95, ms":>10}{"p99, ms":>10}')
+    for kind in sorted(latencies):
+        values = sorted(latencies[kind])
+        print(
+            f'{kind:<14}{len(values):>8}'
+            f'{percentile(values, 0.5) * 1000:>10.1f}'
+            f'{percentile(values, 0.95) * 1000:>10.1f}'
+            f'{percentile(values, 0.99) * 1000:>10.1f}'
+        )
+    print(f'\nupdates: {total}, errors: {sum(errors.values())}, '
+          f'time: {elapsed:.1f} s, '
+          f'throughput: {total / elapsed:.1f} updates/s')
+    for error, count in errors.most_common():
+        print(f'  {error}: {count}')
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'peak RSS: {peak_rss:.1f} MB')
+
+
+async def run_chat(
+        dp: Dispatcher,
+        bot: Bot,
+        scenario: list[tuple[str, Update]],
+        semaphore: asyncio.Semaphore,
+        latencies: dict[str, list[float]],
+        errors: Counter[str],
+) -> None:
+    """Обработать обновления чата по очереди, как их присылает Telegram."""
+    async with semaphore:
+        for kind, update in scenario:
+            start = time.perf_counter()
+            try:
+                await dp.feed_update(bot, update)
+            except Exception as error:
+                errors[f'{kind}: {type(error).__name__}'] += 1
+            latencies[kind].append(time.perf_counter() - start)
+
+
+def create_redis(url: str) -> Redis:
+    if url == 'fake':
+        try:
+            from fakeredis.aioredis import FakeRedis
+        except ImportError:
+            raise SystemExit('--redis fake requires: pip install fakeredis')
+        return FakeRedis()
+    return Redis.from_url(url)
+
+
+async def main(args: argparse.Namespace) -> None:
+    runners = []
+    fake_ruobr_server = fake_telegram_server = None
+    ruobr_url, telegram_url = args.ruobr_url, args.telegram_url
+    if ruobr_url is None:
+        fake_ruobr_server = fake_ruobr.from_arguments(args)
+        runner, ruobr_url = await start_fake_ruobr(fake_ruobr_server)
+        runners.append(runner)
+    if telegram_url is None:
+        fake_telegram_server = FakeTelegram(args.telegram_latency)
+        runner, telegram_url = await start_fake_telegram(
+            fake_telegram_server
+        )
+        runners.append(runner)
+
+    os.environ['RUOBR_URL'] = ruobr_url
+    os.environ['BOT_TOKEN'] = BOT_TOKEN
+    os.environ.setdefault('ADMIN_IDS', '1')
+    os.environ.setdefault('DB_LINK', 'redis://localhost')
+    os.environ.setdefault('VAULT_KEYS', Fernet.generate_key().decode())
+    os.environ.setdefault('ARCHIVE_PATH', ':memory:')
+    config = load_config()
+    bot = Bot(
+        token=BOT_TOKEN,
+        session=AiohttpSession(
+            api=TelegramAPIServer.from_base(telegram_url)
+        ),
+        parse_mode='HTML',
+    )
+    storage = RedisStorage(create_redis(args.redis))
+    dp = create_dispatcher(config, bot, storage)
+
+    # Разные id чатов в каждом запуске, чтобы не попадать в кэш
+    first_chat = random.randint(1, 10 ** 9)
+    scenarios = [
+        build_scenario(
+            first_chat + number,
+            random.random() < args.multi_share,
+            args.actions,
+        )
+        for number in range(args.chats)
+    ]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: Counter[str] = Counter()
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        run_chat(dp, bot, scenario, semaphore, latencies, errors)
+        for scenario in scenarios
+    ])
+    elapsed = time.perf_counter() - start
+
+    print_report(latencies, errors, elapsed)
+    print(f'gateway: {dp["gateway"].stats()}')
+    print(f'fsm cache: {dp["fsm_cache"].stats()}')
+    if dp['archive'] is not None:
+        print(f'homework archive: {dp["archive"].stats()}')
+    if fake_ruobr_server is not None:
+        print(f'ruobr requests: {fake_ruobr_server.requests}, '
+              f'errors: {fake_ruobr_server.errors}')
+    if fake_telegram_server is not None:
+        print(f'telegram calls: {dict(fake_telegram_server.calls)}, '
+              f'sent: {fake_telegram_server.sent_bytes} bytes')
+
+    await close_dispatcher(dp, bot)
+    await storage.close()
+    for runner in runners:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chats', type=int, default=1000)
+    parser.add_argument('--actions', type=int, default=5,
+                        help='действий каждого чата после входа')
+    parser.add_argument('--concurrency', type=int, default=200,
+                        help='чатов, работающих одновременно')
+    parser.add_argument('--multi-share', type=float, default=0.3,
+                        help='доля аккаунтов с двумя детьми')
+    parser.add_argument('--redis', default='redis://localhost:6379/15',
+                        help='адрес Redis или fake для fakeredis')
+    parser.add_argument('--ruobr-url',
+                        help='адрес запущенного fake_ruobr')
+    parser.add_argument('--telegram-url',
+                        help='адрес запущенного fake_telegram')
+    parser.add_argument('--telegram-latency', type=float, default=0.03)
+    fake_ruobr.add_arguments(parser)
+    asyncio.run(main(parser.parse_args()))
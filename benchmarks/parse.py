@@ -0,0 +1,66 @@
+"""Бенчмарк разбора ответа ruobr.
+
+Сравнивает модели pydantic Subject с компактными Lesson, полученными
+с проверкой типов и без нее, по времени разбора и памяти.
+
+    python -m benchmarks.parse --days 7 --lessons 8 --tasks 3
+"""
+import argparse
+import json
+import timeit
+import tracemalloc
+from datetime import date, timedelta
+
+from benchmarks.fake_ruobr import make_lesson
+from ruobr.ruobr import parse_lessons
+from ruobr.ruobr_cls import Subject
+
+
+def parse_subjects(timetable: list[dict]) -> list[Subject]:
+    """Прежний разбор: полная модель pydantic на каждый урок."""
+    return [Subject(**lesson) for lesson in timetable]
+
+
+def allocated(func, timetable: list[dict]) -> int:
+    """Сколько байт занимает результат разбора."""
+    tracemalloc.start()
+    result = func(timetable)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main(args: argparse.Namespace) -> None:
+    first_day = date(2023, 3, 6)
+    # Как после загрузки из сети: свежие объекты из JSON
+    timetable = json.loads(json.dumps([
+        make_lesson(
+            first_day + timedelta(days=day), number, 1,
+            args.tasks, args.task_size,
+        )
+        for day in range(args.days)
+        for number in range(args.lessons)
+    ]))
+    print(f'{len(timetable)} lessons\n')
+    print(f'{"parser":<24}{"time, us":>10}{"memory, KB":>12}')
+    for name, func in (
+            ('pydantic Subject', parse_subjects),
+            ('Lesson, validated', parse_lessons),
+            ('Lesson, fast', lambda data: parse_lessons(data, False)),
+    ):
+        seconds = min(timeit.repeat(
+            lambda: func(timetable), number=args.number, repeat=5
+        )) / args.number
+        print(f'{name:<24}{seconds * 1_000_000:>10.1f}'
+              f'{allocated(func, timetable) / 1024:>12.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--lessons', type=int, default=8)
+    parser.add_argument('--tasks', type=int, default=3)
+    parser.add_argument('--task-size', type=int, default=100)
+    parser.add_argument('--number', type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,101 @@
+"""Микробенчмарк вывода ДЗ и расписания.
+
+Сравнивает прежнюю сборку строки через += с ruobr.render без кэша
+и с кэшем готовых дней.
+
+    python -m benchmarks.render --days 7 --lessons 8 --tasks 3
+"""
+import argparse
+import timeit
+from datetime import date, timedelta
+
+from benchmarks.fake_ruobr import make_lesson
+from ruobr.render import RenderCache, render_homeworks, render_timetable
+from ruobr.ruobr import parse_homeworks, parse_lessons, parse_timetable
+
+
+def legacy_homeworks_for_print(
+        homeworks: dict[str, dict[str, list[str]]]
+) -> str:
+    """Прежняя реализация get_homeworks_for_print."""
+    hw_for_print = ''
+
+    for day in homeworks:
+        hw_for_print += f'\n\nДомашнее задание на {day}:'
+        for subject in homeworks[day]:
+            hw_for_print += f'\n{subject}: '
+            hw_for_print += ' '.join(homeworks[day][subject])
+
+    if hw_for_print:
+        return hw_for_print
+    return 'Ура! домашки нет.'
+
+
+def legacy_timetable_for_print(
+        timetable: dict[str, dict[str, tuple[str]]]
+) -> str:
+    """Прежняя реализация get_timetable_for_print."""
+    timetable_for_print = ''
+    for day in timetable:
+        timetable_for_print += f'\n\nРасписание на {day}:'
+        for subject in timetable[day]:
+            timetable_for_print += (
+                f'\n{timetable[day][subject][0][:5]}'
+                f'-{timetable[day][subject][1][:5]} {subject}'
+            )
+    if timetable_for_print:
+        return timetable_for_print
+    return 'На указанные даты расписания нет!'
+
+
+def measure(name: str, func, number: int) -> None:
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f'{name:<32}{seconds * 1_000_000:>10.1f} us')
+
+
+def main(args: argparse.Namespace) -> None:
+    first_day = date(2023, 3, 6)
+    lessons = parse_lessons([
+        make_lesson(
+            first_day + timedelta(days=day), number, 1,
+            args.tasks, args.task_size,
+        )
+        for day in range(args.days)
+        for number in range(args.lessons)
+    ])
+    homeworks = parse_homeworks(lessons)
+    timetable = parse_timetable(lessons)
+    cache = RenderCache()
+    pages = render_homeworks(homeworks, cache=cache, key=('bench', 1))
+    print(f'homework: {len(legacy_homeworks_for_print(homeworks))} chars, '
+          f'{len(pages)} page(s)\n')
+
+    measure('homework legacy',
+            lambda: legacy_homeworks_for_print(homeworks), args.number)
+    measure('homework render',
+            lambda: render_homeworks(homeworks), args.number)
+    measure('homework render, cached days',
+            lambda: render_homeworks(
+                homeworks, cache=cache, key=('bench', 1)
+            ),
+            args.number)
+    render_timetable(timetable, cache=cache, key=('bench', 1))
+    measure('timetable legacy',
+            lambda: legacy_timetable_for_print(timetable), args.number)
+    measure('timetable render',
+            lambda: render_timetable(timetable), args.number)
+    measure('timetable render, cached days',
+            lambda: render_timetable(
+                timetable, cache=cache, key=('bench', 1)
+            ),
+            args.number)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--lessons', type=int, default=8)
+    parser.add_argument('--tasks', type=int, default=3)
+    parser.add_argument('--task-size', type=int, default=100)
+    parser.add_argument('--number', type=int, default=2000)
+    main(parser.parse_args())
@@ -0,0 +1,77 @@
+"""Бенчмарк холодного старта бота.
+
+Несколько раз импортирует модуль в новом процессе с python -X importtime
+и показывает медиану времени импорта по пакетам верхнего уровня: сумму
+собственного времени всех их модулей. С --budget завершается с ошибкой,
+если время запуска процесса с импортом больше бюджета в миллисекундах.
+
+    python -m benchmarks.startup --runs 5 --top 15 --budget 1500
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+
+def import_times(module: str) -> tuple[float, dict[str, float]]:
+    """Время запуска процесса с импортом module и собственное время
+    импорта по пакетам верхнего уровня, в миллисекундах.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, check=True,
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    packages: dict[str, float] = defaultdict(float)
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        own, _, name = line[len('import time:'):].split('|')
+        if not own.strip().isdigit():
+            continue
+        packages[name.strip().split('.')[0]] += int(own) / 1000
+    return elapsed, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bot cold start benchmark')
+    parser.add_argument('--module', default='bot')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument(
+        '--budget', type=float, default=None,
+        help='максимальное время запуска с импортом, мс',
+    )
+    args = parser.parse_args()
+
+    elapsed = []
+    runs: dict[str, list[float]] = defaultdict(list)
+    for _ in range(args.runs):
+        total, packages = import_times(args.module)
+        elapsed.append(total)
+        for name, value in packages.items():
+            runs[name].append(value)
+
+    medians = {
+        name: statistics.median(values + [0.0] * (args.runs - len(values)))
+        for name, values in runs.items()
+    }
+    print(f'{"package":<28}{"import, ms":>12}')
+    for name, value in sorted(
+            medians.items(), key=lambda item: item[1], reverse=True
+    )[:args.top]:
+        print(f'{name:<28}{value:>12.1f}')
+    imports = sum(medians.values())
+    startup = statistics.median(elapsed)
+    print(f'\nimports: {imports:.1f} ms, '
+          f'process with imports: {startup:.1f} ms')
+    if args.budget is not None and startup > args.budget:
+        print(f'over budget {args.budget:.0f} ms')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,45 +1,329 @@
 import asyncio
 import logging
+import multiprocessing
+import time
+from typing import TYPE_CHECKING
 
 from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.redis import RedisStorage
 
 from config_data.config import load_config, Config
-from handlers.user_handlers import register_user_handlers
-from keyboards.main_menu import set_main_menu
-from aiogram.fsm.storage.redis import RedisStorage
+from utils.logs import setup_logging
+
+# Обработчики, сервисы и их зависимости импортируются при сборке
+# Dispatcher: родительскому процессу нескольких воркеров они не нужны
+if TYPE_CHECKING:
+    from ruobr.gateway import RuobrGateway
 
 logger = logging.getLogger(__name__)
 
 
 def register_all_handlers(dp: Dispatcher) -> None:
+    from handlers.user_handlers import register_user_handlers
     register_user_handlers(dp)
 
 
-async def main():
-    logging.basicConfig(
-        level=logging.INFO,
-        format=u'%(filename)s:%(lineno)d #%(levelname)-8s '
-               u'[%(asctime)s] - %(name)s - %(message)s'
+def create_dispatcher(
+        config: Config,
+        bot: Bot,
+        storage: RedisStorage,
+        isolated: bool = False,
+) -> Dispatcher:
+    """Собрать Dispatcher со всеми зависимостями и обработчиками."""
+    from middlewares.dedup import CallbackDedupMiddleware
+    from middlewares.metrics import (
+        HandlerMetricsMiddleware, InstrumentedStorage,
+        TelegramMetricsMiddleware,
+    )
+    from middlewares.pacing import OutboundPacingMiddleware
+    from middlewares.scheduler import ChatSchedulerMiddleware
+    from middlewares.session import SessionMiddleware
+    from middlewares.storage import CachedStorage, StorageFlushMiddleware
+    from ruobr.archive import HomeworkArchive
+    from ruobr.cache import ChildrenCache, TimetableCache
+    from ruobr.gateway import RuobrGateway
+    from ruobr.http_pool import RuobrHttpPool
+    from ruobr.marks import MarksService
+    from ruobr.protection import CircuitBreaker, RateLimiter
+    from ruobr.render import RenderCache
+    from ruobr.sessions import RuobrSessionPool
+    from ruobr.vault import CredentialVault
+    from services.digest import DigestScheduler
+    from services.notifications import HomeworkNotifier
+    from services.sender import OutboundSender
+    from utils.metrics import REGISTRY, gauges
+
+    archive: HomeworkArchive | None = (
+        HomeworkArchive(
+            config.archive.path,
+            batch_size=config.archive.batch_size,
+            flush_interval=config.archive.flush_interval,
+        )
+        if config.archive.enabled else None
+    )
+    gateway: RuobrGateway = RuobrGateway(
+        max_workers=config.ruobr.max_workers,
+        concurrency=config.ruobr.concurrency,
+        timeout=config.ruobr.timeout,
+        cache=TimetableCache(
+            storage.redis,
+            ttl=config.ruobr.cache_ttl,
+            local_ttl=config.ruobr.local_cache_ttl,
+            local_max_size=config.ruobr.local_cache_size,
+            stale_ttl=config.ruobr.stale_ttl,
+        ),
+        limiter=RateLimiter(
+            rate=config.ruobr.rate,
+            burst=config.ruobr.burst,
+            account_rate=config.ruobr.account_rate,
+            account_burst=config.ruobr.account_burst,
+        ),
+        breaker=CircuitBreaker(
+            failure_threshold=config.ruobr.breaker_threshold,
+            recovery_timeout=config.ruobr.breaker_recovery,
+        ),
+        validate=config.ruobr.validate,
+        http=RuobrHttpPool(
+            base_url=config.ruobr_http.url,
+            max_connections=config.ruobr_http.max_connections,
+            max_keepalive=config.ruobr_http.max_keepalive,
+            keepalive_expiry=config.ruobr_http.keepalive_expiry,
+            http2=config.ruobr_http.http2,
+            timeout=config.ruobr.timeout,
+        ),
+        archive=archive,
+    )
+    fsm_storage: CachedStorage = CachedStorage(
+        storage,
+        mode=config.fsm_cache.mode,
+        max_size=config.fsm_cache.max_size,
+        ttl=config.fsm_cache.ttl,
+    )
+    vault: CredentialVault = CredentialVault(storage.redis, config.vault.keys)
+    sessions: RuobrSessionPool = RuobrSessionPool(
+        gateway,
+        vault,
+        max_size=config.ruobr.session_max_size,
+        ttl=config.ruobr.session_ttl,
+        children_cache=ChildrenCache(
+            storage.redis, ttl=config.ruobr.children_ttl
+        ),
     )
+    sender: OutboundSender = OutboundSender(
+        bot, storage.redis,
+        rate=config.sender.rate,
+        chat_interval=config.sender.chat_interval,
+        concurrency=config.sender.concurrency,
+        max_attempts=config.sender.max_attempts,
+    )
+    bot.session.middleware(OutboundPacingMiddleware(sender))
+    notifier: HomeworkNotifier = HomeworkNotifier(
+        bot, fsm_storage, gateway, sessions, sender,
+        interval=config.notify.interval,
+        days=config.notify.days,
+        rate=config.notify.rate,
+        concurrency=config.notify.concurrency,
+    )
+    renders: RenderCache = RenderCache(config.ruobr.render_cache_size)
+    digest: DigestScheduler = DigestScheduler(
+        bot, fsm_storage, gateway, sessions, sender, renders,
+        bucket=config.digest.bucket,
+        concurrency=config.digest.concurrency,
+    )
+    sender.blocked_handlers.append(notifier.chat_blocked)
+    sender.blocked_handlers.append(digest.chat_blocked)
+    dedup: CallbackDedupMiddleware = CallbackDedupMiddleware()
+    chat_scheduler: ChatSchedulerMiddleware = ChatSchedulerMiddleware()
+    if config.metrics.enabled:
+        REGISTRY.enabled = True
+        bot.session.middleware(TelegramMetricsMiddleware())
+        REGISTRY.register_collector(lambda: gauges('ruobr_gateway', {
+            **gateway.stats(),
+            'duplicate_callbacks': dedup.coalesced,
+            'superseded_callbacks': chat_scheduler.superseded,
+        }))
+        REGISTRY.register_collector(
+            lambda: gauges('telegram_sender', sender.stats())
+        )
+        REGISTRY.register_collector(
+            lambda: gauges('fsm_cache', fsm_storage.stats())
+        )
+        if archive is not None:
+            REGISTRY.register_collector(
+                lambda: gauges('homework_archive', archive.stats())
+            )
+    dp: Dispatcher = Dispatcher(
+        storage=(
+            InstrumentedStorage(fsm_storage)
+            if config.metrics.enabled else fsm_storage
+        ),
+        # Несколько процессов обрабатывают обновления одного чата по очереди
+        events_isolation=storage.create_isolation() if isolated else None,
+        fsm_cache=fsm_storage,
+        gateway=gateway,
+        sessions=sessions,
+        vault=vault,
+        notifier=notifier,
+        digest=digest,
+        sender=sender,
+        admin_ids=config.tg_bot.admin_ids,
+        dedup=dedup,
+        chat_scheduler=chat_scheduler,
+        renders=renders,
+        archive=archive,
+        ranges=config.range,
+        marks=MarksService(
+            gateway, storage.redis,
+            ttl=config.marks.ttl,
+            recent=config.marks.recent,
+            concurrency=config.marks.concurrency,
+        ),
+    )
+    dp.update.outer_middleware(StorageFlushMiddleware(fsm_storage))
+    dp.callback_query.outer_middleware(dedup)
+    dp.message.middleware(chat_scheduler)
+    dp.callback_query.middleware(chat_scheduler)
+    dp.message.middleware(SessionMiddleware(sessions, vault))
+    dp.callback_query.middleware(SessionMiddleware(sessions, vault))
+    if config.metrics.enabled:
+        dp.message.middleware(HandlerMetricsMiddleware())
+        dp.callback_query.middleware(HandlerMetricsMiddleware())
+
+    register_all_handlers(dp)
+    return dp
+
+
+async def close_dispatcher(dp: Dispatcher, bot: Bot) -> None:
+    """Освободить ресурсы, созданные в create_dispatcher."""
+    gateway: 'RuobrGateway' = dp['gateway']
+    logger.info(
+        'Ruobr gateway stats: %s, duplicate callbacks: %d, '
+        'superseded callbacks: %d',
+        gateway.stats(), dp['dedup'].coalesced,
+        dp['chat_scheduler'].superseded,
+    )
+    logger.info('FSM cache stats: %s', dp['fsm_cache'].stats())
+    await dp['fsm_cache'].stop()
+    if dp['archive'] is not None:
+        logger.info('Homework archive stats: %s', dp['archive'].stats())
+        await dp['archive'].close()
+    gateway.close()
+    await bot.session.close()
+
+
+async def warmup(
+        bot: Bot,
+        storage: RedisStorage,
+        gateway: 'RuobrGateway',
+) -> None:
+    """Установить меню бота и одновременно открыть соединения
+    с Telegram, Redis и подготовить пул запросов к ruobr.
+    """
+    from keyboards.main_menu import set_main_menu
+    await asyncio.gather(
+        set_main_menu(bot),
+        bot.me(),
+        storage.redis.ping(),
+        gateway.warmup(),
+    )
+
+
+async def main(worker: int = 0):
+    setup_logging()
 
     logger.info('Starting bot')
+    started = time.perf_counter()
     config: Config = load_config()
     bot: Bot = Bot(token=config.tg_bot.token, parse_mode='HTML')
     storage: RedisStorage = RedisStorage.from_url(url=config.db.db_link)
-    dp: Dispatcher = Dispatcher(storage=storage)
+    dp: Dispatcher = create_dispatcher(
+        config, bot, storage,
+        isolated=(
+            config.webhook.enabled
+            and config.webhook.workers > 1
+            and not config.queue.enabled
+        ),
+    )
+    created = time.perf_counter()
 
-    await set_main_menu(bot)
+    metrics_runner = None
+    if config.metrics.enabled:
+        # aiohttp.web нужен только для метрик и вебхука
+        from web.metrics import start_metrics_server
+        metrics_runner, _ = await asyncio.gather(
+            start_metrics_server(
+                config.metrics.host, config.metrics.port + worker
+            ),
+            warmup(bot, storage, dp['gateway']),
+        )
+    else:
+        await warmup(bot, storage, dp['gateway'])
+    logger.info(
+        'Started in %.3f s: dispatcher %.3f s, warmup %.3f s',
+        time.perf_counter() - started,
+        created - started,
+        time.perf_counter() - created,
+    )
 
-    register_all_handlers(dp)
+    background_tasks: list[asyncio.Task] = []
+    # Фоновые задачи запускаются только в одном процессе
+    if worker == 0:
+        background_tasks.append(asyncio.create_task(dp['sender'].run()))
+    if config.prefetch.enabled and worker == 0:
+        from services.prefetch import PrefetchScheduler
+        prefetch: PrefetchScheduler = PrefetchScheduler(
+            bot, dp['fsm_cache'], dp['gateway'], dp['sessions'],
+            run_at=config.prefetch.run_at,
+            rate=config.prefetch.rate,
+            concurrency=config.prefetch.concurrency,
+            jitter=config.prefetch.jitter,
+            ttl=config.prefetch.ttl,
+        )
+        background_tasks.append(asyncio.create_task(prefetch.run()))
+    if config.notify.enabled and worker == 0:
+        background_tasks.append(asyncio.create_task(dp['notifier'].run()))
+    if config.digest.enabled and worker == 0:
+        background_tasks.append(asyncio.create_task(dp['digest'].run()))
 
     try:
-        await dp.start_polling(bot)
+        if config.webhook.enabled:
+            from services.queue import UpdateQueue
+            from web.webhook import run_webhook
+            await run_webhook(
+                dp, bot, config.webhook, worker,
+                queue=(
+                    UpdateQueue(storage.redis, config.queue.partitions)
+                    if config.queue.enabled else None
+                ),
+            )
+            await storage.close()
+        else:
+            await dp.start_polling(bot)
     finally:
-        await bot.session.close()
+        for task in background_tasks:
+            task.cancel()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await close_dispatcher(dp, bot)
 
 
-if __name__ == '__main__':
+def run_worker(worker: int = 0) -> None:
     try:
-        asyncio.run(main())
+        asyncio.run(main(worker))
     except (KeyboardInterrupt, SystemExit):
         logger.error('Bot stopped!')
+
+
+if __name__ == '__main__':
+    webhook_config = load_config().webhook
+    if webhook_config.enabled and webhook_config.workers > 1:
+        workers = [
+            multiprocessing.Process(target=run_worker, args=(worker,))
+            for worker in range(webhook_config.workers)
+        ]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+    else:
+        run_worker()
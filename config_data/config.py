@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from datetime import time
 
 from environs import Env
 
@@ -14,10 +15,157 @@ class DatabaseConfig:
     db_link: str
 
 
+@dataclass
+class FsmCacheConfig:
+    mode: str
+    max_size: int
+    ttl: float
+
+
+@dataclass
+class VaultConfig:
+    keys: list[str]
+
+
+@dataclass
+class RuobrConfig:
+    max_workers: int
+    concurrency: int
+    timeout: float
+    session_ttl: float
+    session_max_size: int
+    children_ttl: int
+    cache_ttl: int
+    local_cache_ttl: float
+    local_cache_size: int
+    stale_ttl: int
+    rate: float
+    burst: float
+    account_rate: float
+    account_burst: float
+    breaker_threshold: int
+    breaker_recovery: float
+    render_cache_size: int
+    validate: bool
+
+
+@dataclass
+class RuobrHttpConfig:
+    url: str
+    max_connections: int
+    max_keepalive: int
+    keepalive_expiry: float
+    http2: bool
+
+
+@dataclass
+class RangeConfig:
+    max_days: int
+    chunk_days: int
+    concurrency: int
+    edit_interval: float
+
+
+@dataclass
+class MarksConfig:
+    ttl: int
+    recent: int
+    concurrency: int
+
+
+@dataclass
+class SenderConfig:
+    rate: float
+    chat_interval: float
+    concurrency: int
+    max_attempts: int
+
+
+@dataclass
+class PrefetchConfig:
+    enabled: bool
+    run_at: time
+    rate: float
+    concurrency: int
+    jitter: float
+    ttl: int
+
+
+@dataclass
+class NotifyConfig:
+    enabled: bool
+    interval: float
+    days: int
+    rate: float
+    concurrency: int
+
+
+@dataclass
+class DigestConfig:
+    enabled: bool
+    bucket: int
+    concurrency: int
+
+
+@dataclass
+class ArchiveConfig:
+    enabled: bool
+    path: str
+    batch_size: int
+    flush_interval: float
+
+
+@dataclass
+class WebhookConfig:
+    mode: str
+    url: str
+    path: str
+    host: str
+    port: int
+    secret: str | None
+    workers: int
+    drain_timeout: float
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode == 'webhook'
+
+
+@dataclass
+class QueueConfig:
+    enabled: bool
+    partitions: int
+    workers: int
+    first_worker: int
+    local_workers: int
+    concurrency: int
+
+
+@dataclass
+class MetricsConfig:
+    enabled: bool
+    host: str
+    port: int
+
+
 @dataclass
 class Config:
     tg_bot: TgBot
     db: DatabaseConfig
+    fsm_cache: FsmCacheConfig
+    vault: VaultConfig
+    ruobr: RuobrConfig
+    ruobr_http: RuobrHttpConfig
+    range: RangeConfig
+    marks: MarksConfig
+    sender: SenderConfig
+    prefetch: PrefetchConfig
+    notify: NotifyConfig
+    digest: DigestConfig
+    archive: ArchiveConfig
+    webhook: WebhookConfig
+    queue: QueueConfig
+    metrics: MetricsConfig
 
 
 def load_config(path: str | None = None) -> Config:
@@ -28,5 +176,108 @@ def load_config(path: str | None = None) -> Config:
             token=env('BOT_TOKEN'),
             admin_ids=list(map(int, env.list('ADMIN_IDS'))),
         ),
-        db=DatabaseConfig(db_link=env('DB_LINK'))
+        db=DatabaseConfig(db_link=env('DB_LINK')),
+        fsm_cache=FsmCacheConfig(
+            mode=env('FSM_CACHE_MODE', 'pubsub'),
+            max_size=env.int('FSM_CACHE_SIZE', 10000),
+            ttl=env.float('FSM_CACHE_TTL', 300.0),
+        ),
+        vault=VaultConfig(keys=env.list('VAULT_KEYS')),
+        ruobr=RuobrConfig(
+            max_workers=env.int('RUOBR_MAX_WORKERS', 8),
+            concurrency=env.int('RUOBR_CONCURRENCY', 8),
+            timeout=env.float('RUOBR_TIMEOUT', 15.0),
+            session_ttl=env.float('RUOBR_SESSION_TTL', 1800.0),
+            session_max_size=env.int('RUOBR_SESSION_MAX_SIZE', 1000),
+            children_ttl=env.int('RUOBR_CHILDREN_TTL', 24 * 60 * 60),
+            cache_ttl=env.int('RUOBR_CACHE_TTL', 600),
+            local_cache_ttl=env.float('RUOBR_LOCAL_CACHE_TTL', 60.0),
+            local_cache_size=env.int('RUOBR_LOCAL_CACHE_SIZE', 2000),
+            stale_ttl=env.int('RUOBR_STALE_TTL', 24 * 60 * 60),
+            rate=env.float('RUOBR_RATE', 20.0),
+            burst=env.float('RUOBR_BURST', 40.0),
+            account_rate=env.float('RUOBR_ACCOUNT_RATE', 1.0),
+            account_burst=env.float('RUOBR_ACCOUNT_BURST', 5.0),
+            breaker_threshold=env.int('RUOBR_BREAKER_THRESHOLD', 5),
+            breaker_recovery=env.float('RUOBR_BREAKER_RECOVERY', 30.0),
+            render_cache_size=env.int('RUOBR_RENDER_CACHE_SIZE', 5000),
+            validate=env.bool('RUOBR_VALIDATE', True),
+        ),
+        ruobr_http=RuobrHttpConfig(
+            url=env('RUOBR_URL', 'https://api3d.ruobr.ru'),
+            max_connections=env.int(
+                'RUOBR_MAX_CONNECTIONS', env.int('RUOBR_MAX_WORKERS', 8)
+            ),
+            max_keepalive=env.int('RUOBR_MAX_KEEPALIVE', 8),
+            keepalive_expiry=env.float('RUOBR_KEEPALIVE_EXPIRY', 60.0),
+            http2=env.bool('RUOBR_HTTP2', True),
+        ),
+        range=RangeConfig(
+            max_days=env.int('RANGE_MAX_DAYS', 120),
+            chunk_days=env.int('RANGE_CHUNK_DAYS', 7),
+            concurrency=env.int('RANGE_CONCURRENCY', 4),
+            edit_interval=env.float('RANGE_EDIT_INTERVAL', 1.0),
+        ),
+        marks=MarksConfig(
+            ttl=env.int('MARKS_TTL', 30 * 60),
+            recent=env.int('MARKS_RECENT', 5),
+            concurrency=env.int('MARKS_CONCURRENCY', 4),
+        ),
+        sender=SenderConfig(
+            rate=env.float('SENDER_RATE', 25.0),
+            chat_interval=env.float('SENDER_CHAT_INTERVAL', 1.0),
+            concurrency=env.int('SENDER_CONCURRENCY', 16),
+            max_attempts=env.int('SENDER_MAX_ATTEMPTS', 5),
+        ),
+        prefetch=PrefetchConfig(
+            enabled=env.bool('PREFETCH_ENABLED', True),
+            run_at=env.time('PREFETCH_TIME', '17:00'),
+            rate=env.float('PREFETCH_RATE', 5.0),
+            concurrency=env.int('PREFETCH_CONCURRENCY', 4),
+            jitter=env.float('PREFETCH_JITTER', 1.0),
+            ttl=env.int('PREFETCH_TTL', 6 * 60 * 60),
+        ),
+        notify=NotifyConfig(
+            enabled=env.bool('NOTIFY_ENABLED', True),
+            interval=env.float('NOTIFY_INTERVAL', 30 * 60),
+            days=env.int('NOTIFY_DAYS', 7),
+            rate=env.float('NOTIFY_RATE', 5.0),
+            concurrency=env.int('NOTIFY_CONCURRENCY', 4),
+        ),
+        digest=DigestConfig(
+            enabled=env.bool('DIGEST_ENABLED', True),
+            bucket=env.int('DIGEST_BUCKET', 15),
+            concurrency=env.int('DIGEST_CONCURRENCY', 4),
+        ),
+        archive=ArchiveConfig(
+            enabled=env.bool('ARCHIVE_ENABLED', True),
+            path=env('ARCHIVE_PATH', 'homework.sqlite3'),
+            batch_size=env.int('ARCHIVE_BATCH_SIZE', 500),
+            flush_interval=env.float('ARCHIVE_FLUSH_INTERVAL', 1.0),
+        ),
+        webhook=WebhookConfig(
+            mode=env('BOT_MODE', 'polling'),
+            url=env('WEBHOOK_URL', ''),
+            path=env('WEBHOOK_PATH', '/webhook'),
+            host=env('WEBHOOK_HOST', '127.0.0.1'),
+            port=env.int('WEBHOOK_PORT', 8080),
+            secret=env('WEBHOOK_SECRET', None),
+            workers=env.int('WEBHOOK_WORKERS', 1),
+            drain_timeout=env.float('WEBHOOK_DRAIN_TIMEOUT', 30.0),
+        ),
+        queue=QueueConfig(
+            enabled=env.bool('QUEUE_ENABLED', False),
+            partitions=env.int('QUEUE_PARTITIONS', 16),
+            workers=env.int('QUEUE_WORKERS', 1),
+            first_worker=env.int('QUEUE_FIRST_WORKER', 0),
+            local_workers=env.int(
+                'QUEUE_LOCAL_WORKERS', env.int('QUEUE_WORKERS', 1)
+            ),
+            concurrency=env.int('QUEUE_CONCURRENCY', 64),
+        ),
+        metrics=MetricsConfig(
+            enabled=env.bool('METRICS_ENABLED', False),
+            host=env('METRICS_HOST', '127.0.0.1'),
+            port=env.int('METRICS_PORT', 9100),
+        ),
     )
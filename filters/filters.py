@@ -14,3 +14,10 @@ class UsernamePasswordInMessage(BaseFilter):
             username, password = message.text.strip().split()
             return {'user': UserRuobr(username, password)}
         return False
+
+
+class IsAdmin(BaseFilter):
+    """Пропускает сообщения администраторов из TgBot.admin_ids."""
+
+    async def __call__(self, message: Message, admin_ids: list[int]) -> bool:
+        return message.from_user.id in admin_ids
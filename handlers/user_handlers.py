@@ -1,34 +1,61 @@
-import base64
-from typing import Callable
+import asyncio
+import time
+from datetime import date, datetime
+from typing import Awaitable, Callable
 
-from aiogram import Dispatcher
-from aiogram.filters import Command, Text
-from aiogram.types import Message, CallbackQuery
+from aiogram import Bot, Dispatcher
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject, StateFilter, Text
+from aiogram.types import InlineKeyboardMarkup, Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
-from ruobr_api import Ruobr
+from aiogram.fsm.storage.redis import RedisStorage
+from ruobr_api import Ruobr, AuthenticationException
 
+from config_data.config import RangeConfig
+from keyboards.calendar_kb import create_calendar_keyboard
 from keyboards.children_kb import create_children_keyboard
-from keyboards.inline_kb import create_inline_keyboard
+from keyboards.inline_kb import create_inline_keyboard, create_paging_keyboard
 from utils.statelogin import StateLogin
+from ruobr.archive import HomeworkArchive
+from ruobr.gateway import RuobrGateway
+from ruobr.marks import MarksService
+from ruobr.sessions import ALL_CHILDREN, RuobrSessionPool, UserSession
+from services.digest import DigestScheduler, parse_digest_time
+from services.notifications import HomeworkNotifier
+from services.prefetch import iter_active_users
+from services.sender import OutboundSender
+from ruobr.render import (
+    RenderCache, escape, render_marks, render_sections,
+)
 from ruobr.ruobr import (
-    get_user_ruobr, get_children_for_user,
-    get_homeworks_for_today, get_homeworks_tomorrow_date,
-    get_homeworks_for_week, get_homeworks_for_print,
-    get_timetable_tomorrow_date, get_timetable_for_today,
-    get_timetable_for_week, get_timetable_for_print,
-    get_child,
+    get_account, get_current_date, get_today_period, get_tomorrow_period,
+    get_date_week, parse_homeworks, parse_period, parse_timetable,
+    split_period,
+)
+from ruobr.ruobr_cls import Lesson
+from ruobr.ruobr_exception import (
+    RuobrIsApplicantError, RuobrIsEmptyError, RuobrUnavailableError,
 )
+from ruobr.vault import CredentialVault
 from filters.filters import (
+    IsAdmin,
     UserRuobr,
     UsernamePasswordInMessage,
 )
 from lexicon.lexicon import LEXICON, LEXICON_HOMEWORK_KB, LEXICON_SCHEDULE_KB
 
 
-async def command_start(message: Message, state: FSMContext):
+async def command_start(
+        message: Message,
+        state: FSMContext,
+        session: UserSession | None,
+        sessions: RuobrSessionPool,
+):
     """Обрабатывает команду /start.
     Приветствует пользователя и запрашивает логин/пароль.
     """
+    if session is not None:
+        await sessions.forget(session.token)
     await state.clear()
     await message.answer(text=LEXICON[message.text])
     await state.set_state(StateLogin.GET_USERNAME_PASSWORD)
@@ -37,26 +64,41 @@ async def command_start(message: Message, state: FSMContext):
 async def get_username_password_ruobr(
         message: Message,
         state: FSMContext,
-        user: UserRuobr
+        user: UserRuobr,
+        gateway: RuobrGateway,
+        sessions: RuobrSessionPool,
+        vault: CredentialVault,
 ):
     """Принимает логин и пароль пользователя Rubor."""
-    user_ruobr: Ruobr | None = get_user_ruobr(user.username, user.password)
-    if user_ruobr:
-        await state.update_data(
-            username=base64.b64encode(
-                user.username.upper().encode('UTF-8')
-            ).decode('UTF-8'),
-            password=base64.b64encode(
-                user.password.encode('UTF-8')
-            ).decode('UTF-8')
+    try:
+        user_ruobr: Ruobr | None = await gateway.get_user_ruobr(
+            user.username, user.password
         )
+        if user_ruobr:
+            children: dict[int, str] = await gateway.get_children_for_user(
+                user_ruobr
+            )
+    except RuobrUnavailableError:
+        await message.answer(text=LEXICON['ruobr_unavailable'])
+        return
+    except RuobrIsEmptyError:
+        await message.answer(text=LEXICON['no_children'])
+        return
+    except RuobrIsApplicantError:
+        await message.answer(text=LEXICON['not_parent'])
+        return
+    if user_ruobr:
+        token: str = await vault.store(user.username, user.password)
+        sessions.put(token, user_ruobr)
+        # Список детей сохраняется в кэш и больше не запрашивается
+        await sessions.set_children(token, children)
+        await gateway.invalidate_timetable(user_ruobr.username)
+        await state.update_data(token=token)
         await message.answer(text=LEXICON['authentication'])
-        if len(get_children_for_user(user_ruobr)) > 1:
+        if len(children) > 1:
             await message.answer(
                 text=LEXICON['select_child'],
-                reply_markup=create_children_keyboard(
-                    get_children_for_user(user_ruobr)
-                ),
+                reply_markup=create_children_keyboard(children),
             )
             await state.set_state(StateLogin.GET_CHILD)
         else:
@@ -67,72 +109,510 @@ async def get_username_password_ruobr(
         await state.set_state(StateLogin.GET_USERNAME_PASSWORD)
 
 
-async def command_get_child(message: Message, state: FSMContext):
+async def command_get_child(
+        message: Message,
+        session: UserSession | None,
+):
     """Обрабатывает команду /get_child.
     Предлагает выбрать ребенка из списка.
     """
-    context_data = await state.get_data()
-    user_ruobr = get_user_ruobr(
-        base64.b64decode(context_data.get('username').encode('UTF-8')).decode(
-            'UTF-8'),
-        base64.b64decode(context_data.get('password').encode('UTF-8')).decode(
-            'UTF-8'),
-    )
+    if session is None:
+        await message.answer(text=LEXICON['not_authentication'])
+        return
+    try:
+        children = await session.children()
+    except RuobrUnavailableError:
+        await message.answer(text=LEXICON['ruobr_unavailable'])
+        return
+    except AuthenticationException:
+        await message.answer(text=LEXICON['not_authentication'])
+        return
 
     await message.answer(
         text=LEXICON['select_child'],
-        reply_markup=create_children_keyboard(
-            get_children_for_user(user_ruobr)
-        ),
+        reply_markup=create_children_keyboard(children),
     )
 
 
 async def get_selected_child(
         callback: CallbackQuery,
         state: FSMContext,
+        session: UserSession | None,
 ):
     """Срабатывает на нажатие инлайн-кнопки с ребенком, аутентифицированным
     пользователем.
     """
-    child_id = callback.data.split()[1]
+    if session is None:
+        await callback.answer(text=LEXICON['not_authentication'])
+        return
+    child_id = int(callback.data.split()[1])
+    try:
+        children = await session.children()
+    except RuobrUnavailableError:
+        await callback.answer(text=LEXICON['ruobr_unavailable'])
+        return
+    except AuthenticationException:
+        await callback.answer(text=LEXICON['not_authentication'])
+        return
+    if child_id != ALL_CHILDREN and child_id not in children:
+        await callback.answer(text=LEXICON['select_child'])
+        return
+    # Расписание в кэше хранится по id ребенка, сбрасывать его не нужно
     await state.update_data(child=child_id)
     await state.set_state(StateLogin.GET_COMMAND)
     await callback.answer()
 
 
-async def command_homework(message: Message):
-    """Обрабатывает команду /homework."""
-    await message.answer(
-        text=LEXICON['homework'],
-        reply_markup=create_inline_keyboard(LEXICON_HOMEWORK_KB),
+async def edit_message(
+        message: Message,
+        text: str,
+        reply_markup: InlineKeyboardMarkup | None = None,
+) -> None:
+    """Изменить сообщение бота."""
+    try:
+        await message.edit_text(text=text, reply_markup=reply_markup)
+    except TelegramBadRequest as error:
+        # Повторное нажатие той же кнопки
+        if 'message is not modified' not in error.message:
+            raise
+
+
+async def edit_page(
+        message: Message,
+        pages: list[str],
+        page: int,
+        buttons: dict[str, str],
+        prefix: str,
+) -> tuple[str, int]:
+    """Показать в сообщении бота страницу page многостраничного ответа.
+    Возвращает показанный текст и число страниц.
+    """
+    page = min(max(page, 1), len(pages))
+    await edit_message(
+        message,
+        pages[page - 1],
+        create_paging_keyboard(buttons, prefix, page, len(pages)),
     )
+    return pages[page - 1], len(pages)
 
 
-async def get_homework(callback: CallbackQuery, state: FSMContext):
-    """Обрабатывает нажатие инлайн-кнопок с домашней работой.
-    Возвращает домашнюю работу за указанный на кнопке период."""
-    get_homework: dict[str, Callable[[Ruobr], dict]] = {
-        'hw_today': get_homeworks_for_today,
-        'hw_tomorrow': get_homeworks_tomorrow_date,
-        'hw_week': get_homeworks_for_week,
+async def show_page(
+        callback: CallbackQuery,
+        pages: list[str],
+        page: int,
+        buttons: dict[str, str],
+        prefix: str,
+        answer: str | None = None,
+) -> tuple[str, int]:
+    """Показать страницу page многостраничного ответа и ответить
+    на нажатие кнопки текстом answer.
+    """
+    shown = await edit_page(callback.message, pages, page, buttons, prefix)
+    await callback.answer(text=answer)
+    return shown
+
+
+async def _load_child(
+        session: UserSession,
+        func: Callable[..., Awaitable[dict]],
+        child: int,
+        period: tuple[date, date],
+) -> tuple[dict, bool]:
+    try:
+        return await session.call(func, *period, child=child), False
+    except RuobrUnavailableError as error:
+        if error.stale is None:
+            raise
+        return error.stale, True
+
+
+async def load_sections(
+        session: UserSession,
+        func: Callable[..., Awaitable[dict]],
+        period: tuple[date, date],
+) -> tuple[list[tuple[str, tuple, dict]], str]:
+    """Загрузить данные выбранного ребенка или одновременно всех детей.
+    Возвращает разделы для render_sections и предупреждение, если
+    ruobr не ответил и показаны устаревшие данные.
+    """
+    if session.child == ALL_CHILDREN:
+        children = await session.children()
+    else:
+        children = {session.child: ''}
+    results = await asyncio.gather(*[
+        _load_child(session, func, child, period) for child in children
+    ])
+    sections = [
+        (name, (session.token, child), data)
+        for (child, name), (data, _) in zip(children.items(), results)
+    ]
+    outdated = any(stale for _, stale in results)
+    return sections, LEXICON['outdated'] if outdated else ''
+
+
+async def _refresh_child(
+        session: UserSession,
+        gateway: RuobrGateway,
+        parse: Callable[[list[Lesson]], dict],
+        child: int,
+        period: tuple[date, date],
+        stale: dict,
+) -> tuple[dict, bool]:
+    try:
+        lessons = await session.call(
+            gateway.refresh_timetable, *period, child=child
+        )
+    except (RuobrUnavailableError, AuthenticationException):
+        return stale, True
+    return parse(lessons), False
+
+
+async def show_sections(
+        callback: CallbackQuery,
+        session: UserSession,
+        gateway: RuobrGateway,
+        renders: RenderCache,
+        kind: str,
+        load: Callable[..., Awaitable[dict]],
+        parse: Callable[[list[Lesson]], dict],
+        period: tuple[date, date],
+        page: int,
+        buttons: dict[str, str],
+        prefix: str,
+) -> None:
+    """Показать в сообщении бота данные kind за период.
+
+    Если все дни есть в кэше, но часть из них устарела, сразу
+    показывает данные из кэша со всплывающим «Обновляю...», потом
+    загружает из ruobr данные детей с устаревшими днями и меняет
+    сообщение, только если изменилась показанная страница. Если
+    каких-то дней в кэше нет, данные загружаются через load.
+    """
+    try:
+        if session.child == ALL_CHILDREN:
+            children = await session.children()
+        else:
+            children = {session.child: ''}
+        cached = await asyncio.gather(*[
+            session.call(gateway.peek_timetable, *period, child=child)
+            for child in children
+        ])
+        if not all(cached):
+            sections, outdated = await load_sections(session, load, period)
+            await show_page(
+                callback,
+                render_sections(
+                    kind, sections, header=outdated, cache=renders
+                ),
+                page, buttons, prefix,
+            )
+            return
+    except RuobrUnavailableError:
+        await callback.answer(text=LEXICON['ruobr_unavailable'])
+        return
+    except AuthenticationException:
+        await callback.answer(text=LEXICON['not_authentication'])
+        return
+    data = {
+        child: parse(lessons)
+        for child, (lessons, _) in zip(children, cached)
     }
-    context_data = await state.get_data()
-    user_ruobr: Ruobr = get_user_ruobr(
-        base64.b64decode(context_data.get('username').encode('UTF-8')).decode(
-            'UTF-8'),
-        base64.b64decode(context_data.get('password').encode('UTF-8')).decode(
-            'UTF-8'),
+    stale = [
+        child for child, (_, fresh) in zip(children, cached) if not fresh
+    ]
+
+    def render(header: str = '') -> list[str]:
+        return render_sections(
+            kind,
+            [
+                (name, (session.token, child), data[child])
+                for child, name in children.items()
+            ],
+            header=header,
+            cache=renders,
+        )
+
+    shown = await show_page(
+        callback, render(), page, buttons, prefix,
+        answer=LEXICON['refreshing'] if stale else None,
+    )
+    if not stale:
+        return
+    results = await asyncio.gather(*[
+        _refresh_child(session, gateway, parse, child, period, data[child])
+        for child in stale
+    ])
+    for child, (fresh_data, _) in zip(stale, results):
+        data[child] = fresh_data
+    outdated = any(failed for _, failed in results)
+    pages = render(LEXICON['outdated'] if outdated else '')
+    page = min(max(page, 1), len(pages))
+    if (pages[page - 1], len(pages)) != shown:
+        await edit_page(callback.message, pages, page, buttons, prefix)
+
+
+async def show_homework_range(
+        message: Message,
+        session: UserSession,
+        gateway: RuobrGateway,
+        renders: RenderCache,
+        ranges: RangeConfig,
+        period: tuple[date, date],
+        page: int = 1,
+) -> None:
+    """Показать в сообщении бота домашнюю работу за произвольный период.
+
+    Период делится на части по ranges.chunk_days дней, части всех
+    выбранных детей загружаются одновременно, но не больше
+    ranges.concurrency сразу. Уже закэшированные дни не запрашиваются.
+    Пока остальные части загружаются, не чаще раза в
+    ranges.edit_interval секунд показывается уже загруженное.
+    В памяти хранится только разобранная домашняя работа.
+    """
+    if session.child == ALL_CHILDREN:
+        children = await session.children()
+    else:
+        children = {session.child: ''}
+    semaphore = asyncio.Semaphore(ranges.concurrency)
+
+    async def load(
+            child: int, chunk: tuple[date, date]
+    ) -> tuple[int, tuple[dict, bool]]:
+        async with semaphore:
+            return child, await _load_child(
+                session, gateway.homework_for_date, child, chunk
+            )
+
+    tasks = [
+        asyncio.ensure_future(load(child, chunk))
+        for child in children
+        for chunk in split_period(*period, ranges.chunk_days)
+    ]
+    homeworks: dict[int, dict] = {child: {} for child in children}
+
+    def render(header: str) -> list[str]:
+        return render_sections(
+            'homework',
+            [
+                (name, (session.token, child), dict(
+                    sorted(homeworks[child].items())
+                ))
+                for child, name in children.items()
+            ],
+            header=header,
+            cache=renders,
+        )
+
+    loaded, outdated, failed = 0, False, False
+    last_edit = time.monotonic()
+    try:
+        for future in asyncio.as_completed(tasks):
+            try:
+                child, (homework, stale) = await future
+            except RuobrUnavailableError:
+                failed = True
+                continue
+            homeworks[child].update(homework)
+            outdated = outdated or stale
+            loaded += 1
+            if (
+                loaded < len(tasks)
+                and time.monotonic() - last_edit >= ranges.edit_interval
+            ):
+                await edit_message(
+                    message,
+                    render(LEXICON['loading'].format(loaded, len(tasks)))[0],
+                )
+                last_edit = time.monotonic()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    if not loaded:
+        await edit_message(message, LEXICON['ruobr_unavailable'])
+        return
+    pages = render(
+        LEXICON['partially_loaded'] if failed
+        else LEXICON['outdated'] if outdated
+        else ''
+    )
+    page = min(max(page, 1), len(pages))
+    await edit_message(
+        message,
+        pages[page - 1],
+        create_paging_keyboard(
+            LEXICON_HOMEWORK_KB,
+            f'hwr:{period[0]:%Y%m%d}:{period[1]:%Y%m%d}',
+            page,
+            len(pages),
+        ),
+    )
+
+
+async def command_homework(
+        message: Message,
+        command: CommandObject,
+        session: UserSession | None,
+        gateway: RuobrGateway,
+        renders: RenderCache,
+        ranges: RangeConfig,
+):
+    """Обрабатывает команду /homework.
+    С датой или периодом (/homework 25.03-10.04) сразу присылает
+    домашнюю работу, без них - предлагает выбрать период.
+    """
+    if not command.args:
+        await message.answer(
+            text=LEXICON['homework'],
+            reply_markup=create_inline_keyboard(LEXICON_HOMEWORK_KB),
+        )
+        return
+    if session is None:
+        await message.answer(text=LEXICON['not_authentication'])
+        return
+    try:
+        period = parse_period(command.args)
+    except ValueError:
+        await message.answer(text=LEXICON['wrong_period'])
+        return
+    if (period[1] - period[0]).days >= ranges.max_days:
+        await message.answer(
+            text=LEXICON['long_period'].format(ranges.max_days)
+        )
+        return
+    reply = await message.answer(text=LEXICON['loading_start'])
+    try:
+        await show_homework_range(
+            reply, session, gateway, renders, ranges, period
+        )
+    except RuobrUnavailableError:
+        await edit_message(reply, LEXICON['ruobr_unavailable'])
+    except AuthenticationException:
+        await edit_message(reply, LEXICON['not_authentication'])
+
+
+async def get_homework_range(
+        callback: CallbackQuery,
+        session: UserSession | None,
+        gateway: RuobrGateway,
+        renders: RenderCache,
+        ranges: RangeConfig,
+):
+    """Обрабатывает переход между страницами домашней работы за
+    произвольный период: hwr:начало:конец:страница.
+    """
+    if session is None:
+        await callback.answer(text=LEXICON['not_authentication'])
+        return
+    _, start, end, page = callback.data.split(':')
+    period = (
+        datetime.strptime(start, '%Y%m%d').date(),
+        datetime.strptime(end, '%Y%m%d').date(),
+    )
+    await callback.answer()
+    try:
+        await show_homework_range(
+            callback.message, session, gateway, renders, ranges, period,
+            int(page),
+        )
+    except RuobrUnavailableError:
+        await edit_message(callback.message, LEXICON['ruobr_unavailable'])
+    except AuthenticationException:
+        await edit_message(callback.message, LEXICON['not_authentication'])
+
+
+async def get_calendar(callback: CallbackQuery):
+    """Обрабатывает нажатие кнопки выбора дат. Показывает календарь
+    текущего месяца.
+    """
+    today = get_current_date()
+    await edit_message(
+        callback.message,
+        LEXICON['calendar_start'],
+        create_calendar_keyboard(today.year, today.month),
     )
-    user_ruobr: Ruobr = get_child(user_ruobr)
-    hw: dict = get_homework.get(callback.data)(user_ruobr)
-    hw: str = get_homeworks_for_print(hw)
+    await callback.answer()
 
-    await callback.message.edit_text(
-        text=hw,
-        reply_markup=create_inline_keyboard(LEXICON_HOMEWORK_KB),
+
+async def get_calendar_month(callback: CallbackQuery):
+    """Обрабатывает переход к другому месяцу календаря."""
+    _, start, month = callback.data.split(':')
+    year, month = map(int, month.split('-'))
+    await edit_message(
+        callback.message,
+        LEXICON['calendar_end'].format(
+            date.fromisoformat(start).strftime('%d.%m.%Y')
+        ) if start else LEXICON['calendar_start'],
+        create_calendar_keyboard(
+            year, month, date.fromisoformat(start) if start else None
+        ),
     )
+    await callback.answer()
+
 
+async def get_calendar_day(
+        callback: CallbackQuery,
+        session: UserSession | None,
+        gateway: RuobrGateway,
+        renders: RenderCache,
+        ranges: RangeConfig,
+):
+    """Обрабатывает выбор дня в календаре. Первый выбранный день -
+    начало периода, второй - конец.
+    """
+    _, start, day = callback.data.split(':')
+    day = date.fromisoformat(day)
+    if not start:
+        await edit_message(
+            callback.message,
+            LEXICON['calendar_end'].format(day.strftime('%d.%m.%Y')),
+            create_calendar_keyboard(day.year, day.month, day),
+        )
+        await callback.answer()
+        return
+    if session is None:
+        await callback.answer(text=LEXICON['not_authentication'])
+        return
+    period = tuple(sorted((date.fromisoformat(start), day)))
+    if (period[1] - period[0]).days >= ranges.max_days:
+        await callback.answer(
+            text=LEXICON['long_period'].format(ranges.max_days)
+        )
+        return
     await callback.answer()
+    await edit_message(callback.message, LEXICON['loading_start'])
+    try:
+        await show_homework_range(
+            callback.message, session, gateway, renders, ranges, period
+        )
+    except RuobrUnavailableError:
+        await edit_message(callback.message, LEXICON['ruobr_unavailable'])
+    except AuthenticationException:
+        await edit_message(callback.message, LEXICON['not_authentication'])
+
+
+async def get_homework(
+        callback: CallbackQuery,
+        session: UserSession | None,
+        gateway: RuobrGateway,
+        renders: RenderCache,
+):
+    """Обрабатывает нажатие инлайн-кнопок с домашней работой.
+    Возвращает домашнюю работу за указанный на кнопке период."""
+    get_period: dict[str, Callable[[], tuple[date, date]]] = {
+        'hw_today': get_today_period,
+        'hw_tomorrow': get_tomorrow_period,
+        'hw_week': get_date_week,
+    }
+    period, _, page = callback.data.partition(':')
+    if session is None:
+        await callback.answer(text=LEXICON['not_authentication'])
+        return
+    await show_sections(
+        callback, session, gateway, renders, 'homework',
+        gateway.homework_for_date, parse_homeworks,
+        get_period[period](), int(page or 1), LEXICON_HOMEWORK_KB, period,
+    )
 
 
 async def command_schedule(message: Message):
@@ -143,29 +623,198 @@ async def command_schedule(message: Message):
     )
 
 
-async def get_schedule(callback: CallbackQuery, state: FSMContext):
+async def get_schedule(
+        callback: CallbackQuery,
+        session: UserSession | None,
+        gateway: RuobrGateway,
+        renders: RenderCache,
+):
     """Обрабатывает нажатие инлайн-кнопок с расписанием.
     Возвращает расписание за указанный на кнопке период."""
-    get_timetable: dict[str, Callable[[Ruobr], dict]] = {
-        'sch_today': get_timetable_for_today,
-        'sch_tomorrow': get_timetable_tomorrow_date,
-        'sch_week': get_timetable_for_week,
+    get_period: dict[str, Callable[[], tuple[date, date]]] = {
+        'sch_today': get_today_period,
+        'sch_tomorrow': get_tomorrow_period,
+        'sch_week': get_date_week,
     }
-    context_data = await state.get_data()
-    user_ruobr = get_user_ruobr(
-        base64.b64decode(context_data.get('username').encode('UTF-8')).decode(
-            'UTF-8'),
-        base64.b64decode(context_data.get('password').encode('UTF-8')).decode(
-            'UTF-8'),
-    )
-    user_ruobr = get_child(user_ruobr)
-    timetable: dict = get_timetable.get(callback.data)(user_ruobr)
-    timetable: str = get_timetable_for_print(timetable)
-    await callback.message.edit_text(
-        text=timetable,
-        reply_markup=create_inline_keyboard(LEXICON_SCHEDULE_KB),
+    period, _, page = callback.data.partition(':')
+    if session is None:
+        await callback.answer(text=LEXICON['not_authentication'])
+        return
+    await show_sections(
+        callback, session, gateway, renders, 'timetable',
+        gateway.timetable_for_date, parse_timetable,
+        get_period[period](), int(page or 1), LEXICON_SCHEDULE_KB, period,
     )
-    await callback.answer()
+
+
+async def command_marks(
+        message: Message,
+        session: UserSession | None,
+        marks: MarksService,
+):
+    """Обрабатывает команду /marks.
+    Присылает средние оценки по предметам и итоговые оценки."""
+    if session is None:
+        await message.answer(text=LEXICON['not_authentication'])
+        return
+    try:
+        if session.child == ALL_CHILDREN:
+            children = await session.children()
+        else:
+            children = {session.child: ''}
+        results = await asyncio.gather(*[
+            session.call(marks.summary, child=child) for child in children
+        ])
+    except RuobrUnavailableError:
+        await message.answer(text=LEXICON['ruobr_unavailable'])
+        return
+    except AuthenticationException:
+        await message.answer(text=LEXICON['not_authentication'])
+        return
+    outdated = any(stale for _, stale in results)
+    for page in render_marks(
+            [
+                (name, summary)
+                for name, (summary, _) in zip(children.values(), results)
+            ],
+            header=LEXICON['outdated'] if outdated else '',
+    ):
+        await message.answer(text=page)
+
+
+async def command_subscribe(message: Message, notifier: HomeworkNotifier):
+    """Обрабатывает команду /subscribe."""
+    await notifier.subscribe(message.chat.id, message.from_user.id)
+    await message.answer(text=LEXICON['subscribe'])
+
+
+async def command_unsubscribe(
+        message: Message,
+        notifier: HomeworkNotifier,
+):
+    """Обрабатывает команду /unsubscribe."""
+    await notifier.unsubscribe(message.chat.id, message.from_user.id)
+    await message.answer(text=LEXICON['unsubscribe'])
+
+
+async def command_digest(
+        message: Message,
+        command: CommandObject,
+        digest: DigestScheduler,
+):
+    """Обрабатывает команду /digest: /digest 19:30 включает ежедневную
+    сводку на завтра, /digest off отключает ее.
+    """
+    chat_id, user_id = message.chat.id, message.from_user.id
+    if not command.args:
+        at = await digest.get_time(chat_id, user_id)
+        text = LEXICON['digest_usage']
+        if at is not None:
+            text = (
+                LEXICON['digest_current'].format(at.strftime('%H:%M'))
+                + '\n\n' + text
+            )
+        await message.answer(text=text)
+        return
+    if command.args.strip().lower() == 'off':
+        await digest.unsubscribe(chat_id, user_id)
+        await message.answer(text=LEXICON['digest_off'])
+        return
+    try:
+        at = parse_digest_time(command.args)
+    except ValueError:
+        await message.answer(text=LEXICON['digest_usage'])
+        return
+    at = await digest.subscribe(chat_id, user_id, at)
+    await message.answer(
+        text=LEXICON['digest_on'].format(at.strftime('%H:%M'))
+    )
+
+
+async def command_search(
+        message: Message,
+        command: CommandObject,
+        session: UserSession | None,
+        vault: CredentialVault,
+        archive: HomeworkArchive | None,
+):
+    """Обрабатывает команду /search.
+    Ищет слова в предметах и тексте домашней работы, которую бот уже
+    загружал, не обращаясь к ruobr. Дата или период в запросе
+    ограничивают поиск: /search математика 12.03-19.03.
+    """
+    if archive is None:
+        await message.answer(text=LEXICON['search_disabled'])
+        return
+    if session is None:
+        await message.answer(text=LEXICON['not_authentication'])
+        return
+    words, period = [], None
+    for word in (command.args or '').split():
+        try:
+            period = parse_period(word)
+        except ValueError:
+            words.append(word)
+    if not words:
+        await message.answer(text=LEXICON['search_usage'])
+        return
+    credentials = await vault.load(session.token)
+    if credentials is None:
+        await message.answer(text=LEXICON['not_authentication'])
+        return
+    try:
+        if session.child == ALL_CHILDREN:
+            children = await session.children()
+        else:
+            children = {session.child: ''}
+    except RuobrUnavailableError:
+        await message.answer(text=LEXICON['ruobr_unavailable'])
+        return
+    except AuthenticationException:
+        await message.answer(text=LEXICON['not_authentication'])
+        return
+    found = await archive.search(
+        get_account(credentials.username), list(children),
+        ' '.join(words), period,
+    )
+    if not found:
+        await message.answer(text=LEXICON['search_empty'])
+        return
+    homeworks: dict[int, dict] = {child: {} for child in children}
+    for task in found:
+        homeworks[task.child].setdefault(task.date, {}).setdefault(
+            task.subject, []
+        ).append(task.title)
+    for page in render_sections(
+            'homework',
+            [
+                (name, (), homeworks[child])
+                for child, name in children.items() if homeworks[child]
+            ],
+            header=LEXICON['search_found'].format(len(found)),
+    ):
+        await message.answer(text=page)
+
+
+async def command_broadcast(
+        message: Message,
+        command: CommandObject,
+        bot: Bot,
+        fsm_storage: RedisStorage,
+        sender: OutboundSender,
+):
+    """Обрабатывает команду /broadcast администратора: ставит
+    сообщение в очередь для всех пользователей, вошедших в ruobr.
+    """
+    if not command.args:
+        await message.answer(text=LEXICON['broadcast_empty'])
+        return
+    chat_ids = {
+        key.chat_id
+        async for key, _ in iter_active_users(bot, fsm_storage)
+    }
+    count = await sender.send_many(sorted(chat_ids), escape(command.args))
+    await message.answer(text=LEXICON['broadcast_queued'].format(count))
 
 
 async def command_help(message: Message):
@@ -193,6 +842,7 @@ def register_user_handlers(dp: Dispatcher):
     dp.callback_query.register(
         get_selected_child,
         Text(startswith='child'),
+        StateFilter(StateLogin.GET_CHILD, StateLogin.GET_COMMAND),
     )
     dp.message.register(
         command_get_child,
@@ -209,15 +859,64 @@ def register_user_handlers(dp: Dispatcher):
         Text(startswith='hw_'),
         StateLogin.GET_COMMAND,
     )
+    dp.callback_query.register(
+        get_homework_range,
+        Text(startswith='hwr:'),
+        StateLogin.GET_COMMAND,
+    )
+    dp.callback_query.register(
+        get_calendar,
+        Text(text='calendar'),
+        StateLogin.GET_COMMAND,
+    )
+    dp.callback_query.register(
+        get_calendar_month,
+        Text(startswith='calm:'),
+        StateLogin.GET_COMMAND,
+    )
+    dp.callback_query.register(
+        get_calendar_day,
+        Text(startswith='cal:'),
+        StateLogin.GET_COMMAND,
+    )
     dp.message.register(
         command_schedule,
         Command(commands='schedule'),
         StateLogin.GET_COMMAND,
     )
+    dp.message.register(
+        command_marks,
+        Command(commands='marks'),
+        StateLogin.GET_COMMAND,
+    )
+    dp.message.register(
+        command_subscribe,
+        Command(commands='subscribe'),
+        StateLogin.GET_COMMAND,
+    )
+    dp.message.register(
+        command_unsubscribe,
+        Command(commands='unsubscribe'),
+    )
+    dp.message.register(
+        command_digest,
+        Command(commands='digest'),
+        StateLogin.GET_COMMAND,
+    )
+    dp.message.register(
+        command_search,
+        Command(commands='search'),
+        StateLogin.GET_COMMAND,
+    )
     dp.message.register(
         command_help,
         Command(commands='help'),
     )
+    dp.message.register(
+        command_broadcast,
+        Command(commands='broadcast'),
+        IsAdmin(),
+    )
     dp.callback_query.register(
         get_schedule,
         Text(startswith='sch_'),
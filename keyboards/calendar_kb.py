@@ -0,0 +1,64 @@
+import calendar
+from datetime import date
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from lexicon.lexicon import LEXICON_CALENDAR
+
+
+def create_calendar_keyboard(
+        year: int,
+        month: int,
+        start: date | None = None,
+) -> InlineKeyboardMarkup:
+    """Календарь месяца для выбора периода.
+
+    Первое нажатие на день выбирает начало периода, второе - конец.
+    Начало хранится в самих кнопках: день - cal:начало:день,
+    переход к месяцу - calm:начало:год-месяц.
+    """
+    selected = start.isoformat() if start else ''
+    current = f'calm:{selected}:{year}-{month:02}'
+    previous_year, previous_month = (
+        (year - 1, 12) if month == 1 else (year, month - 1)
+    )
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    calendar_kb: InlineKeyboardBuilder = InlineKeyboardBuilder()
+    calendar_kb.row(
+        InlineKeyboardButton(
+            text='«',
+            callback_data=(
+                f'calm:{selected}:{previous_year}-{previous_month:02}'
+            ),
+        ),
+        InlineKeyboardButton(
+            text=f'{LEXICON_CALENDAR["months"][month - 1]} {year}',
+            callback_data=current,
+        ),
+        InlineKeyboardButton(
+            text='»',
+            callback_data=f'calm:{selected}:{next_year}-{next_month:02}',
+        ),
+    )
+    calendar_kb.row(*[
+        InlineKeyboardButton(text=weekday, callback_data=current)
+        for weekday in LEXICON_CALENDAR['weekdays']
+    ])
+    for week in calendar.Calendar().monthdatescalendar(year, month):
+        calendar_kb.row(*[
+            InlineKeyboardButton(
+                text=(
+                    ' ' if day.month != month
+                    else f'[{day.day}]' if day == start
+                    else str(day.day)
+                ),
+                callback_data=(
+                    current if day.month != month
+                    else f'cal:{selected}:{day.isoformat()}'
+                ),
+            )
+            for day in week
+        ])
+    return calendar_kb.as_markup()
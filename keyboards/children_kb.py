@@ -1,5 +1,7 @@
 from aiogram.utils.keyboard import InlineKeyboardMarkup, InlineKeyboardBuilder
 
+from lexicon.lexicon import LEXICON
+
 
 def create_children_keyboard(children: dict[int, str]) -> InlineKeyboardMarkup:
     children_kb: InlineKeyboardBuilder = InlineKeyboardBuilder()
@@ -8,5 +10,10 @@ def create_children_keyboard(children: dict[int, str]) -> InlineKeyboardMarkup:
             text=f'{child_id}: {children[child_id]}',
             callback_data=f'child {child_id} {children[child_id]}',
         )
+    if len(children) > 1:
+        children_kb.button(
+            text=LEXICON['all_children'],
+            callback_data='child 0',
+        )
     children_kb.adjust(1)
     return children_kb.as_markup()
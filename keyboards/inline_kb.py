@@ -1,4 +1,4 @@
-from aiogram.types import InlineKeyboardMarkup
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 
@@ -11,3 +11,34 @@ def create_inline_keyboard(buttons: dict[str, str]) -> InlineKeyboardMarkup:
         )
     inline_kb.adjust(1)
     return inline_kb.as_markup()
+
+
+def create_paging_keyboard(
+        buttons: dict[str, str],
+        prefix: str,
+        page: int,
+        pages: int,
+) -> InlineKeyboardMarkup:
+    """Клавиатура с кнопками buttons и, если страниц несколько,
+    кнопками перехода между страницами вида prefix:page.
+    """
+    inline_kb: InlineKeyboardBuilder = InlineKeyboardBuilder()
+    for btn in buttons:
+        inline_kb.button(
+            text=buttons[btn],
+            callback_data=btn
+        )
+    inline_kb.adjust(1)
+    if pages > 1:
+        inline_kb.row(
+            InlineKeyboardButton(
+                text='«', callback_data=f'{prefix}:{max(1, page - 1)}'
+            ),
+            InlineKeyboardButton(
+                text=f'{page}/{pages}', callback_data=f'{prefix}:{page}'
+            ),
+            InlineKeyboardButton(
+                text='»', callback_data=f'{prefix}:{min(pages, page + 1)}'
+            ),
+        )
+    return inline_kb.as_markup()
@@ -3,7 +3,12 @@ LEXICON_MAIN_MENU = {
     '/start': 'Перезапуск бота, ввод логина/пароля',
     '/homework': 'Домашнее задание',
     '/schedule': 'Расписание уроков',
+    '/marks': 'Оценки',
     '/get_child': 'Выбрать ребенка',
+    '/subscribe': 'Уведомления о новом ДЗ',
+    '/unsubscribe': 'Отключить уведомления о ДЗ',
+    '/digest': 'Ежедневная сводка на завтра',
+    '/search': 'Поиск по домашнему заданию',
 }
 
 LEXICON = {
@@ -15,24 +20,82 @@ LEXICON = {
         '\n(Например: Ivanov 123456)'
     ),
     'select_child': 'Выберите ребенка:',
+    'all_children': 'Все дети',
     'authentication': 'Логин и пароль верны.',
     'not_authentication': (
         '\nВведите верный логин и пароль в формате:'
         '\nusername password'
     ),
+    'no_children': 'На аккаунте Ruobr не найдено детей.',
+    'not_parent': (
+        'Это не родительский аккаунт Ruobr. Введите логин и пароль'
+        ' родителя в формате:\nusername password'
+    ),
     'homework': 'За кокой период вы хотите посмотреть ДЗ?',
+    'calendar_start': 'Выберите первый день периода:',
+    'calendar_end': 'Начало периода {}. Выберите последний день:',
+    'wrong_period': (
+        'Не удалось разобрать период. Укажите дату или период в формате:'
+        '\n/homework 25.03\n/homework 25.03-10.04'
+    ),
+    'long_period': 'Период не может быть длиннее {} дней.',
+    'loading_start': 'Загрузка...',
+    'loading': 'Загружено {} из {}...',
+    'partially_loaded': 'Ruobr не ответил, загружены не все дни.',
     'schedule': 'За какой период вы хотите посмотреть расписание?',
     'other_answer': 'Я не знаю такой команды!',
+    'ruobr_unavailable': 'Ruobr не отвечает, попробуйте позже.',
+    'outdated': 'Ruobr не отвечает, данные могут быть устаревшими.',
+    'refreshing': 'Обновляю...',
+    'subscribe': (
+        'Уведомления включены. Бот пришлет сообщение, когда появится'
+        ' новое или изменится домашнее задание.'
+    ),
+    'unsubscribe': 'Уведомления отключены.',
+    'homework_changed': 'Новое или измененное домашнее задание:',
+    'digest_usage': (
+        'Укажите, во сколько присылать расписание и домашнее задание'
+        ' на завтра:\n/digest 19:30\nОтключить: /digest off'
+    ),
+    'digest_current': 'Сводка на завтра приходит в {}.',
+    'digest_on': (
+        'Каждый день в {} бот пришлет расписание и домашнее задание'
+        ' на завтра.'
+    ),
+    'digest_off': 'Сводка на завтра отключена.',
+    'digest_header': 'Завтра, {}',
+    'search_usage': (
+        'Укажите, что найти в домашнем задании, и, если нужно, дату'
+        ' или период:\n/search дроби\n/search математика 12.03-19.03'
+    ),
+    'search_empty': 'В сохраненном домашнем задании ничего не найдено.',
+    'search_found': 'Найдено заданий: {}',
+    'search_disabled': 'Поиск по домашнему заданию отключен.',
+    'broadcast_empty': (
+        'Напишите текст рассылки после команды:\n/broadcast текст'
+    ),
+    'broadcast_queued': 'Рассылка поставлена в очередь: {} получателей.',
     '/help': (
         'Доступны команды:\n\n'
         '/start - происходит сброс пароля, для продолжения нужно ввести верные'
         ' логин и пароль для входа на ruobr.ru.\n\n'
         '/get_child - выводит список детей и позволяет выбрать ребенка,'
         ' если ребенок 1, то он автоматически выбирается после успешного ввода'
-        ' логина и пароля.\n\n'
+        ' логина и пароля. Можно выбрать всех детей сразу.\n\n'
         '/homework - позволяет получить список домашней работы на'
-        ' указанный период.\n\n'
+        ' указанный период. Период можно выбрать в календаре или указать'
+        ' в команде: /homework 25.03 или /homework 25.03-10.04.\n\n'
         '/schedule - выводит расписание за указанный период.\n\n'
+        '/marks - средние оценки по предметам за текущий период, их'
+        ' изменение и итоговые оценки.\n\n'
+        '/subscribe - включает уведомления о новом домашнем задании.\n\n'
+        '/unsubscribe - отключает уведомления.\n\n'
+        '/digest 19:30 - каждый день в указанное время присылает'
+        ' расписание и домашнее задание на завтра, /digest off -'
+        ' отключает.\n\n'
+        '/search дроби - ищет в домашнем задании, которое бот уже'
+        ' загружал, можно добавить дату или период: /search математика'
+        ' 12.03-19.03.\n\n'
     ),
 }
 
@@ -40,6 +103,15 @@ LEXICON_HOMEWORK_KB = {
     'hw_today': 'Домашняя работа на сегодня',
     'hw_tomorrow': 'Домашняя работа на завтра',
     'hw_week': 'Домашняя работа до конца недели',
+    'calendar': 'Выбрать даты',
+}
+
+LEXICON_CALENDAR = {
+    'months': (
+        'Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь', 'Июль',
+        'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь',
+    ),
+    'weekdays': ('Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс'),
 }
 
 LEXICON_SCHEDULE_KB = {
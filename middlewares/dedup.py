@@ -0,0 +1,33 @@
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+
+
+class CallbackDedupMiddleware(BaseMiddleware):
+    """Отбрасывает повторные нажатия той же инлайн-кнопки, пока
+    обрабатывается первое нажатие.
+    """
+
+    def __init__(self):
+        self._in_flight: set[tuple] = set()
+        self.coalesced = 0
+
+    async def __call__(
+            self,
+            handler: Callable[[CallbackQuery, dict[str, Any]], Awaitable[Any]],
+            event: CallbackQuery,
+            data: dict[str, Any],
+    ) -> Any:
+        if event.message is None:
+            return await handler(event, data)
+        key = (event.message.chat.id, event.message.message_id, event.data)
+        if key in self._in_flight:
+            self.coalesced += 1
+            await event.answer()
+            return
+        self._in_flight.add(key)
+        try:
+            return await handler(event, data)
+        finally:
+            self._in_flight.discard(key)
@@ -0,0 +1,89 @@
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware, NextRequestMiddlewareType,
+)
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+from utils.metrics import FSM_LATENCY, HANDLER_LATENCY, TELEGRAM_LATENCY
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Измеряет время работы обработчиков. Подключается как внутренний
+    middleware, чтобы знать, какой обработчик выбран.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, dict], Awaitable[Any]],
+            event: TelegramObject,
+            data: dict[str, Any],
+    ) -> Any:
+        handler_object = data.get('handler')
+        name = (
+            handler_object.callback.__name__
+            if handler_object is not None else 'unknown'
+        )
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - start, name)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Измеряет время запросов к Telegram Bot API."""
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            TELEGRAM_LATENCY.observe(
+                time.perf_counter() - start, type(method).__name__
+            )
+
+
+class InstrumentedStorage(BaseStorage):
+    """Обертка над хранилищем FSM, измеряющая время обращений к нему.
+    Остальные атрибуты берутся у исходного хранилища.
+    """
+
+    def __init__(self, storage: BaseStorage):
+        self.storage = storage
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.storage, name)
+
+    async def set_state(
+            self, bot: Bot, key: StorageKey, state: StateType = None
+    ) -> None:
+        with FSM_LATENCY.time('set_state'):
+            await self.storage.set_state(bot=bot, key=key, state=state)
+
+    async def get_state(self, bot: Bot, key: StorageKey) -> str | None:
+        with FSM_LATENCY.time('get_state'):
+            return await self.storage.get_state(bot=bot, key=key)
+
+    async def set_data(
+            self, bot: Bot, key: StorageKey, data: dict[str, Any]
+    ) -> None:
+        with FSM_LATENCY.time('set_data'):
+            await self.storage.set_data(bot=bot, key=key, data=data)
+
+    async def get_data(self, bot: Bot, key: StorageKey) -> dict[str, Any]:
+        with FSM_LATENCY.time('get_data'):
+            return await self.storage.get_data(bot=bot, key=key)
+
+    async def close(self) -> None:
+        await self.storage.close()
@@ -0,0 +1,28 @@
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware, NextRequestMiddlewareType,
+)
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from services.sender import OutboundSender, is_outbound
+
+
+class OutboundPacingMiddleware(BaseRequestMiddleware):
+    """Учитывает ответы обработчиков в лимитах очереди исходящих
+    сообщений, чтобы массовая рассылка уступала им место.
+    """
+
+    def __init__(self, sender: OutboundSender):
+        self.sender = sender
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, 'chat_id', None)
+        if isinstance(chat_id, int) and not is_outbound():
+            self.sender.note_interactive(chat_id)
+        return await make_request(bot, method)
@@ -0,0 +1,66 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, TelegramObject
+
+from ruobr.scheduler import reset_request, set_interactive
+
+
+class ChatSchedulerMiddleware(BaseMiddleware):
+    """Запросы обработчиков к ruobr идут в очередь чата с приоритетом
+    над фоновыми (см. FairScheduler).
+
+    Новое нажатие кнопки под сообщением отменяет еще не законченную
+    обработку предыдущего нажатия под ним же: загружается
+    и показывается только последнее.
+    """
+
+    def __init__(self):
+        self._presses: dict[tuple[int, int], asyncio.Task] = {}
+        self._superseded: set[asyncio.Task] = set()
+        self.superseded = 0
+
+    def supersede(self, chat_id: int, message_id: int) -> None:
+        """Отменить обработку нажатия под сообщением message_id."""
+        task = self._presses.pop((chat_id, message_id), None)
+        if task is not None and not task.done():
+            task.cancel()
+            self._superseded.add(task)
+            self.superseded += 1
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, dict], Awaitable[Any]],
+            event: TelegramObject,
+            data: dict[str, Any],
+    ) -> Any:
+        chat = data.get('event_chat')
+        user = data.get('event_from_user')
+        chat_id = chat.id if chat is not None else getattr(user, 'id', None)
+        token = set_interactive(chat_id)
+        try:
+            if not isinstance(event, CallbackQuery) or event.message is None:
+                return await handler(event, data)
+            key = (event.message.chat.id, event.message.message_id)
+            self.supersede(*key)
+            task = asyncio.create_task(handler(event, data))
+            self._presses[key] = task
+            try:
+                return await task
+            except asyncio.CancelledError:
+                # Отменено не нажатие, а обработка всего обновления
+                if task not in self._superseded:
+                    raise
+            finally:
+                self._superseded.discard(task)
+                if self._presses.get(key) is task:
+                    del self._presses[key]
+        finally:
+            reset_request(token)
+        # Нажатие устарело: убрать часы с кнопки
+        try:
+            await event.answer()
+        except TelegramBadRequest:
+            pass
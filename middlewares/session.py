@@ -0,0 +1,40 @@
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.context import FSMContext
+from aiogram.types import TelegramObject
+
+from ruobr.sessions import RuobrSessionPool, UserSession
+from ruobr.vault import CredentialVault
+from utils.credentials import get_token
+
+
+class SessionMiddleware(BaseMiddleware):
+    """Передает в обработчик session: UserSession по токену и номеру
+    ребенка из данных состояния или None, если пользователь не вошел.
+
+    Токен читается, только если обработчик принимает session.
+    """
+
+    def __init__(self, pool: RuobrSessionPool, vault: CredentialVault):
+        self.pool = pool
+        self.vault = vault
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, dict], Awaitable[Any]],
+            event: TelegramObject,
+            data: dict[str, Any],
+    ) -> Any:
+        spec = data['handler'].spec
+        if 'session' in spec.args or 'session' in spec.kwonlyargs:
+            state: FSMContext = data['state']
+            context_data = await state.get_data()
+            token = await get_token(state, self.vault, context_data)
+            data['session'] = (
+                UserSession(
+                    token, self.pool, int(context_data.get('child', 1))
+                )
+                if token is not None else None
+            )
+        return await handler(event, data)
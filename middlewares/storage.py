@@ -0,0 +1,248 @@
+import asyncio
+import copy
+import json
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.types import TelegramObject
+
+from utils.metrics import CACHE_REQUESTS, FSM_ROUND_TRIPS
+
+logger = logging.getLogger(__name__)
+
+INVALIDATE_CHANNEL = 'ruobr:fsm:invalidate'
+# off - без кэша между обновлениями, local - кэш для одного процесса,
+# pubsub - кэш, который сбрасывается по сообщениям других процессов
+CACHE_MODES = ('off', 'local', 'pubsub')
+
+_MISSING = object()
+
+
+class UpdateContext:
+    """Отложенные записи и число обращений к Redis одного обновления."""
+
+    __slots__ = ('writes', 'round_trips', 'closed')
+
+    def __init__(self):
+        self.writes: dict[str, tuple[str | None, Any]] = {}
+        self.round_trips = 0
+        self.closed = False
+
+
+_update: ContextVar[UpdateContext | None] = ContextVar('update', default=None)
+
+
+class CachedStorage(BaseStorage):
+    """Хранилище FSM поверх RedisStorage с кэшем в памяти процесса.
+
+    Состояние и данные читаются из LRU-кэша на max_size ключей, записи
+    живут в нем не дольше ttl секунд. Внутри обработки обновления
+    (см. StorageFlushMiddleware) записи откладываются и уходят в Redis
+    одним pipeline после обработчика, вне обновления - сразу.
+    В режиме pubsub процесс публикует измененные ключи, а остальные
+    процессы удаляют их из своего кэша. Остальные атрибуты берутся
+    у исходного хранилища.
+    """
+
+    def __init__(
+            self,
+            storage: RedisStorage,
+            mode: str = 'pubsub',
+            max_size: int = 10000,
+            ttl: float = 300,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f'Unknown FSM cache mode: {mode}')
+        self.storage = storage
+        self.redis = storage.redis
+        self.key_builder = storage.key_builder
+        self.mode = mode
+        self.max_size = max_size
+        self.ttl = ttl
+        self.instance = secrets.token_hex(8)
+        self._cache: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._listener: asyncio.Task | None = None
+        self.round_trips = 0
+        self.flushes = 0
+        self.invalidated = 0
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.storage, name)
+
+    def _count(self) -> None:
+        self.round_trips += 1
+        context = _update.get()
+        if context is not None:
+            context.round_trips += 1
+
+    def _get_cached(self, redis_key: str) -> Any:
+        context = _update.get()
+        if context is not None and redis_key in context.writes:
+            return context.writes[redis_key][1]
+        if self.mode == 'off':
+            return _MISSING
+        if self.mode == 'pubsub' and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+        entry = self._cache.get(redis_key)
+        if entry is None or entry[0] < time.monotonic():
+            CACHE_REQUESTS.inc('fsm', 'miss')
+            return _MISSING
+        self._cache.move_to_end(redis_key)
+        CACHE_REQUESTS.inc('fsm', 'hit')
+        return entry[1]
+
+    def _set_cached(self, redis_key: str, value: Any) -> None:
+        if self.mode == 'off':
+            return
+        self._cache[redis_key] = (time.monotonic() + self.ttl, value)
+        self._cache.move_to_end(redis_key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    async def _read(self, redis_key: str) -> Any:
+        value = self._get_cached(redis_key)
+        if value is _MISSING:
+            self._count()
+            value = await self.redis.get(redis_key)
+            if isinstance(value, bytes):
+                value = value.decode('utf-8')
+            self._set_cached(redis_key, value)
+        return value
+
+    async def _write(
+            self, redis_key: str, raw: str | None, value: Any
+    ) -> None:
+        self._set_cached(redis_key, value)
+        context = _update.get()
+        if context is not None and not context.closed:
+            context.writes[redis_key] = (raw, value)
+            return
+        await self.flush({redis_key: (raw, value)})
+
+    async def flush(self, writes: dict[str, tuple[str | None, Any]]) -> None:
+        """Записать изменения в Redis одним pipeline."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for redis_key, (raw, _) in writes.items():
+                if raw is None:
+                    pipe.delete(redis_key)
+                else:
+                    ttl = (
+                        self.storage.state_ttl
+                        if redis_key.endswith(':state')
+                        else self.storage.data_ttl
+                    )
+                    pipe.set(redis_key, raw, ex=ttl)
+            if self.mode == 'pubsub':
+                pipe.publish(
+                    INVALIDATE_CHANNEL,
+                    json.dumps([self.instance, list(writes)]),
+                )
+            await pipe.execute()
+        self._count()
+        self.flushes += 1
+
+    async def _listen(self) -> None:
+        """Удалять из кэша ключи, измененные другими процессами."""
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATE_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message['type'] != 'message':
+                            continue
+                        instance, keys = json.loads(message['data'])
+                        if instance == self.instance:
+                            continue
+                        for redis_key in keys:
+                            self._cache.pop(redis_key, None)
+                        self.invalidated += len(keys)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('FSM cache invalidation failed')
+            # Сообщения могли потеряться
+            self._cache.clear()
+            await asyncio.sleep(1)
+
+    async def set_state(
+            self, bot: Bot, key: StorageKey, state: StateType = None
+    ) -> None:
+        value = state.state if isinstance(state, State) else state
+        await self._write(self.key_builder.build(key, 'state'), value, value)
+
+    async def get_state(self, bot: Bot, key: StorageKey) -> str | None:
+        return await self._read(self.key_builder.build(key, 'state'))
+
+    async def set_data(
+            self, bot: Bot, key: StorageKey, data: dict[str, Any]
+    ) -> None:
+        data = copy.deepcopy(data)
+        await self._write(
+            self.key_builder.build(key, 'data'),
+            bot.session.json_dumps(data) if data else None,
+            data,
+        )
+
+    async def get_data(self, bot: Bot, key: StorageKey) -> dict[str, Any]:
+        value = await self._read(self.key_builder.build(key, 'data'))
+        if value is None:
+            return {}
+        if isinstance(value, str):
+            value = bot.session.json_loads(value)
+            self._set_cached(self.key_builder.build(key, 'data'), value)
+        return copy.deepcopy(value)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'cached_keys': len(self._cache),
+            'round_trips': self.round_trips,
+            'flushes': self.flushes,
+            'invalidated': self.invalidated,
+        }
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    async def close(self) -> None:
+        await self.stop()
+        await self.storage.close()
+
+
+class StorageFlushMiddleware(BaseMiddleware):
+    """Откладывает записи в CachedStorage до конца обработки обновления
+    и записывает их одним pipeline. Подключается к update после
+    FSMContextMiddleware, чтобы запись шла под блокировкой чата.
+    """
+
+    def __init__(self, storage: CachedStorage):
+        self.storage = storage
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, dict], Awaitable[Any]],
+            event: TelegramObject,
+            data: dict[str, Any],
+    ) -> Any:
+        context = UpdateContext()
+        token = _update.set(context)
+        try:
+            return await handler(event, data)
+        finally:
+            # Задачи, запущенные обработчиком, дальше пишут сразу
+            context.closed = True
+            try:
+                if context.writes:
+                    await self.storage.flush(context.writes)
+            finally:
+                _update.reset(token)
+                FSM_ROUND_TRIPS.observe(context.round_trips)
@@ -0,0 +1,29 @@
+import asyncio
+import logging
+
+from aiogram.fsm.storage.redis import RedisStorage
+
+from config_data.config import load_config, Config
+from ruobr.vault import CredentialVault
+from utils.logs import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    """Перешифровать логины и пароли в хранилище первым ключом
+    из VAULT_KEYS.
+    """
+    setup_logging()
+    config: Config = load_config()
+    storage: RedisStorage = RedisStorage.from_url(url=config.db.db_link)
+    vault: CredentialVault = CredentialVault(storage.redis, config.vault.keys)
+    try:
+        count = await vault.rotate()
+    finally:
+        await storage.close()
+    logger.info('Re-encrypted %d vault entries', count)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Iterable, NamedTuple
+
+from ruobr.ruobr_cls import Lesson
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    account TEXT NOT NULL,
+    child INTEGER NOT NULL,
+    task_id INTEGER NOT NULL,
+    content_hash INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    title TEXT NOT NULL,
+    UNIQUE (account, child, task_id, content_hash)
+);
+CREATE INDEX IF NOT EXISTS tasks_child_date
+    ON tasks (account, child, date);
+CREATE INDEX IF NOT EXISTS tasks_child_subject
+    ON tasks (account, child, subject);
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+    subject, title, content='tasks', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS tasks_ai AFTER INSERT ON tasks BEGIN
+    INSERT INTO tasks_fts (rowid, subject, title)
+    VALUES (new.rowid, new.subject, new.title);
+END;
+'''
+
+# Архив только пополняется: каждая новая редакция задания - новая строка
+INSERT = '''
+INSERT OR IGNORE INTO tasks
+    (account, child, task_id, content_hash, date, subject, title)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+class ArchivedTask(NamedTuple):
+    child: int
+    date: str
+    subject: str
+    title: str
+
+
+def content_hash(date: str, subject: str, title: str) -> int:
+    """Короткий хэш редакции задания для проверки уникальности."""
+    digest = hashlib.blake2b(
+        '\0'.join((date, subject, title)).encode('UTF-8'), digest_size=8
+    ).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def build_match(text: str) -> str:
+    """Запрос FTS5 из слов поиска: все слова, каждое - как начало
+    слова, поэтому «дроб» находит и «дроби», и «дробей».
+    """
+    return ' '.join(
+        '"' + word.replace('"', '""') + '"*' for word in text.split()
+    )
+
+
+class HomeworkArchive:
+    """Архив домашней работы детей в SQLite с полнотекстовым поиском.
+
+    Все загруженные из ruobr задания сохраняются по (аккаунт, номер
+    ребенка, id задания). Архив только пополняется: исправленное
+    учителем задание сохраняется новой редакцией рядом с прежней,
+    и в поиске участвуют все редакции. Номер ребенка тот же, что
+    в данных состояния, поэтому для поиска не нужна авторизация в ruobr.
+    add не задерживает обработчики: задания только добавляются
+    в буфер, а фоновая задача записывает их пачками до batch_size
+    заданий не реже раза в flush_interval секунд. Если в буфере больше
+    max_pending заданий, самые старые отбрасываются. Запись и поиск
+    по предмету и тексту идут в отдельном потоке.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            batch_size: int = 500,
+            flush_interval: float = 1.0,
+            max_pending: int = 50000,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='archive'
+        )
+        self._connection: sqlite3.Connection | None = None
+        self._pending: deque[tuple] = deque(maxlen=max_pending)
+        self._full = asyncio.Event()
+        self._writer: asyncio.Task | None = None
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            # Несколько процессов бота пишут в один файл
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA busy_timeout=5000')
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def add(
+            self, account: str, child: int, lessons: Iterable[Lesson]
+    ) -> None:
+        """Поставить задания уроков ребенка в очередь на запись."""
+        rows = [
+            (
+                account, child, task.id,
+                content_hash(lesson.date, lesson.subject, task.title),
+                lesson.date, lesson.subject, task.title,
+            )
+            for lesson in lessons
+            for task in lesson.tasks
+        ]
+        if not rows:
+            return
+        self.dropped += max(
+            0, len(self._pending) + len(rows) - self._pending.maxlen
+        )
+        self._pending.extend(rows)
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._run())
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception('Homework archive write failed')
+
+    async def flush(self) -> None:
+        """Записать все задания из буфера."""
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            rows = [
+                self._pending.popleft()
+                for _ in range(min(self.batch_size, len(self._pending)))
+            ]
+            await loop.run_in_executor(self._executor, self._write, rows)
+            self.written += len(rows)
+            self.batches += 1
+
+    def _write(self, rows: list[tuple]) -> None:
+        connection = self._connect()
+        with connection:
+            connection.executemany(INSERT, rows)
+
+    async def search(
+            self,
+            account: str,
+            children: list[int],
+            text: str,
+            period: tuple[date, date] | None = None,
+            limit: int = 20,
+    ) -> list[ArchivedTask]:
+        """Найти задания детей по словам из предмета и текста,
+        сначала новые. Для исправленного задания в ответе есть все
+        подходящие редакции, последняя - первой.
+        """
+        if not children or not text.split():
+            return []
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor,
+            self._search, account, children, text, period, limit,
+        )
+
+    def _search(
+            self,
+            account: str,
+            children: list[int],
+            text: str,
+            period: tuple[date, date] | None,
+            limit: int,
+    ) -> list[ArchivedTask]:
+        query = (
+            'SELECT tasks.child, tasks.date, tasks.subject, tasks.title '
+            'FROM tasks_fts JOIN tasks ON tasks.rowid = tasks_fts.rowid '
+            'WHERE tasks_fts MATCH ? AND tasks.account = ? '
+            'AND tasks.child IN ({})'
+        ).format(', '.join('?' * len(children)))
+        params: list = [build_match(text), account, *children]
+        if period is not None:
+            query += ' AND tasks.date BETWEEN ? AND ?'
+            params.extend(day.isoformat() for day in period)
+        query += (
+            ' ORDER BY tasks.date DESC, tasks.subject, tasks.rowid DESC'
+            ' LIMIT ?'
+        )
+        params.append(limit)
+        return [
+            ArchivedTask(*row)
+            for row in self._connect().execute(query, params)
+        ]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'written': self.written,
+            'pending': len(self._pending),
+            'batches': self.batches,
+            'dropped': self.dropped,
+        }
+
+    async def close(self) -> None:
+        """Записать оставшиеся задания и закрыть базу."""
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+        try:
+            await self.flush()
+        finally:
+            if self._connection is not None:
+                await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._connection.close
+                )
+                self._connection = None
+            self._executor.shutdown(wait=False)
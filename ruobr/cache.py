@@ -0,0 +1,206 @@
+import json
+import time
+from collections import OrderedDict
+from datetime import date
+
+from redis.asyncio.client import Redis
+
+from ruobr.ruobr_cls import Lesson
+from utils.metrics import CACHE_REQUESTS
+
+# Уроки хранятся списками полей Lesson
+CACHE_PREFIX = 'ruobr:lessons'
+
+# Добавить ключи дней в индекс аккаунта. Срок жизни индекса только
+# продлевается, чтобы индекс не истек раньше перечисленных в нем ключей
+ADD_TO_INDEX = '''
+redis.call('sadd', KEYS[1], unpack(ARGV, 2))
+if redis.call('pttl', KEYS[1]) < tonumber(ARGV[1]) then
+    redis.call('pexpire', KEYS[1], ARGV[1])
+end
+'''
+
+
+class TimetableCache:
+    """Кэш уроков по дням с ключом (аккаунт, ребенок, дата).
+
+    Перед Redis стоит небольшой кэш в памяти процесса. Каждый день
+    хранится отдельно, поэтому запрос недели загружает только
+    недостающие дни. После ttl запись в Redis еще stale_ttl секунд
+    хранится как устаревшая, чтобы показать ее, если ruobr недоступен.
+    Ключи дней аккаунта перечислены в индексе аккаунта, поэтому сброс
+    кэша аккаунта не просматривает все ключи Redis.
+    """
+
+    def __init__(
+            self,
+            redis: Redis | None = None,
+            ttl: int = 600,
+            stale_ttl: int = 24 * 60 * 60,
+            local_ttl: float = 60,
+            local_max_size: int = 2000,
+    ):
+        self.redis = redis
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._add_to_index = (
+            redis.register_script(ADD_TO_INDEX) if redis is not None else None
+        )
+        self.local_ttl = local_ttl
+        self.local_max_size = local_max_size
+        self._local: OrderedDict[str, tuple[float, list[Lesson]]] = (
+            OrderedDict()
+        )
+
+    @staticmethod
+    def build_key(account: str, child: int, day: date) -> str:
+        return f'{CACHE_PREFIX}:{account}:{child}:{day.isoformat()}'
+
+    @staticmethod
+    def build_index_key(account: str) -> str:
+        return f'{CACHE_PREFIX}:index:{account}'
+
+    def _get_local(self, key: str) -> list[Lesson] | None:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return entry[1]
+
+    def _set_local(self, key: str, lessons: list[Lesson]) -> None:
+        self._local[key] = (time.monotonic() + self.local_ttl, lessons)
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_max_size:
+            self._local.popitem(last=False)
+
+    async def get_days(
+            self,
+            account: str,
+            child: int,
+            days: list[date],
+            stale: bool = False,
+    ) -> dict[date, list[Lesson]]:
+        """Вернуть закэшированные дни. Отсутствующих дней в ответе нет.
+        Если stale, возвращаются и устаревшие дни.
+        """
+        found = {}
+        missing = []
+        for day in days:
+            lessons = self._get_local(self.build_key(account, child, day))
+            if lessons is None:
+                missing.append(day)
+            else:
+                found[day] = lessons
+                CACHE_REQUESTS.inc('timetable', 'local')
+        if missing and self.redis is not None:
+            values = await self.redis.mget(
+                [self.build_key(account, child, day) for day in missing]
+            )
+            now = time.time()
+            for day, value in zip(missing, values):
+                if value is None:
+                    continue
+                entry = json.loads(value)
+                if entry['expires_at'] > now:
+                    found[day] = [
+                        Lesson.from_row(row) for row in entry['lessons']
+                    ]
+                    CACHE_REQUESTS.inc('timetable', 'redis')
+                    self._set_local(
+                        self.build_key(account, child, day), found[day]
+                    )
+                elif stale:
+                    found[day] = [
+                        Lesson.from_row(row) for row in entry['lessons']
+                    ]
+        if not stale:
+            CACHE_REQUESTS.inc(
+                'timetable', 'miss', value=len(days) - len(found)
+            )
+        return found
+
+    async def set_days(
+            self,
+            account: str,
+            child: int,
+            days: dict[date, list[Lesson]],
+            ttl: int | None = None,
+    ) -> None:
+        """Сохранить уроки по дням."""
+        for day, lessons in days.items():
+            self._set_local(self.build_key(account, child, day), lessons)
+        if self.redis is not None and days:
+            ttl = ttl or self.ttl
+            expires_at = time.time() + ttl
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for day, lessons in days.items():
+                    pipe.set(
+                        self.build_key(account, child, day),
+                        json.dumps(
+                            {'expires_at': expires_at, 'lessons': lessons},
+                            ensure_ascii=False,
+                        ),
+                        ex=ttl + self.stale_ttl,
+                    )
+                await self._add_to_index(
+                    keys=[self.build_index_key(account)],
+                    args=[(ttl + self.stale_ttl) * 1000, *[
+                        self.build_key(account, child, day) for day in days
+                    ]],
+                    client=pipe,
+                )
+                await pipe.execute()
+
+    async def invalidate(self, account: str) -> None:
+        """Удалить все дни аккаунта, например после смены ребенка
+        или повторного входа.
+        """
+        prefix = f'{CACHE_PREFIX}:{account}:'
+        for key in [key for key in self._local if key.startswith(prefix)]:
+            del self._local[key]
+        if self.redis is not None:
+            index_key = self.build_index_key(account)
+            keys = await self.redis.smembers(index_key)
+            await self.redis.delete(index_key, *keys)
+
+
+CHILDREN_PREFIX = 'ruobr:children'
+
+
+class ChildrenCache:
+    """Список детей аккаунта по токену входа.
+
+    Заполняется при входе и обновляется при первом обращении после ttl,
+    поэтому список детей не требует авторизации в ruobr.
+    """
+
+    def __init__(self, redis: Redis, ttl: int = 24 * 60 * 60):
+        self.redis = redis
+        self.ttl = ttl
+
+    @staticmethod
+    def build_key(token: str) -> str:
+        return f'{CHILDREN_PREFIX}:{token}'
+
+    async def get(self, token: str) -> dict[int, str] | None:
+        value = await self.redis.get(self.build_key(token))
+        if value is None:
+            CACHE_REQUESTS.inc('children', 'miss')
+            return None
+        CACHE_REQUESTS.inc('children', 'redis')
+        return {
+            int(number): name for number, name in json.loads(value).items()
+        }
+
+    async def set(self, token: str, children: dict[int, str]) -> None:
+        await self.redis.set(
+            self.build_key(token),
+            json.dumps(children, ensure_ascii=False),
+            ex=self.ttl,
+        )
+
+    async def invalidate(self, token: str) -> None:
+        await self.redis.delete(self.build_key(token))
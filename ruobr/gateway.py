@@ -0,0 +1,362 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+from ruobr_api import Ruobr, AuthenticationException
+
+from ruobr.archive import HomeworkArchive
+from ruobr.cache import TimetableCache
+from ruobr.http_pool import RuobrHttpPool
+from ruobr.protection import CircuitBreaker, RateLimiter
+from ruobr.ruobr import (
+    get_user_ruobr, get_children_for_user, fetch_timetable,
+    fetch_control_marks, fetch_marks, parse_control_marks,
+    parse_homeworks, parse_lessons, parse_timetable,
+)
+from ruobr.ruobr_cls import Lesson, Mark, MarkPeriod
+from ruobr.ruobr_exception import (
+    RuobrIsApplicantError, RuobrIsEmptyError,
+    RuobrTimeoutError, RuobrUnavailableError,
+)
+from ruobr.scheduler import FairScheduler
+from ruobr.singleflight import SingleFlight
+from utils.metrics import RUOBR_LATENCY
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Ошибки данных пользователя, а не доступности ruobr
+USER_ERRORS = (
+    AuthenticationException, RuobrIsEmptyError, RuobrIsApplicantError,
+)
+
+
+class RuobrGateway:
+    """Асинхронный шлюз к ruobr_api.
+
+    Синхронные вызовы ruobr_api выполняются в ограниченном пуле потоков,
+    поэтому медленный ответ ruobr.ru не блокирует цикл событий бота.
+    Число одновременных запросов ограничено честной очередью по чатам
+    (см. FairScheduler), каждый вызов ограничен таймаутом. Если передан
+    кэш, уроки берутся из него и запрашиваются только недостающие дни.
+    Одинаковые одновременные запросы объединяются в один.
+
+    Ограничитель частоты и автоматический выключатель защищают ruobr
+    от лишних запросов, пока он не справляется. В это время вместо
+    ожидания сразу выбрасывается RuobrUnavailableError, по возможности
+    с устаревшими данными из кэша.
+
+    Ответ ruobr сразу разбирается в компактные Lesson. Если validate
+    выключен, модели pydantic не создаются. Если передан http, все
+    пользователи ходят в ruobr через этот общий пул соединений. Если
+    передан archive, все загруженные задания сохраняются в архив.
+    """
+
+    def __init__(
+            self,
+            max_workers: int = 8,
+            concurrency: int = 8,
+            timeout: float = 15.0,
+            cache: TimetableCache | None = None,
+            limiter: RateLimiter | None = None,
+            breaker: CircuitBreaker | None = None,
+            validate: bool = True,
+            http: RuobrHttpPool | None = None,
+            archive: HomeworkArchive | None = None,
+    ):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='ruobr'
+        )
+        self.max_workers = max_workers
+        self.scheduler = FairScheduler(concurrency)
+        self.timeout = timeout
+        self.cache = cache
+        self.limiter = limiter
+        self.breaker = breaker
+        self.validate = validate
+        self.http = http
+        self.archive = archive
+        self.single_flight = SingleFlight()
+
+    async def run(
+            self,
+            func: Callable[..., T],
+            *args: Any,
+            timeout: float | None = None,
+            account: str | None = None,
+    ) -> T:
+        """Выполнить синхронную функцию в пуле потоков."""
+        timeout = timeout or self.timeout
+        if self.limiter is not None:
+            wait = self.limiter.reserve(account, timeout)
+            if wait is None:
+                raise RuobrUnavailableError('Слишком много запросов к ruobr.')
+            if wait:
+                await asyncio.sleep(wait)
+        if self.breaker is not None and not self.breaker.allow():
+            raise RuobrUnavailableError('Ruobr временно недоступен.')
+        try:
+            async with self.scheduler.slot():
+                loop = asyncio.get_running_loop()
+                with RUOBR_LATENCY.time(func.__name__):
+                    result = await asyncio.wait_for(
+                        loop.run_in_executor(
+                            self._executor, partial(func, *args)
+                        ),
+                        timeout,
+                    )
+        except asyncio.TimeoutError:
+            self._record_failure()
+            raise RuobrTimeoutError('Ruobr не ответил вовремя.')
+        except USER_ERRORS:
+            self._record_success()
+            raise
+        except Exception as error:
+            self._record_failure()
+            logger.warning('Ruobr request failed: %r', error)
+            raise RuobrUnavailableError('Ошибка запроса к ruobr.') from error
+        except BaseException:
+            # Запрос отменен, результат неизвестен
+            if self.breaker is not None:
+                self.breaker.cancel_trial()
+            raise
+        self._record_success()
+        return result
+
+    def _record_success(self) -> None:
+        if self.breaker is not None:
+            self.breaker.record_success()
+
+    def _record_failure(self) -> None:
+        if self.breaker is not None:
+            self.breaker.record_failure()
+
+    def stats(self) -> dict[str, int | str]:
+        """Состояние защиты и счетчики для мониторинга."""
+        stats = {
+            'single_flight_calls': self.single_flight.calls,
+            'single_flight_coalesced': self.single_flight.coalesced,
+            **self.scheduler.stats(),
+        }
+        if self.breaker is not None:
+            stats.update(
+                breaker_state=self.breaker.state,
+                breaker_failures=self.breaker.failures,
+                breaker_opened=self.breaker.opened_count,
+            )
+        if self.limiter is not None:
+            stats.update(
+                limiter_delayed=self.limiter.delayed,
+                limiter_rejected=self.limiter.rejected,
+            )
+        if self.http is not None:
+            stats.update(self.http.stats())
+        return stats
+
+    async def get_user_ruobr(
+            self, username: str, password: str
+    ) -> Ruobr | None:
+        """Получить авторизованного на ruobr пользователя."""
+        return await self.run(get_user_ruobr, username, password, self.http)
+
+    async def get_children_for_user(self, user: Ruobr) -> dict[int, str]:
+        """Получить список всех детей пользователя."""
+        return await self.single_flight.do(
+            ('children', user.username),
+            partial(self.run, account=user.username),
+            get_children_for_user, user,
+        )
+
+    async def get_timetable(
+            self, user: Ruobr, date_start: date, date_end: date
+    ) -> list[Lesson]:
+        """Получить уроки за период, используя кэш по дням."""
+        if self.cache is None:
+            return await self.refresh_timetable(user, date_start, date_end)
+
+        account, child = user.username, user.user['id']
+        days = [
+            date_start + timedelta(days=offset)
+            for offset in range((date_end - date_start).days + 1)
+        ]
+        lessons_by_day = await self.cache.get_days(account, child, days)
+        missing = [day for day in days if day not in lessons_by_day]
+        if missing:
+            try:
+                lessons_by_day.update(await self.single_flight.do(
+                    ('timetable', account, child, missing[0], missing[-1]),
+                    self._load_days,
+                    user, account, child, missing[0], missing[-1],
+                ))
+            except RuobrUnavailableError as error:
+                stale = await self.cache.get_days(
+                    account, child, missing, stale=True
+                )
+                if len(stale) < len(missing):
+                    raise
+                lessons_by_day.update(stale)
+                raise RuobrUnavailableError(str(error), stale=[
+                    lesson for day in days for lesson in lessons_by_day[day]
+                ]) from error
+        return [lesson for day in days for lesson in lessons_by_day[day]]
+
+    async def peek_timetable(
+            self, user: Ruobr, date_start: date, date_end: date
+    ) -> tuple[list[Lesson], bool] | None:
+        """Уроки за период только из кэша, в том числе устаревшие,
+        и признак того, что все дни свежие. Если каких-то дней в кэше
+        нет, возвращает None.
+        """
+        if self.cache is None:
+            return None
+        account, child = user.username, user.user['id']
+        days = [
+            date_start + timedelta(days=offset)
+            for offset in range((date_end - date_start).days + 1)
+        ]
+        lessons_by_day = await self.cache.get_days(account, child, days)
+        missing = [day for day in days if day not in lessons_by_day]
+        if missing:
+            lessons_by_day.update(await self.cache.get_days(
+                account, child, missing, stale=True
+            ))
+            if len(lessons_by_day) < len(days):
+                return None
+        lessons = [lesson for day in days for lesson in lessons_by_day[day]]
+        return lessons, not missing
+
+    async def refresh_timetable(
+            self,
+            user: Ruobr,
+            date_start: date,
+            date_end: date,
+            ttl: int | None = None,
+    ) -> list[Lesson]:
+        """Загрузить уроки за период из ruobr в обход кэша
+        и обновить кэш.
+        """
+        account, child = user.username, user.user['id']
+        if self.cache is None:
+            return await self.single_flight.do(
+                ('timetable', account, child, date_start, date_end),
+                self._fetch, user, account, date_start, date_end,
+            )
+        lessons_by_day = await self.single_flight.do(
+            ('timetable', account, child, date_start, date_end),
+            self._load_days,
+            user, account, child, date_start, date_end, ttl,
+        )
+        return [
+            lesson for lessons in lessons_by_day.values() for lesson in lessons
+        ]
+
+    async def _fetch(
+            self,
+            user: Ruobr,
+            account: str,
+            date_start: date,
+            date_end: date,
+    ) -> list[Lesson]:
+        """Загрузить уроки из ruobr и разобрать ответ."""
+        timetable = await self.run(
+            fetch_timetable, user, date_start, date_end, account=account
+        )
+        lessons = parse_lessons(timetable, self.validate)
+        if self.archive is not None:
+            self.archive.add(account, user.child + 1, lessons)
+        return lessons
+
+    async def _load_days(
+            self,
+            user: Ruobr,
+            account: str,
+            child: int,
+            date_start: date,
+            date_end: date,
+            ttl: int | None = None,
+    ) -> dict[date, list[Lesson]]:
+        """Загрузить уроки из ruobr и положить их в кэш по дням."""
+        lessons_by_day = {
+            date_start + timedelta(days=offset): []
+            for offset in range((date_end - date_start).days + 1)
+        }
+        lessons = await self._fetch(user, account, date_start, date_end)
+        for lesson in lessons:
+            lessons_by_day.setdefault(
+                date.fromisoformat(lesson.date), []
+            ).append(lesson)
+        await self.cache.set_days(account, child, lessons_by_day, ttl)
+        return lessons_by_day
+
+    async def homework_for_date(
+            self, user: Ruobr, date_start: date, date_end: date
+    ) -> dict[str, dict[str, list[str]]]:
+        """Получить всю домашнюю работу за указанный период."""
+        try:
+            lessons = await self.get_timetable(user, date_start, date_end)
+        except RuobrUnavailableError as error:
+            if error.stale is None:
+                raise
+            raise RuobrUnavailableError(
+                str(error), stale=parse_homeworks(error.stale)
+            ) from error
+        return parse_homeworks(lessons)
+
+    async def timetable_for_date(
+            self, user: Ruobr, date_start: date, date_end: date
+    ) -> dict[str, dict[str, tuple[str, str]]]:
+        """Получить расписание за указанный период."""
+        try:
+            lessons = await self.get_timetable(user, date_start, date_end)
+        except RuobrUnavailableError as error:
+            if error.stale is None:
+                raise
+            raise RuobrUnavailableError(
+                str(error), stale=parse_timetable(error.stale)
+            ) from error
+        return parse_timetable(lessons)
+
+    async def get_control_marks(self, user: Ruobr) -> list[MarkPeriod]:
+        """Получить учебные периоды с итоговыми оценками."""
+        periods = await self.single_flight.do(
+            ('controlmark', user.username, user.user['id']),
+            partial(self.run, account=user.username),
+            fetch_control_marks, user,
+        )
+        return parse_control_marks(periods)
+
+    async def get_marks(
+            self, user: Ruobr, period: int, subject_id: int
+    ) -> list[Mark]:
+        """Получить все оценки по предмету за период."""
+        return await self.single_flight.do(
+            ('marks', user.username, user.user['id'], period, subject_id),
+            partial(self.run, account=user.username),
+            fetch_marks, user, period, subject_id,
+        )
+
+    async def invalidate_timetable(self, account: str) -> None:
+        """Сбросить кэш уроков аккаунта."""
+        if self.cache is not None:
+            await self.cache.invalidate(account)
+
+    async def warmup(self) -> None:
+        """Заранее запустить потоки пула и открыть соединение с ruobr."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[
+            loop.run_in_executor(self._executor, time.sleep, 0)
+            for _ in range(self.max_workers)
+        ])
+        if self.http is not None:
+            await loop.run_in_executor(self._executor, self.http.warmup)
+
+    def close(self) -> None:
+        """Остановить пул потоков и закрыть соединения."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self.http is not None:
+            self.http.close()
@@ -0,0 +1,120 @@
+import importlib.util
+import logging
+import threading
+
+import httpx
+from ruobr_api import Ruobr, AuthenticationException, NoSuccessException
+
+logger = logging.getLogger(__name__)
+
+RUOBR_URL = 'https://api3d.ruobr.ru'
+
+
+class RuobrHttpPool:
+    """Общий для всех пользователей пул соединений с ruobr.
+
+    Соединения переиспользуются между запросами: держится не больше
+    max_keepalive свободных соединений, каждое закрывается после
+    keepalive_expiry секунд простоя, всего открыто не больше
+    max_connections. HTTP/2 включается, если установлен пакет h2.
+    Ответы запрашиваются сжатыми, httpx распаковывает их сам.
+    Клиент httpx потокобезопасен, поэтому пул используется из потоков
+    RuobrGateway.
+    """
+
+    def __init__(
+            self,
+            base_url: str = RUOBR_URL,
+            max_connections: int = 8,
+            max_keepalive: int = 8,
+            keepalive_expiry: float = 60,
+            http2: bool = True,
+            timeout: float = 15,
+    ):
+        self.http2 = http2 and importlib.util.find_spec('h2') is not None
+        if http2 and not self.http2:
+            logger.info('HTTP/2 for ruobr is disabled: h2 is not installed')
+        self.client = httpx.Client(
+            base_url=base_url,
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=timeout,
+        )
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+
+    def get(self, target: str, headers: dict[str, str]) -> httpx.Response:
+        """GET-запрос к ruobr с учетом новых соединений."""
+        connected = False
+
+        def trace(event: str, info: dict) -> None:
+            nonlocal connected
+            if event == 'connection.connect_tcp.complete':
+                connected = True
+
+        response = self.client.get(
+            target, headers=headers, extensions={'trace': trace}
+        )
+        with self._lock:
+            self.requests += 1
+            self.connections += connected
+        return response
+
+    def warmup(self) -> None:
+        """Открыть соединение заранее, ответ не важен."""
+        try:
+            self.get('/', {})
+        except httpx.HTTPError as error:
+            logger.warning('Ruobr warmup failed: %r', error)
+
+    def stats(self) -> dict[str, int | float | bool]:
+        reused = self.requests - self.connections
+        return {
+            'http_requests': self.requests,
+            'http_connections': self.connections,
+            'http_reused': reused,
+            'http_reuse_ratio': (
+                round(reused / self.requests, 3) if self.requests else 0.0
+            ),
+            'http2': self.http2,
+        }
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class PooledRuobr(Ruobr):
+    """Ruobr, который отправляет запросы через общий RuobrHttpPool
+    вместо нового соединения на каждый запрос.
+    """
+
+    def __init__(self, username: str, password: str, pool: RuobrHttpPool):
+        super().__init__(username, password)
+        self.pool = pool
+
+    def _get(self, target: str) -> dict | list:
+        response = self.pool.get(
+            f'/{target}',
+            headers={'password': self.password, 'username': self.username},
+        )
+        try:
+            data = response.json()
+        except ValueError:
+            raise NoSuccessException(response.text)
+        # Ошибки разбираются так же, как в Ruobr._get
+        if isinstance(data, dict) and not data.get('success', True):
+            if 'error' in data:
+                raise NoSuccessException(data['error'])
+            if 'error_type' in data:
+                if data['error_type'] == 'auth':
+                    raise AuthenticationException(
+                        'Проверьте логин и/или пароль'
+                    )
+                raise NoSuccessException(data['error_type'])
+            raise NoSuccessException(data)
+        return data
@@ -0,0 +1,246 @@
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from typing import NamedTuple
+
+from redis.asyncio.client import Redis
+from ruobr_api import Ruobr
+
+from ruobr.gateway import RuobrGateway
+from ruobr.ruobr_cls import Mark, MarkPeriod
+from ruobr.ruobr_exception import RuobrUnavailableError
+
+# Как часто проверять, загрузил ли сводку другой процесс
+WAIT_POLL_INTERVAL = 0.2
+
+# Версия 2: учтенные оценки хранятся со значением, чтобы учитывать
+# исправления. Сводки версии 1 пересчитываются заново
+MARKS_PREFIX = 'ruobr:marks:v2'
+
+
+@dataclass
+class SubjectStats:
+    """Сводка оценок по предмету за период: число и сумма оценок
+    и последние оценки в порядке получения с их id.
+    """
+
+    count: int = 0
+    total: int = 0
+    recent: list[int] = field(default_factory=list)
+    recent_ids: list[int] = field(default_factory=list)
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def trend(self) -> float:
+        """На сколько среднее последних оценок выше общего среднего."""
+        if not self.recent:
+            return 0.0
+        return sum(self.recent) / len(self.recent) - self.average
+
+    def add(self, marks: list[Mark], recent: int) -> None:
+        self.count += len(marks)
+        self.total += sum(mark.value for mark in marks)
+        marks = sorted(marks, key=lambda mark: mark.date)
+        self.recent = (self.recent + [mark.value for mark in marks])[-recent:]
+        self.recent_ids = (
+            self.recent_ids + [mark.id for mark in marks]
+        )[-recent:]
+
+    def replace(self, old: Mark, new: Mark) -> None:
+        """Учесть исправленную учителем оценку вместо прежней."""
+        self.total += new.value - old.value
+        if old.id in self.recent_ids:
+            self.recent[self.recent_ids.index(old.id)] = new.value
+
+    def dumps(self) -> str:
+        return json.dumps(
+            [self.count, self.total, self.recent, self.recent_ids]
+        )
+
+    @classmethod
+    def loads(cls, value: bytes | str) -> 'SubjectStats':
+        return cls(*json.loads(value))
+
+
+class MarksSummary(NamedTuple):
+    """Сводка для вывода: средние по предметам за текущий период
+    и итоговые оценки по периодам.
+    """
+
+    title: str
+    subjects: dict[str, SubjectStats]
+    finals: list[tuple[str, dict[str, str]]]
+
+
+class MarksService:
+    """Оценки детей со сводкой, которая хранится в redis.
+
+    Сводка по предметам текущего периода обновляется по новым оценкам:
+    оценки, уже учтенные раньше, пропускаются по id, а исправленные
+    учителем заменяют в сводке прежнее значение. За закрытые
+    периоды хранятся только итоговые оценки. Поэтому запрос сводки
+    читает из redis по одной записи на предмет и не пересчитывает
+    оценки за весь период.
+    Оценки из ruobr запрашиваются не чаще раза в ttl секунд,
+    одновременно - не больше concurrency запросов. Пока другой процесс
+    впервые загружает сводку ребенка, запрос сводки ждет ее до
+    wait_timeout секунд, а потом загружает сам.
+    """
+
+    def __init__(
+            self,
+            gateway: RuobrGateway,
+            redis: Redis,
+            ttl: int = 30 * 60,
+            recent: int = 5,
+            concurrency: int = 4,
+            wait_timeout: float = 15,
+    ):
+        self.gateway = gateway
+        self.redis = redis
+        self.ttl = ttl
+        self.recent = recent
+        self.concurrency = concurrency
+        self.wait_timeout = wait_timeout
+
+    @staticmethod
+    def build_key(child: int, *parts: str | int) -> str:
+        return ':'.join(map(str, (MARKS_PREFIX, child, *parts)))
+
+    async def summary(self, user: Ruobr) -> tuple[MarksSummary, bool]:
+        """Сводка оценок выбранного ребенка user. Вторым элементом
+        возвращается признак того, что ruobr не ответил и сводка может
+        быть устаревшей.
+        """
+        child = user.user['id']
+        try:
+            await self.gateway.single_flight.do(
+                ('marks', child), self._refresh_if_stale, user
+            )
+        except RuobrUnavailableError:
+            if not await self.redis.exists(self.build_key(child, 'periods')):
+                raise
+            return await self.read(child), True
+        return await self.read(child), False
+
+    async def _refresh_if_stale(self, user: Ruobr) -> None:
+        fresh_key = self.build_key(user.user['id'], 'fresh')
+        # Ключ занимает процесс, который обновляет оценки ребенка
+        if not await self.redis.set(fresh_key, 1, nx=True, ex=self.ttl):
+            await self._wait_for_summary(user)
+            return
+        try:
+            await self.refresh(user)
+        except BaseException:
+            await self.redis.delete(fresh_key)
+            raise
+
+    async def _wait_for_summary(self, user: Ruobr) -> None:
+        """Дождаться сводки, которую загружает другой процесс."""
+        periods_key = self.build_key(user.user['id'], 'periods')
+        deadline = time.monotonic() + self.wait_timeout
+        while not await self.redis.exists(periods_key):
+            if time.monotonic() >= deadline:
+                await self.refresh(user)
+                return
+            await asyncio.sleep(WAIT_POLL_INTERVAL)
+
+    async def refresh(self, user: Ruobr) -> None:
+        """Загрузить итоговые оценки и новые оценки за текущий период -
+        первый, по которому итоговые оценки выставлены не все.
+        """
+        child = user.user['id']
+        periods = await self.gateway.get_control_marks(user)
+        current = [period for period in periods if not period.closed][:1]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def refresh_subject(period: int, subject_id: int, name: str):
+            async with semaphore:
+                marks = await self.gateway.get_marks(user, period, subject_id)
+            await self.add_marks(child, period, name, marks)
+
+        await asyncio.gather(*[
+            refresh_subject(period.number, subject_id, name)
+            for period in current
+            for subject_id, name in period.subjects.items()
+        ])
+        if periods:
+            await self.redis.hset(
+                self.build_key(child, 'periods'),
+                mapping={
+                    period.number: self._dump_period(period)
+                    for period in periods
+                },
+            )
+
+    @staticmethod
+    def _dump_period(period: MarkPeriod) -> str:
+        return json.dumps(
+            [period.title, period.closed, period.finals], ensure_ascii=False
+        )
+
+    async def add_marks(
+            self, child: int, period: int, subject: str, marks: list[Mark]
+    ) -> int:
+        """Учесть в сводке оценки, которых еще не было, и исправления
+        учтенных. Возвращает число новых и исправленных оценок.
+        """
+        if not marks:
+            return 0
+        seen_key = self.build_key(child, 'seen')
+        stored = await self.redis.hmget(seen_key, [mark.id for mark in marks])
+        new, changed = [], []
+        for mark, value in zip(marks, stored):
+            if value is None:
+                new.append(mark)
+                continue
+            old = Mark(mark.id, *json.loads(value))
+            if old != mark:
+                changed.append((old, mark))
+        if not new and not changed:
+            return 0
+        stats_key = self.build_key(child, period)
+        value = await self.redis.hget(stats_key, subject)
+        stats = SubjectStats.loads(value) if value else SubjectStats()
+        stats.add(new, self.recent)
+        for old, mark in changed:
+            stats.replace(old, mark)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(stats_key, subject, stats.dumps())
+            pipe.hset(seen_key, mapping={
+                mark.id: json.dumps([mark.date, mark.value])
+                for mark in new + [mark for _, mark in changed]
+            })
+            await pipe.execute()
+        return len(new) + len(changed)
+
+    async def read(self, child: int) -> MarksSummary:
+        """Прочитать сводку из redis: текущий период - первый
+        незакрытый или последний.
+        """
+        stored = await self.redis.hgetall(self.build_key(child, 'periods'))
+        periods = sorted(
+            (int(number), *json.loads(value))
+            for number, value in stored.items()
+        )
+        if not periods:
+            return MarksSummary('', {}, [])
+        current = next(
+            (period for period in periods if not period[2]), periods[-1]
+        )
+        subjects = await self.redis.hgetall(
+            self.build_key(child, current[0])
+        )
+        return MarksSummary(
+            current[1],
+            {
+                (name.decode() if isinstance(name, bytes) else name):
+                    SubjectStats.loads(value)
+                for name, value in sorted(subjects.items())
+            },
+            [(title, finals) for _, title, _, finals in periods if finals],
+        )
@@ -0,0 +1,140 @@
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Ограничитель частоты: rate запросов в секунду, не больше
+    capacity подряд.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def reserve(self, max_wait: float) -> float | None:
+        """Занять токен. Вернуть, сколько секунд нужно подождать,
+        или None, если ждать дольше max_wait.
+        """
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+        wait = max(0.0, (1 - self.tokens) / self.rate)
+        if wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+
+class RateLimiter:
+    """Общий ограничитель частоты запросов к ruobr и отдельный
+    для каждого аккаунта.
+    """
+
+    def __init__(
+            self,
+            rate: float,
+            burst: float,
+            account_rate: float,
+            account_burst: float,
+            max_accounts: int = 10000,
+    ):
+        self.account_rate = account_rate
+        self.account_burst = account_burst
+        self.max_accounts = max_accounts
+        self._global = TokenBucket(rate, burst)
+        self._accounts: OrderedDict[str, TokenBucket] = OrderedDict()
+        self.delayed = 0
+        self.rejected = 0
+
+    def reserve(self, account: str | None, max_wait: float) -> float | None:
+        """Сколько секунд ждать перед запросом или None, если запрос
+        нужно отклонить.
+        """
+        account_wait = 0.0
+        if account is not None:
+            bucket = self._accounts.get(account)
+            if bucket is None:
+                bucket = TokenBucket(self.account_rate, self.account_burst)
+                self._accounts[account] = bucket
+                if len(self._accounts) > self.max_accounts:
+                    self._accounts.popitem(last=False)
+            self._accounts.move_to_end(account)
+            account_wait = bucket.reserve(max_wait)
+            if account_wait is None:
+                self.rejected += 1
+                return None
+        global_wait = self._global.reserve(max_wait - account_wait)
+        if global_wait is None:
+            self.rejected += 1
+            return None
+        wait = max(account_wait, global_wait)
+        if wait:
+            self.delayed += 1
+        return wait
+
+
+class CircuitBreaker:
+    """Размыкается после failure_threshold ошибок подряд и не пропускает
+    запросы recovery_timeout секунд. Затем пропускает один пробный
+    запрос: при успехе замыкается, при ошибке снова размыкается.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(
+            self,
+            failure_threshold: int = 5,
+            recovery_timeout: float = 30,
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_count = 0
+        self._trial = False
+
+    def allow(self) -> bool:
+        """Можно ли сейчас обращаться к ruobr."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._trial = False
+        if self._trial:
+            return False
+        self._trial = True
+        return True
+
+    def cancel_trial(self) -> None:
+        """Пробный запрос отменен, можно пропустить следующий."""
+        self._trial = False
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info('Ruobr circuit closed')
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if (
+            self.state == self.HALF_OPEN
+            or self.failures >= self.failure_threshold
+        ):
+            if self.state != self.OPEN:
+                logger.warning('Ruobr circuit opened')
+                self.opened_count += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
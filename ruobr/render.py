@@ -0,0 +1,328 @@
+import sys
+from collections import OrderedDict
+from typing import Any, Callable
+
+from ruobr.marks import MarksSummary
+from utils.metrics import CACHE_REQUESTS
+
+MESSAGE_LIMIT = 4096
+NO_HOMEWORK = 'Ура! домашки нет.'
+NO_TIMETABLE = 'На указанные даты расписания нет!'
+NO_MARKS = 'Оценок пока нет.'
+BLOCK_SEPARATOR = '\n\n'
+# Насколько среднее последних оценок должно отличаться от общего
+TREND_THRESHOLD = 0.25
+
+
+# В CPython строка без символов вне BMP хранится по 1 или 2 байта
+# на символ (PEP 393), и ее длина в UTF-16 равна len. Такую строку
+# можно узнать по размеру объекта, не кодируя ее
+_UCS4_HEADER = (
+    sys.getsizeof('\U0001F600') - 4
+    if sys.implementation.name == 'cpython' else None
+)
+
+
+def text_length(text: str) -> int:
+    """Длина текста так, как ее считает Telegram: в кодовых единицах
+    UTF-16.
+    """
+    if text.isascii():
+        return len(text)
+    if (
+        _UCS4_HEADER is not None
+        and sys.getsizeof(text) - 4 * len(text) < _UCS4_HEADER
+    ):
+        return len(text)
+    return len(text.encode('utf-16-le')) // 2
+
+
+def escape(text: str) -> str:
+    """Экранировать текст для parse_mode='HTML'. Замена выполняется,
+    только если символ встречается в тексте.
+    """
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    return text
+
+
+def render_homework_day(day: str, subjects: dict[str, list[str]]) -> str:
+    """Блок сообщения с домашней работой за один день."""
+    lines = [f'Домашнее задание на {day}:']
+    lines.extend(
+        f'{subject}: {" ".join(tasks)}' for subject, tasks in subjects.items()
+    )
+    # Экранируется весь блок сразу: заголовок спецсимволов не содержит
+    return escape('\n'.join(lines))
+
+
+def render_timetable_day(
+        day: str, subjects: dict[str, tuple[str, str]]
+) -> str:
+    """Блок сообщения с расписанием за один день."""
+    lines = [f'Расписание на {day}:']
+    lines.extend(
+        f'{start[:5]}-{end[:5]} {subject}'
+        for subject, (start, end) in subjects.items()
+    )
+    return escape('\n'.join(lines))
+
+
+RENDERERS: dict[str, tuple[Callable[[str, dict], str], str]] = {
+    'homework': (render_homework_day, NO_HOMEWORK),
+    'timetable': (render_timetable_day, NO_TIMETABLE),
+}
+
+Part = tuple[str, int]
+
+
+def measure_block(block: str, limit: int = MESSAGE_LIMIT) -> list[Part]:
+    """Части блока не длиннее limit вместе с их длиной."""
+    size = text_length(block)
+    if size <= limit:
+        return [(block, size)]
+    return [(part, text_length(part)) for part in _split_block(block, limit)]
+
+
+class RenderCache:
+    """Готовые блоки сообщений по ключу (аккаунт, ребенок, вид, день).
+
+    Вместе с блоком хранятся данные дня, из которых он получен.
+    Блок рисуется и измеряется заново, только если данные изменились.
+    При превышении max_size вытесняется давно не использованный блок.
+    """
+
+    def __init__(self, max_size: int = 5000):
+        self.max_size = max_size
+        self._blocks: OrderedDict[tuple, tuple[Any, list[Part]]] = (
+            OrderedDict()
+        )
+
+    def get(
+            self,
+            key: tuple,
+            day: str,
+            data: dict,
+            render: Callable[[str, dict], str],
+            limit: int = MESSAGE_LIMIT,
+    ) -> list[Part]:
+        """Вернуть части блока дня из кэша или нарисовать его."""
+        key = (*key, limit)
+        entry = self._blocks.get(key)
+        if entry is not None and entry[0] == data:
+            self._blocks.move_to_end(key)
+            CACHE_REQUESTS.inc('render', 'hit')
+            return entry[1]
+        CACHE_REQUESTS.inc('render', 'miss')
+        parts = measure_block(render(day, data), limit)
+        self._blocks[key] = (data, parts)
+        self._blocks.move_to_end(key)
+        while len(self._blocks) > self.max_size:
+            self._blocks.popitem(last=False)
+        return parts
+
+
+def _split_block(block: str, limit: int) -> list[str]:
+    """Разбить слишком длинный блок по строкам, а слишком длинные
+    строки - по limit символов, не разрывая HTML-сущности.
+    """
+    parts = []
+    current: list[str] = []
+    size = 0
+    for line in block.split('\n'):
+        while text_length(line) > limit:
+            cut = limit
+            # Символ занимает одну или две единицы UTF-16
+            excess = text_length(line[:cut]) - limit
+            while excess > 0:
+                cut -= (excess + 1) // 2
+                excess = text_length(line[:cut]) - limit
+            entity = line.rfind('&', max(0, cut - 8), cut)
+            if entity != -1 and ';' not in line[entity:cut]:
+                cut = entity
+            if current:
+                parts.append('\n'.join(current))
+                current, size = [], 0
+            parts.append(line[:cut])
+            line = line[cut:]
+        line_size = text_length(line) + (1 if current else 0)
+        if current and size + line_size > limit:
+            parts.append('\n'.join(current))
+            current, size, line_size = [], 0, text_length(line)
+        current.append(line)
+        size += line_size
+    if current:
+        parts.append('\n'.join(current))
+    return parts
+
+
+def pack_pages(parts: list[Part], limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Сложить части в страницы не длиннее limit. Часть переносится
+    на следующую страницу целиком.
+    """
+    pages = []
+    page: list[str] = []
+    size = 0
+    for part, part_size in parts:
+        if page and size + len(BLOCK_SEPARATOR) + part_size > limit:
+            pages.append(BLOCK_SEPARATOR.join(page))
+            page, size = [], 0
+        size += part_size + (len(BLOCK_SEPARATOR) if page else 0)
+        page.append(part)
+    if page:
+        pages.append(BLOCK_SEPARATOR.join(page))
+    return pages
+
+
+def split_pages(blocks: list[str], limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Разбить блоки текста на страницы не длиннее limit."""
+    return pack_pages(
+        [part for block in blocks for part in measure_block(block, limit)],
+        limit,
+    )
+
+
+def _render_parts(
+        days: dict[str, dict],
+        kind: str,
+        header: str,
+        cache: RenderCache | None,
+        key: tuple,
+        limit: int,
+) -> list[Part]:
+    render, empty = RENDERERS[kind]
+    parts = measure_block(header, limit) if header else []
+    for day, data in days.items():
+        if cache is None:
+            parts.extend(measure_block(render(day, data), limit))
+        else:
+            parts.extend(
+                cache.get((*key, kind, day), day, data, render, limit)
+            )
+    if not days:
+        parts.extend(measure_block(empty, limit))
+    return parts
+
+
+def render_homeworks(
+        homeworks: dict[str, dict[str, list[str]]],
+        header: str = '',
+        cache: RenderCache | None = None,
+        key: tuple = (),
+        limit: int = MESSAGE_LIMIT,
+) -> list[str]:
+    """Страницы сообщения с домашней работой. header выводится
+    в начале первой страницы.
+    """
+    return pack_pages(
+        _render_parts(homeworks, 'homework', header, cache, key, limit),
+        limit,
+    )
+
+
+def render_timetable(
+        timetable: dict[str, dict[str, tuple[str, str]]],
+        header: str = '',
+        cache: RenderCache | None = None,
+        key: tuple = (),
+        limit: int = MESSAGE_LIMIT,
+) -> list[str]:
+    """Страницы сообщения с расписанием. header выводится в начале
+    первой страницы.
+    """
+    return pack_pages(
+        _render_parts(timetable, 'timetable', header, cache, key, limit),
+        limit,
+    )
+
+
+def render_sections(
+        kind: str,
+        sections: list[tuple[str, tuple, dict[str, dict]]],
+        header: str = '',
+        cache: RenderCache | None = None,
+        limit: int = MESSAGE_LIMIT,
+) -> list[str]:
+    """Страницы одного сообщения из нескольких разделов
+    (заголовок, ключ кэша, дни), например ДЗ всех детей. kind -
+    homework или timetable.
+    """
+    parts = measure_block(header, limit) if header else []
+    for title, key, days in sections:
+        parts.extend(
+            _render_parts(days, kind, escape(title), cache, key, limit)
+        )
+    return pack_pages(parts, limit)
+
+
+def render_digest(
+        sections: list[tuple[str, tuple, dict[str, dict], dict[str, dict]]],
+        header: str = '',
+        cache: RenderCache | None = None,
+        limit: int = MESSAGE_LIMIT,
+) -> list[str]:
+    """Страницы дайджеста из разделов (заголовок, ключ кэша, расписание,
+    домашняя работа). Блоки дней берутся из того же кэша, что и для
+    кнопок с расписанием и ДЗ.
+    """
+    parts = measure_block(header, limit) if header else []
+    for title, key, timetable, homeworks in sections:
+        if title:
+            parts.extend(measure_block(escape(title), limit))
+        parts.extend(
+            _render_parts(timetable, 'timetable', '', cache, key, limit)
+        )
+        parts.extend(
+            _render_parts(homeworks, 'homework', '', cache, key, limit)
+        )
+    return pack_pages(parts, limit)
+
+
+def render_marks_summary(summary: MarksSummary) -> list[str]:
+    """Блоки со средними оценками по предметам за текущий период,
+    их изменением и итоговыми оценками.
+    """
+    blocks = []
+    if summary.subjects:
+        lines = [f'Оценки за {summary.title}:']
+        for subject, stats in summary.subjects.items():
+            trend = (
+                ' ↑' if stats.trend >= TREND_THRESHOLD
+                else ' ↓' if stats.trend <= -TREND_THRESHOLD
+                else ''
+            )
+            lines.append(
+                f'{subject}: {stats.average:.2f}{trend} '
+                f'({" ".join(map(str, stats.recent))})'
+            )
+        blocks.append(escape('\n'.join(lines)))
+    if summary.finals:
+        lines = ['Итоговые оценки:']
+        lines.extend(
+            f'{title}: ' + ', '.join(
+                f'{subject} {mark}' for subject, mark in finals.items()
+            )
+            for title, finals in summary.finals
+        )
+        blocks.append(escape('\n'.join(lines)))
+    return blocks or [NO_MARKS]
+
+
+def render_marks(
+        summaries: list[tuple[str, MarksSummary]],
+        header: str = '',
+        limit: int = MESSAGE_LIMIT,
+) -> list[str]:
+    """Страницы сообщения с оценками. summaries - пары (заголовок,
+    сводка), заголовок выводится, если выбраны все дети.
+    """
+    blocks = [header] if header else []
+    for title, summary in summaries:
+        if title:
+            blocks.append(escape(title))
+        blocks.extend(render_marks_summary(summary))
+    return split_pages(blocks, limit)
@@ -1,19 +1,59 @@
+import copy
+import time
 from datetime import datetime, timedelta, date
 
 import pytz
 from ruobr_api import Ruobr, AuthenticationException
 
-from ruobr.ruobr_cls import Child, Subject
+from ruobr.http_pool import PooledRuobr, RuobrHttpPool
+from ruobr.ruobr_cls import Child, Lesson, Mark, MarkPeriod, Subject
 from ruobr.ruobr_exception import RuobrIsEmptyError, RuobrIsApplicantError
+from utils.metrics import PARSE_LATENCY
 
 TIMEZONE = 'Asia/Krasnoyarsk'
 SATURDAY_NUM = 5
 SUNDAY_NUM = 6
 
 
-def get_user_ruobr(username: str, password: str) -> Ruobr | None:
-    """Получить авторизованного на ruobr пользователя."""
-    user: Ruobr = Ruobr(username, password)
+class LocalClock:
+    """Текущее время и дата в тайм-зоне timezone. Тайм-зона создается
+    один раз, дата вычисляется заново только после полуночи.
+    """
+
+    def __init__(self, timezone: str):
+        self.tz = pytz.timezone(timezone)
+        self._today = date.min
+        self._next_day_at = 0.0
+
+    def now(self) -> datetime:
+        return datetime.now(self.tz)
+
+    def today(self) -> date:
+        now = time.time()
+        if now >= self._next_day_at:
+            self._today = datetime.fromtimestamp(now, self.tz).date()
+            midnight = datetime.combine(
+                self._today + timedelta(days=1), datetime.min.time()
+            )
+            self._next_day_at = self.tz.localize(midnight).timestamp()
+        return self._today
+
+
+CLOCK = LocalClock(TIMEZONE)
+
+
+def get_user_ruobr(
+        username: str,
+        password: str,
+        pool: RuobrHttpPool | None = None,
+) -> Ruobr | None:
+    """Получить авторизованного на ruobr пользователя. Если передан
+    pool, запросы пользователя идут через общий пул соединений.
+    """
+    user: Ruobr = (
+        PooledRuobr(username, password, pool)
+        if pool is not None else Ruobr(username, password)
+    )
     try:
         user.get_user()
         return user
@@ -21,13 +61,22 @@ def get_user_ruobr(username: str, password: str) -> Ruobr | None:
         return
 
 
+def get_account(username: str) -> str:
+    """Логин в том виде, в каком его хранит Ruobr.username. Запросов
+    к ruobr не делает.
+    """
+    return Ruobr(username, '').username
+
+
 def get_children_for_user(user: Ruobr) -> dict[int, str]:
     """Получить список всех детей пользователя."""
     if user.is_empty:
         raise RuobrIsEmptyError('На аккаунте не обнаружено детей.')
 
     if user.is_applicant:  # Обработка родительского аккаунта
-        children = [Child(**child) for child in user.get_children()]
+        response = user.get_children()
+        with PARSE_LATENCY.time('children'):
+            children = [Child(**child) for child in response]
         return {
             ind + 1: f'{child.first_name} {child.last_name}'
             for ind, child in enumerate(children)
@@ -37,73 +86,106 @@ def get_children_for_user(user: Ruobr) -> dict[int, str]:
 
 
 def get_child(user: Ruobr, child_number: int = 1) -> Ruobr:
-    """Выбрать ребенка пользователя."""
+    """Выбрать ребенка пользователя.
+
+    Возвращает копию user: одна сессия из пула используется
+    одновременно для запросов по разным детям.
+    """
+    user = copy.copy(user)
     user.child = child_number - 1  # Выбрать нужного ребёнка
     return user
 
 
-def homework_for_date(
+def fetch_timetable(
         user: Ruobr, date_start: date, date_end: date
-) -> dict[str, dict[str, list[str]]]:
-    """Получить всю домашнюю работу за указанный период."""
-    timetable = user.get_timetable(date_start, date_end)
-    subjects = [Subject(**subject) for subject in timetable]
-    homeworks = {}
-    for subject in subjects:
-        if subject.task:
-            homework = [task.title for task in subject.task]
-            homeworks.setdefault(subject.date, {})[subject.subject] = homework
-    return homeworks
+) -> list[dict]:
+    """Получить уроки за указанный период в исходном виде."""
+    return user.get_timetable(date_start, date_end)
 
 
-def get_homeworks_for_print(homeworks: dict[str, dict[str, list[str]]]) -> str:
-    """Возвращает сформированную для вывода строку с домашней работой."""
-    hw_for_print = ''
+@PARSE_LATENCY.timed('lessons')
+def parse_lessons(
+        timetable: list[dict], validate: bool = True
+) -> list[Lesson]:
+    """Разобрать ответ ruobr в список уроков. Без validate типы полей
+    не проверяются, берутся только нужные боту поля.
+    """
+    if validate:
+        return [Lesson.from_subject(Subject(**lesson)) for lesson in timetable]
+    return [Lesson.from_dict(lesson) for lesson in timetable]
 
-    for date in homeworks:
-        hw_for_print += f'\n\nДомашнее задание на {date}:'
-        for subject in homeworks[date]:
-            hw_for_print += f'\n{subject}: '
-            hw_for_print += ' '.join(homeworks[date][subject])
 
-    if hw_for_print:
-        return hw_for_print
-    return 'Ура! домашки нет.'
+def fetch_control_marks(user: Ruobr) -> list[dict]:
+    """Получить итоговые оценки по периодам в исходном виде."""
+    return user.get_control_marks()
 
 
-def timetable_for_date(
-        user: Ruobr, date_start: date, date_end: date
+def fetch_marks(user: Ruobr, period: int, subject_id: int) -> list[Mark]:
+    """Получить все оценки по предмету за период."""
+    return parse_marks(user.get_all_marks(period, subject_id))
+
+
+def parse_control_marks(periods: list[dict]) -> list[MarkPeriod]:
+    """Разобрать итоговые оценки. Из ответа берутся только номер
+    и название периода, id и название предмета и оценка.
+    """
+    return [
+        MarkPeriod(
+            period['period'],
+            period.get('title', str(period['period'])),
+            {
+                item['subject_id']: item['subject']
+                for item in period.get('marks') or ()
+            },
+            {
+                item['subject']: str(item['mark'])
+                for item in period.get('marks') or ()
+                if item.get('mark')
+            },
+        )
+        for period in periods or ()
+    ]
+
+
+def parse_marks(data: dict | None) -> list[Mark]:
+    """Разобрать оценки по предмету. Отметки без числового значения,
+    например "н", пропускаются.
+    """
+    marks = []
+    for item in (data or {}).get('marks') or ():
+        value = str(item.get('mark', ''))
+        if value.isdigit():
+            marks.append(Mark(item['id'], item.get('date', ''), int(value)))
+    return marks
+
+
+def parse_homeworks(
+        lessons: list[Lesson]
+) -> dict[str, dict[str, list[str]]]:
+    """Выбрать домашнюю работу из списка уроков."""
+    homeworks = {}
+    for lesson in lessons:
+        if lesson.tasks:
+            homework = [task.title for task in lesson.tasks]
+            homeworks.setdefault(lesson.date, {})[lesson.subject] = homework
+    return homeworks
+
+
+def parse_timetable(
+        lessons: list[Lesson]
 ) -> dict[str, dict[str, tuple[str, str]]]:
-    """Получить расписание за указанный период."""
-    timetable = user.get_timetable(date_start, date_end)
-    subjects = [Subject(**subject) for subject in timetable]
+    """Выбрать время уроков из списка уроков."""
     timetable_date = {}
-    for subject in subjects:
-        timetable_date.setdefault(subject.date, {})[subject.subject] = (
-            subject.time_start, subject.time_end
+    for lesson in lessons:
+        timetable_date.setdefault(lesson.date, {})[lesson.subject] = (
+            lesson.time_start, lesson.time_end
         )
     return timetable_date
 
 
-def get_timetable_for_print(timetable: dict[str, dict[str, tuple[str]]]) -> str:
-    """Возвращает сформированную для вывода строку с расписанием."""
-    timetable_for_print = ''
-    for date in timetable:
-        timetable_for_print += f'\n\nРасписание на {date}:'
-        for subject in timetable[date]:
-            timetable_for_print += (
-                f'\n{timetable[date][subject][0][:5]}'
-                f'-{timetable[date][subject][1][:5]} {subject}'
-            )
-    if timetable_for_print:
-        return timetable_for_print
-    return 'На указанные даты расписания нет!'
-
-
 def get_current_date() -> date:
     """Текущая дата в указанной тайм-зоне."""
-    tz = pytz.timezone(TIMEZONE)
-    return datetime.now(tz).date()
+    return CLOCK.today()
 
 
 def get_tomorrow_date() -> date:
@@ -112,18 +194,16 @@ def get_tomorrow_date() -> date:
     return current_date + timedelta(days=1)
 
 
-def get_homeworks_tomorrow_date(user: Ruobr) -> dict[str, dict[str, list[str]]]:
-    """Получить домашнюю работу на завтра."""
-    tomorrow_date = get_tomorrow_date()
-    return homework_for_date(user, tomorrow_date, tomorrow_date)
+def get_today_period() -> tuple[date, date]:
+    """Получить период из одного сегодняшнего дня."""
+    current_date = get_current_date()
+    return current_date, current_date
 
 
-def get_timetable_tomorrow_date(
-        user: Ruobr
-) -> dict[str, dict[str, tuple[str, str]]]:
-    """Получить расписание на завтра."""
+def get_tomorrow_period() -> tuple[date, date]:
+    """Получить период из одного завтрашнего дня."""
     tomorrow_date = get_tomorrow_date()
-    return timetable_for_date(user, tomorrow_date, tomorrow_date)
+    return tomorrow_date, tomorrow_date
 
 
 def get_date_week() -> tuple[date, date]:
@@ -146,25 +226,57 @@ def get_date_week() -> tuple[date, date]:
     return start_date, end_date
 
 
-def get_homeworks_for_week(user: Ruobr) -> dict[str, dict[str, list[str]]]:
-    """Получить домашнюю работу на неделю."""
-    dates: tuple[date, date] = get_date_week()
-    return homework_for_date(user, dates[0], dates[1])
-
-
-def get_timetable_for_week(user: Ruobr) -> dict[str, dict[str, tuple[str, str]]]:
-    """Получить расписание на неделю."""
-    dates = get_date_week()
-    return timetable_for_date(user, dates[0], dates[1])
-
-
-def get_homeworks_for_today(user: Ruobr) -> dict[str, dict[str, list[str]]]:
-    """Получить домашнюю работу на сегодня."""
-    current_date = get_current_date()
-    return homework_for_date(user, current_date, current_date)
+def get_next_school_period() -> tuple[date, date]:
+    """Получить период с завтрашнего дня до ближайшего учебного дня.
+    Если завтра выходной, период продлевается до понедельника.
+    """
+    tomorrow_date = get_tomorrow_date()
+    tomorrow_weekday = tomorrow_date.weekday()
+    if tomorrow_weekday in (SATURDAY_NUM, SUNDAY_NUM):
+        return tomorrow_date, (
+            tomorrow_date + timedelta(SUNDAY_NUM - tomorrow_weekday + 1)
+        )
+    return tomorrow_date, tomorrow_date
 
 
-def get_timetable_for_today(user: Ruobr) -> dict[str, dict[str, tuple[str, str]]]:
-    """Получить расписание на сегодня."""
-    current_date = get_current_date()
-    return timetable_for_date(user, current_date, current_date)
+def parse_date(text: str, today: date) -> tuple[date, bool]:
+    """Разобрать дату вида 25.03, 25.03.23 или 25.03.2023.
+    Вторым элементом возвращается признак того, что год указан.
+    """
+    for date_format in ('%d.%m.%Y', '%d.%m.%y'):
+        try:
+            return datetime.strptime(text, date_format).date(), True
+        except ValueError:
+            pass
+    day, month = map(int, text.split('.'))
+    return date(today.year, month, day), False
+
+
+def parse_period(text: str, today: date | None = None) -> tuple[date, date]:
+    """Разобрать дату или период вида 25.03-10.04. Если год не указан,
+    берется текущий, а конец периода раньше начала переносится
+    на следующий год. Неверный формат - ValueError.
+    """
+    today = today or get_current_date()
+    start_text, _, end_text = text.replace(' ', '').partition('-')
+    date_start, _ = parse_date(start_text, today)
+    if not end_text:
+        return date_start, date_start
+    date_end, has_year = parse_date(end_text, today)
+    if date_end < date_start and not has_year:
+        date_end = date_end.replace(year=date_end.year + 1)
+    if date_end < date_start:
+        raise ValueError('Конец периода раньше начала.')
+    return date_start, date_end
+
+
+def split_period(
+        date_start: date, date_end: date, days: int = 7
+) -> list[tuple[date, date]]:
+    """Разбить период на части не длиннее days дней."""
+    chunks = []
+    while date_start <= date_end:
+        chunk_end = min(date_end, date_start + timedelta(days=days - 1))
+        chunks.append((date_start, chunk_end))
+        date_start = chunk_end + timedelta(days=1)
+    return chunks
@@ -1,3 +1,5 @@
+from typing import NamedTuple
+
 from pydantic import BaseModel
 
 
@@ -40,4 +42,84 @@ class Subject(BaseModel):
     task: list[Task] | None
     time_end: str
     time_start: str
-    topic: str | None
\ No newline at end of file
+    topic: str | None
+
+
+class HomeworkTask(NamedTuple):
+    id: int
+    deadline: str
+    title: str
+
+
+class Lesson(NamedTuple):
+    """Урок только с теми полями, которые использует бот.
+
+    Кортеж занимает в памяти в несколько раз меньше модели Subject
+    и сериализуется в JSON списком.
+    """
+
+    id: int
+    date: str
+    subject: str
+    time_start: str
+    time_end: str
+    tasks: tuple[HomeworkTask, ...]
+
+    @classmethod
+    def from_subject(cls, subject: Subject) -> 'Lesson':
+        return cls(
+            subject.id,
+            subject.date,
+            subject.subject,
+            subject.time_start,
+            subject.time_end,
+            tuple(
+                HomeworkTask(task.id, task.deadline, task.title)
+                for task in subject.task or ()
+            ),
+        )
+
+    @classmethod
+    def from_dict(cls, lesson: dict) -> 'Lesson':
+        """Взять нужные поля из ответа ruobr без проверки типов."""
+        return cls(
+            lesson['id'],
+            lesson['date'],
+            lesson['subject'],
+            lesson['time_start'],
+            lesson['time_end'],
+            tuple(
+                HomeworkTask(task['id'], task['deadline'], task['title'])
+                for task in lesson.get('task') or ()
+            ),
+        )
+
+    @classmethod
+    def from_row(cls, row: list) -> 'Lesson':
+        """Восстановить урок из JSON-списка."""
+        *fields, tasks = row
+        return cls(*fields, tuple(HomeworkTask(*task) for task in tasks))
+
+
+class Mark(NamedTuple):
+    id: int
+    date: str
+    value: int
+
+
+class MarkPeriod(NamedTuple):
+    """Учебный период из итоговых оценок: предметы с id и итоговые
+    оценки по названию предмета.
+    """
+
+    number: int
+    title: str
+    subjects: dict[int, str]
+    finals: dict[str, str]
+
+    @property
+    def closed(self) -> bool:
+        """Итоговые оценки выставлены по всем предметам."""
+        return bool(self.subjects) and all(
+            self.finals.get(subject) for subject in self.subjects.values()
+        )
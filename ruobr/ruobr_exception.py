@@ -3,4 +3,16 @@ class RuobrIsEmptyError(Exception):
 
 
 class RuobrIsApplicantError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+class RuobrUnavailableError(Exception):
+    """Ruobr недоступен. В stale могут быть устаревшие данные из кэша."""
+
+    def __init__(self, message: str, stale=None):
+        super().__init__(message)
+        self.stale = stale
+
+
+class RuobrTimeoutError(RuobrUnavailableError):
+    pass
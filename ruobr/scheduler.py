@@ -0,0 +1,123 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar, Token
+from typing import AsyncIterator, Hashable
+
+from utils.metrics import RUOBR_QUEUE_WAIT
+
+# Чем меньше приоритет, тем раньше запрос получает слот
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = ('interactive', 'background')
+
+# Чей запрос выполняется: чат и приоритет. Запросы вне обработчиков
+# (предзагрузка, уведомления, дайджест) считаются фоновыми
+_request: ContextVar[tuple[Hashable, int]] = ContextVar(
+    'request', default=(None, PRIORITY_BACKGROUND)
+)
+
+
+def set_interactive(chat_id: int) -> Token:
+    """Считать запросы текущего контекста интерактивными запросами
+    чата chat_id.
+    """
+    return _request.set((chat_id, PRIORITY_INTERACTIVE))
+
+
+def reset_request(token: Token) -> None:
+    _request.reset(token)
+
+
+class FairScheduler:
+    """Честная очередь запросов к ruobr.
+
+    Одновременно выполняется не больше concurrency запросов. Остальные
+    ждут в очередях своих чатов: сначала слоты получают запросы
+    из обработчиков, потом фоновые. Внутри приоритета чаты
+    обслуживаются по кругу, по одному запросу, поэтому долгая загрузка
+    в одном чате не задерживает нажатия кнопок в других.
+    """
+
+    def __init__(self, concurrency: int = 8):
+        self.concurrency = concurrency
+        self.active = 0
+        self._queues: tuple[OrderedDict[Hashable, deque], ...] = tuple(
+            OrderedDict() for _ in PRIORITY_NAMES
+        )
+        self.waiting = [0] * len(PRIORITY_NAMES)
+        self.max_waiting = 0
+        self.cancelled = 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Занять слот от имени чата из текущего контекста."""
+        owner, priority = _request.get()
+        await self.acquire(owner, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, owner: Hashable, priority: int) -> None:
+        if self.active < self.concurrency and not any(self.waiting):
+            self.active += 1
+            RUOBR_QUEUE_WAIT.observe(0, PRIORITY_NAMES[priority])
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(owner, deque()).append(waiter)
+        self.waiting[priority] += 1
+        self.max_waiting = max(self.max_waiting, sum(self.waiting))
+        start = time.monotonic()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            if waiter.cancelled():
+                self._remove(owner, priority, waiter)
+            else:
+                # Слот уже передан этому запросу
+                self.release()
+            raise
+        RUOBR_QUEUE_WAIT.observe(
+            time.monotonic() - start, PRIORITY_NAMES[priority]
+        )
+
+    def _remove(
+            self, owner: Hashable, priority: int, waiter: asyncio.Future
+    ) -> None:
+        queue = self._queues[priority].get(owner)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        self.waiting[priority] -= 1
+        if not queue:
+            del self._queues[priority][owner]
+
+    def release(self) -> None:
+        """Передать слот следующему запросу или освободить его."""
+        for priority, queues in enumerate(self._queues):
+            while queues:
+                owner, queue = next(iter(queues.items()))
+                waiter = queue.popleft()
+                self.waiting[priority] -= 1
+                if queue:
+                    queues.move_to_end(owner)
+                else:
+                    del queues[owner]
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self.active -= 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'queue_active': self.active,
+            **{
+                f'queue_{name}': waiting
+                for name, waiting in zip(PRIORITY_NAMES, self.waiting)
+            },
+            'queue_max_waiting': self.max_waiting,
+            'queue_cancelled': self.cancelled,
+        }
@@ -0,0 +1,180 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, TypeVar
+
+from ruobr_api import Ruobr, AuthenticationException
+
+from ruobr.cache import ChildrenCache
+from ruobr.gateway import RuobrGateway
+from ruobr.ruobr import get_child
+from ruobr.vault import CredentialVault
+from utils.metrics import CACHE_REQUESTS
+
+T = TypeVar('T')
+
+# Номер ребенка в данных состояния, если выбраны все дети
+ALL_CHILDREN = 0
+
+
+@dataclass
+class Session:
+    user: Ruobr
+    expires_at: float
+
+
+class RuobrSessionPool:
+    """Пул авторизованных сессий Ruobr по токену из CredentialVault.
+
+    Логин и пароль расшифровываются и проверяются в ruobr только при
+    создании сессии, одновременные входы по одному токену объединяются
+    в один. Список детей хранится в children_cache, если он
+    передан. Сессия живёт ttl секунд, при превышении max_size
+    вытесняется давно не использованная сессия. Если ruobr отвечает
+    AuthenticationException, сессия пересоздаётся один раз.
+    """
+
+    def __init__(
+            self,
+            gateway: RuobrGateway,
+            vault: CredentialVault,
+            max_size: int = 1000,
+            ttl: float = 1800,
+            children_cache: ChildrenCache | None = None,
+    ):
+        self.gateway = gateway
+        self.vault = vault
+        self.children_cache = children_cache
+        self.max_size = max_size
+        self.ttl = ttl
+        self._sessions: OrderedDict[str, Session] = OrderedDict()
+
+    def _lookup(self, token: str) -> Ruobr | None:
+        session = self._sessions.get(token)
+        if session is None:
+            return None
+        if session.expires_at < time.monotonic():
+            del self._sessions[token]
+            return None
+        self._sessions.move_to_end(token)
+        return session.user
+
+    def put(self, token: str, user: Ruobr) -> None:
+        """Сохранить авторизованную сессию."""
+        self._sessions[token] = Session(user, time.monotonic() + self.ttl)
+        self._sessions.move_to_end(token)
+        while len(self._sessions) > self.max_size:
+            self._sessions.popitem(last=False)
+
+    def invalidate(self, token: str) -> None:
+        """Удалить сессию."""
+        self._sessions.pop(token, None)
+
+    async def forget(self, token: str) -> None:
+        """Удалить сессию и логин с паролем из хранилища."""
+        self.invalidate(token)
+        await self.vault.delete(token)
+        if self.children_cache is not None:
+            await self.children_cache.invalidate(token)
+
+    async def get(self, token: str) -> Ruobr | None:
+        """Получить сессию из пула или авторизоваться заново."""
+        user = self._lookup(token)
+        if user is not None:
+            CACHE_REQUESTS.inc('sessions', 'hit')
+            return user
+        CACHE_REQUESTS.inc('sessions', 'miss')
+        # Одновременные промахи по одному токену - один вход в ruobr
+        return await self.gateway.single_flight.do(
+            ('login', token), self._login, token
+        )
+
+    async def _login(self, token: str) -> Ruobr | None:
+        credentials = await self.vault.load(token)
+        if credentials is None:
+            return None
+        user = await self.gateway.get_user_ruobr(*credentials)
+        if user:
+            self.put(token, user)
+        return user
+
+    async def children(self, token: str) -> dict[int, str]:
+        """Дети аккаунта: из кэша или из авторизованной сессии."""
+        if self.children_cache is not None:
+            children = await self.children_cache.get(token)
+            if children is not None:
+                return children
+        user = await self.get(token)
+        if user is None:
+            raise AuthenticationException('Проверьте логин и/или пароль')
+        children = await self.gateway.get_children_for_user(user)
+        await self.set_children(token, children)
+        return children
+
+    async def set_children(
+            self, token: str, children: dict[int, str]
+    ) -> None:
+        """Сохранить детей аккаунта в кэш."""
+        if self.children_cache is not None:
+            await self.children_cache.set(token, children)
+
+    async def resolve_children(self, token: str, child: int) -> list[int]:
+        """Номера детей для child из данных состояния: выбранный
+        ребенок или все дети.
+        """
+        if child != ALL_CHILDREN:
+            return [child]
+        return list(await self.children(token))
+
+    async def call(
+            self,
+            token: str,
+            func: Callable[..., Awaitable[T]],
+            *args: Any,
+            child: int = 1,
+    ) -> T:
+        """Вызвать func(user, *args) для сессии токена.
+        При ошибке авторизации сессия пересоздаётся и вызов повторяется.
+        """
+        user = await self.get(token)
+        if user is None:
+            raise AuthenticationException('Проверьте логин и/или пароль')
+        try:
+            return await func(get_child(user, child), *args)
+        except AuthenticationException:
+            self.invalidate(token)
+            user = await self.get(token)
+            if user is None:
+                raise
+            return await func(get_child(user, child), *args)
+
+
+@dataclass
+class UserSession:
+    """Сессия пользователя, которую SessionMiddleware передает
+    в обработчики.
+    """
+
+    token: str
+    pool: RuobrSessionPool
+    child: int = 1
+
+    async def user(self) -> Ruobr | None:
+        """Авторизованный пользователь ruobr."""
+        return await self.pool.get(self.token)
+
+    async def children(self) -> dict[int, str]:
+        return await self.pool.children(self.token)
+
+    async def call(
+            self,
+            func: Callable[..., Awaitable[T]],
+            *args: Any,
+            child: int | None = None,
+    ) -> T:
+        """Вызвать func(user, *args) для ребенка child, по умолчанию
+        для выбранного ребенка.
+        """
+        return await self.pool.call(
+            self.token, func, *args, child=child or self.child or 1
+        )
@@ -0,0 +1,35 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """Объединяет одновременные одинаковые запросы.
+
+    Пока запрос с ключом key выполняется, повторные вызовы с тем же ключом
+    не идут в ruobr, а ждут результат уже выполняющегося запроса.
+    """
+
+    def __init__(self):
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(
+            self,
+            key: Hashable,
+            func: Callable[..., Awaitable[T]],
+            *args: Any,
+    ) -> T:
+        """Выполнить func(*args) или дождаться уже идущего вызова."""
+        task = self._tasks.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(func(*args))
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield: отмена одного ожидающего не отменяет запрос для остальных
+        return await asyncio.shield(task)
@@ -0,0 +1,94 @@
+import base64
+import json
+import logging
+import secrets
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from redis.asyncio.client import Redis
+
+from filters.filters import UserRuobr
+
+logger = logging.getLogger(__name__)
+
+VAULT_PREFIX = 'ruobr:vault'
+# Поля, в которых прежние версии бота хранили логин и пароль в base64
+LEGACY_FIELDS = ('username', 'password')
+
+
+class CredentialVault:
+    """Зашифрованное хранилище логинов и паролей ruobr в redis.
+
+    В данных состояния пользователя хранится только случайный токен,
+    по которому из хранилища можно получить логин и пароль. Первый из
+    keys - основной ключ, им шифруются новые записи; остальные нужны,
+    чтобы прочитать записи, зашифрованные прежними ключами, до ротации.
+    """
+
+    def __init__(self, redis: Redis, keys: list[str]):
+        if not keys:
+            raise ValueError('Не задан ключ шифрования VAULT_KEYS')
+        self.redis = redis
+        self.fernet = MultiFernet([Fernet(key) for key in keys])
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return f'{VAULT_PREFIX}:{token}'
+
+    async def store(self, username: str, password: str) -> str:
+        """Зашифровать логин и пароль и вернуть токен записи."""
+        token = secrets.token_urlsafe(24)
+        value = self.fernet.encrypt(
+            json.dumps([username, password]).encode('UTF-8')
+        )
+        await self.redis.set(self._key(token), value)
+        return token
+
+    async def load(self, token: str) -> UserRuobr | None:
+        """Получить логин и пароль по токену или None, если записи нет
+        или она не расшифровывается ни одним из ключей.
+        """
+        value = await self.redis.get(self._key(token))
+        if value is None:
+            return None
+        try:
+            return UserRuobr(*json.loads(self.fernet.decrypt(value)))
+        except InvalidToken:
+            logger.warning('Vault entry %s... cannot be decrypted', token[:6])
+            return None
+
+    async def delete(self, token: str) -> None:
+        await self.redis.delete(self._key(token))
+
+    async def migrate(self, data: dict) -> str | None:
+        """Перенести в хранилище логин и пароль, сохраненные в base64
+        в данных состояния. Из data они удаляются, вместо них
+        записывается token. Возвращает токен или None, если переносить
+        нечего.
+        """
+        if not all(data.get(field) for field in LEGACY_FIELDS):
+            return None
+        username, password = (
+            base64.b64decode(data.pop(field).encode('UTF-8')).decode('UTF-8')
+            for field in LEGACY_FIELDS
+        )
+        data['token'] = await self.store(username, password)
+        return data['token']
+
+    async def rotate(self) -> int:
+        """Перешифровать все записи основным ключом. После этого
+        прежние ключи можно убрать из VAULT_KEYS.
+        """
+        count = 0
+        async for key in self.redis.scan_iter(match=f'{VAULT_PREFIX}:*'):
+            value = await self.redis.get(key)
+            if value is None:
+                continue
+            try:
+                rotated = self.fernet.rotate(value)
+            except InvalidToken:
+                logger.warning('Vault entry %s cannot be decrypted', key)
+                continue
+            # Не перезаписывать запись, удаленную во время ротации
+            if await self.redis.set(key, rotated, xx=True):
+                count += 1
+        return count
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+from datetime import date, datetime, time
+
+from aiogram import Bot
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+
+from lexicon.lexicon import LEXICON
+from ruobr.gateway import RuobrGateway
+from ruobr.render import RenderCache, render_digest
+from ruobr.ruobr import (
+    CLOCK, get_tomorrow_period, parse_homeworks, parse_timetable,
+)
+from ruobr.ruobr_cls import Lesson
+from ruobr.ruobr_exception import RuobrUnavailableError
+from ruobr.sessions import ALL_CHILDREN, RuobrSessionPool
+from services.prefetch import seconds_until
+from services.sender import PRIORITY_NOTIFY, OutboundSender
+from utils.credentials import get_token
+
+logger = logging.getLogger(__name__)
+
+DIGEST_KEY = 'ruobr:digest'
+MINUTES_PER_DAY = 24 * 60
+
+
+class DigestScheduler:
+    """Каждый день присылает подписчикам расписание и домашнюю работу
+    на завтра в выбранное ими время.
+
+    Время округляется вниз до bucket минут, подписчики одной группы
+    обрабатываются вместе: не больше concurrency одновременно.
+    Для каждого ребенка уроки загружаются одним запросом, из них
+    получаются и расписание, и ДЗ. Блоки дней рисуются через общий
+    RenderCache, поэтому кнопки на завтра после дайджеста их не
+    рисуют заново.
+    """
+
+    def __init__(
+            self,
+            bot: Bot,
+            storage: RedisStorage,
+            gateway: RuobrGateway,
+            sessions: RuobrSessionPool,
+            sender: OutboundSender,
+            renders: RenderCache | None = None,
+            bucket: int = 15,
+            concurrency: int = 4,
+    ):
+        self.bot = bot
+        self.storage = storage
+        self.redis = storage.redis
+        self.gateway = gateway
+        self.sessions = sessions
+        self.sender = sender
+        self.renders = renders
+        self.bucket = bucket
+        self.concurrency = concurrency
+
+    def round_time(self, at: time) -> time:
+        """Время начала группы, в которую попадает at."""
+        minute = (at.hour * 60 + at.minute) // self.bucket * self.bucket
+        return time(minute // 60, minute % 60)
+
+    async def subscribe(self, chat_id: int, user_id: int, at: time) -> time:
+        """Подписать на дайджест и вернуть время, когда он будет
+        приходить.
+        """
+        at = self.round_time(at)
+        await self.redis.zadd(
+            DIGEST_KEY, {f'{chat_id}:{user_id}': at.hour * 60 + at.minute}
+        )
+        return at
+
+    async def unsubscribe(self, chat_id: int, user_id: int) -> None:
+        await self.redis.zrem(DIGEST_KEY, f'{chat_id}:{user_id}')
+
+    async def chat_blocked(self, chat_id: int) -> None:
+        """Отписать чат, который заблокировал бота."""
+        await self.unsubscribe(chat_id, chat_id)
+
+    async def get_time(self, chat_id: int, user_id: int) -> time | None:
+        minute = await self.redis.zscore(DIGEST_KEY, f'{chat_id}:{user_id}')
+        if minute is None:
+            return None
+        return time(int(minute) // 60, int(minute) % 60)
+
+    def _next_bucket(self) -> int:
+        now = CLOCK.now()
+        minute = now.hour * 60 + now.minute + 1
+        return -(-minute // self.bucket) * self.bucket % MINUTES_PER_DAY
+
+    async def run(self) -> None:
+        """Бесконечный цикл отправки дайджестов по группам."""
+        minute = self._next_bucket()
+        while True:
+            wait = seconds_until(time(minute // 60, minute % 60))
+            # Предыдущая группа обрабатывалась дольше bucket минут
+            if wait > (MINUTES_PER_DAY - self.bucket) * 60:
+                wait = 0
+            await asyncio.sleep(wait)
+            try:
+                await self.send_bucket(minute)
+            except Exception:
+                logger.exception('Digest for minute %d failed', minute)
+            minute = (minute + self.bucket) % MINUTES_PER_DAY
+
+    async def send_bucket(self, minute: int) -> None:
+        """Отправить дайджест подписчикам группы minute."""
+        members = await self.redis.zrangebyscore(
+            DIGEST_KEY, minute, minute + self.bucket - 1
+        )
+        period = get_tomorrow_period()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(member: bytes | str) -> None:
+            if isinstance(member, bytes):
+                member = member.decode('UTF-8')
+            chat_id, user_id = map(int, member.split(':'))
+            async with semaphore:
+                try:
+                    await self.send_digest(chat_id, user_id, period)
+                except Exception as error:
+                    logger.warning(
+                        'Digest for chat %s failed: %r', chat_id, error
+                    )
+
+        await asyncio.gather(*[send(member) for member in members])
+        logger.info(
+            'Sent digest %02d:%02d to %d chats', *divmod(minute, 60),
+            len(members),
+        )
+
+    async def _load_lessons(
+            self, token: str, child: int, period: tuple[date, date]
+    ) -> list[Lesson]:
+        try:
+            return await self.sessions.call(
+                token, self.gateway.get_timetable, *period, child=child
+            )
+        except RuobrUnavailableError as error:
+            if error.stale is None:
+                raise
+            return error.stale
+
+    async def send_digest(
+            self, chat_id: int, user_id: int, period: tuple[date, date]
+    ) -> None:
+        """Загрузить уроки на завтра и поставить дайджест в очередь.
+        Если завтра уроков нет, дайджест не отправляется.
+        """
+        state = FSMContext(
+            self.bot,
+            self.storage,
+            StorageKey(bot_id=self.bot.id, chat_id=chat_id, user_id=user_id),
+        )
+        data = await state.get_data()
+        token = await get_token(state, self.sessions.vault, data)
+        if token is None:
+            return
+        child = int(data.get('child', 1))
+        children = await self.sessions.resolve_children(token, child)
+        results = await asyncio.gather(*[
+            self._load_lessons(token, number, period) for number in children
+        ])
+        if not any(results):
+            return
+        names = (
+            await self.sessions.children(token)
+            if child == ALL_CHILDREN else {}
+        )
+        pages = render_digest(
+            [
+                (
+                    names.get(number, ''), (token, number),
+                    parse_timetable(lessons), parse_homeworks(lessons),
+                )
+                for number, lessons in zip(children, results)
+            ],
+            header=LEXICON['digest_header'].format(
+                period[0].strftime('%d.%m')
+            ),
+            cache=self.renders,
+        )
+        for page in pages:
+            await self.sender.send(chat_id, page, PRIORITY_NOTIFY)
+
+
+def parse_digest_time(text: str) -> time:
+    """Время дайджеста в формате 19:30. Вызывает ValueError."""
+    return datetime.strptime(text.strip(), '%H:%M').time()
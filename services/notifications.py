@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import logging
+from datetime import timedelta
+
+from aiogram import Bot
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+
+from lexicon.lexicon import LEXICON
+from ruobr.gateway import RuobrGateway
+from ruobr.render import render_sections
+from ruobr.ruobr import get_current_date, parse_homeworks
+from ruobr.ruobr_cls import Lesson
+from ruobr.sessions import ALL_CHILDREN, RuobrSessionPool
+from services.sender import PRIORITY_NOTIFY, OutboundSender
+from utils.credentials import get_token
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBERS_KEY = 'ruobr:subscribers'
+SNAPSHOT_PREFIX = 'ruobr:homework_snapshot'
+# Поле снимка с последним днем проверенного периода
+SNAPSHOT_MARKER = 'checked'
+
+
+def homework_hash(lesson: Lesson) -> str | None:
+    """Короткий хэш домашней работы урока или None, если ДЗ нет."""
+    if not lesson.tasks:
+        return None
+    digest = hashlib.blake2b(digest_size=8)
+    for task in sorted(lesson.tasks):
+        digest.update(f'{task.id}\0{task.deadline}\0{task.title}\0'.encode())
+    return digest.hexdigest()
+
+
+class HomeworkNotifier:
+    """Периодически проверяет домашнюю работу подписчиков и присылает
+    сообщение, если она появилась или изменилась.
+
+    Для каждого подписчика хранится только хэш ДЗ каждого урока
+    и последний день проверенного периода. О днях, которые только
+    вошли в период проверки, не сообщается: их ДЗ могло быть задано
+    давно, оно только запоминается.
+    Подписчики обрабатываются не чаще rate в секунду, одновременно
+    выполняется не больше concurrency проверок. Сообщения отправляются
+    через очередь sender.
+    """
+
+    def __init__(
+            self,
+            bot: Bot,
+            storage: RedisStorage,
+            gateway: RuobrGateway,
+            sessions: RuobrSessionPool,
+            sender: OutboundSender,
+            interval: float = 30 * 60,
+            days: int = 7,
+            rate: float = 5,
+            concurrency: int = 4,
+    ):
+        self.bot = bot
+        self.storage = storage
+        self.redis = storage.redis
+        self.gateway = gateway
+        self.sessions = sessions
+        self.sender = sender
+        self.interval = interval
+        self.days = days
+        self.rate = rate
+        self.concurrency = concurrency
+
+    async def subscribe(self, chat_id: int, user_id: int) -> None:
+        await self.redis.sadd(SUBSCRIBERS_KEY, f'{chat_id}:{user_id}')
+
+    async def unsubscribe(self, chat_id: int, user_id: int) -> None:
+        await self.redis.srem(SUBSCRIBERS_KEY, f'{chat_id}:{user_id}')
+        await self.redis.delete(f'{SNAPSHOT_PREFIX}:{chat_id}')
+
+    async def chat_blocked(self, chat_id: int) -> None:
+        """Отписать чат, который заблокировал бота. В личном чате id
+        пользователя совпадает с id чата.
+        """
+        await self.unsubscribe(chat_id, chat_id)
+
+    async def run(self) -> None:
+        """Бесконечный цикл проверки домашней работы."""
+        while True:
+            try:
+                await self.check_all()
+            except Exception:
+                logger.exception('Homework check failed')
+            await asyncio.sleep(self.interval)
+
+    async def check_all(self) -> None:
+        """Проверить домашнюю работу всех подписчиков."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks: set[asyncio.Task] = set()
+        async for member in self.redis.sscan_iter(SUBSCRIBERS_KEY):
+            if isinstance(member, bytes):
+                member = member.decode('UTF-8')
+            chat_id, user_id = map(int, member.split(':'))
+            await asyncio.sleep(1 / self.rate)
+            await semaphore.acquire()
+            task = asyncio.create_task(self._check(chat_id, user_id))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            task.add_done_callback(lambda _: semaphore.release())
+        await asyncio.gather(*tasks)
+
+    async def _check(self, chat_id: int, user_id: int) -> None:
+        try:
+            await self.check_subscriber(chat_id, user_id)
+        except Exception as error:
+            logger.warning(
+                'Homework check for chat %s failed: %r', chat_id, error
+            )
+
+    async def check_subscriber(self, chat_id: int, user_id: int) -> None:
+        """Сравнить ДЗ подписчика с сохраненным снимком и отправить
+        новое или измененное.
+        """
+        state = FSMContext(
+            self.bot,
+            self.storage,
+            StorageKey(bot_id=self.bot.id, chat_id=chat_id, user_id=user_id),
+        )
+        data = await state.get_data()
+        token = await get_token(state, self.sessions.vault, data)
+        if token is None:
+            return
+        child = int(data.get('child', 1))
+        children = await self.sessions.resolve_children(token, child)
+        date_start = get_current_date()
+        date_end = date_start + timedelta(days=self.days)
+        results = await asyncio.gather(*[
+            self.sessions.call(
+                token,
+                self.gateway.refresh_timetable,
+                date_start, date_end,
+                child=number,
+            )
+            for number in children
+        ])
+        snapshot_key = f'{SNAPSHOT_PREFIX}:{chat_id}'
+        snapshot = await self.redis.hgetall(snapshot_key)
+        # В снимках прежних версий день не записан: проверяются все дни
+        checked_until = (
+            snapshot.get(SNAPSHOT_MARKER.encode()) or b'9999-12-31'
+        ).decode()
+        hashes = {SNAPSHOT_MARKER: date_end.isoformat()}
+        changed: dict[int, list[Lesson]] = {}
+        for number, lessons in zip(children, results):
+            for lesson in lessons:
+                lesson_hash = homework_hash(lesson)
+                if lesson_hash is None:
+                    continue
+                lesson_id = str(lesson.id)
+                hashes[lesson_id] = lesson_hash
+                if (
+                    lesson.date <= checked_until
+                    and snapshot.get(lesson_id.encode())
+                    != lesson_hash.encode()
+                ):
+                    changed.setdefault(number, []).append(lesson)
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(snapshot_key)
+            pipe.hset(snapshot_key, mapping=hashes)
+            await pipe.execute()
+
+        # При первой проверке снимка еще нет, сообщать не о чем
+        if snapshot and changed:
+            names = (
+                await self.sessions.children(token)
+                if child == ALL_CHILDREN else {}
+            )
+            for page in render_sections(
+                    'homework',
+                    [
+                        (names.get(number, ''), (), parse_homeworks(lessons))
+                        for number, lessons in changed.items()
+                    ],
+                    header=LEXICON['homework_changed'],
+            ):
+                await self.sender.send(chat_id, page, PRIORITY_NOTIFY)
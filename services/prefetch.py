@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import random
+from datetime import date, time, timedelta
+from typing import AsyncIterator
+
+from aiogram import Bot
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+
+from ruobr.gateway import RuobrGateway
+from ruobr.ruobr import CLOCK, get_next_school_period
+from ruobr.sessions import RuobrSessionPool
+from ruobr.vault import LEGACY_FIELDS
+from utils.credentials import get_token
+
+logger = logging.getLogger(__name__)
+
+
+def seconds_until(run_at: time) -> float:
+    """Сколько секунд осталось до ближайшего наступления run_at."""
+    now = CLOCK.now()
+    next_run = now.replace(
+        hour=run_at.hour, minute=run_at.minute, second=0, microsecond=0
+    )
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def iter_active_users(
+        bot: Bot, storage: RedisStorage
+) -> AsyncIterator[tuple[StorageKey, dict]]:
+    """Перебрать пользователей, которые вошли в ruobr."""
+    async for redis_key in storage.redis.scan_iter(match='fsm:*:data'):
+        if isinstance(redis_key, bytes):
+            redis_key = redis_key.decode('UTF-8')
+        _, chat_id, user_id, _ = redis_key.split(':')
+        key = StorageKey(
+            bot_id=bot.id, chat_id=int(chat_id), user_id=int(user_id)
+        )
+        data = await storage.get_data(bot=bot, key=key)
+        if data.get('token') or all(
+                data.get(field) for field in LEGACY_FIELDS
+        ):
+            yield key, data
+
+
+class PrefetchScheduler:
+    """Каждый день в run_at загружает в кэш расписание на ближайший
+    учебный день для всех пользователей.
+
+    Запросы запускаются не чаще rate в секунду со случайной задержкой
+    до jitter секунд, одновременно выполняется не больше concurrency.
+    """
+
+    def __init__(
+            self,
+            bot: Bot,
+            storage: RedisStorage,
+            gateway: RuobrGateway,
+            sessions: RuobrSessionPool,
+            run_at: time,
+            rate: float = 5,
+            concurrency: int = 4,
+            jitter: float = 1,
+            ttl: int = 6 * 60 * 60,
+    ):
+        self.bot = bot
+        self.storage = storage
+        self.gateway = gateway
+        self.sessions = sessions
+        self.run_at = run_at
+        self.rate = rate
+        self.concurrency = concurrency
+        self.jitter = jitter
+        self.ttl = ttl
+
+    async def run(self) -> None:
+        """Бесконечный цикл планировщика."""
+        while True:
+            await asyncio.sleep(seconds_until(self.run_at))
+            try:
+                await self.prefetch_all()
+            except Exception:
+                logger.exception('Prefetch failed')
+
+    async def prefetch_all(self) -> None:
+        """Загрузить расписание всех пользователей."""
+        date_start, date_end = get_next_school_period()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks: set[asyncio.Task] = set()
+        count = 0
+        async for key, data in iter_active_users(self.bot, self.storage):
+            await asyncio.sleep(
+                1 / self.rate + random.uniform(0, self.jitter)
+            )
+            await semaphore.acquire()
+            task = asyncio.create_task(
+                self._prefetch_user(key, data, date_start, date_end)
+            )
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            task.add_done_callback(lambda _: semaphore.release())
+            count += 1
+        await asyncio.gather(*tasks)
+        logger.info(
+            'Prefetched timetable %s - %s for %d users',
+            date_start, date_end, count,
+        )
+
+    async def _prefetch_user(
+            self,
+            key: StorageKey,
+            data: dict,
+            date_start: date,
+            date_end: date,
+    ) -> None:
+        try:
+            token = await get_token(
+                FSMContext(self.bot, self.storage, key),
+                self.sessions.vault,
+                data,
+            )
+            if token is None:
+                return
+            for child in await self.sessions.resolve_children(
+                    token, int(data.get('child', 1))
+            ):
+                await self.sessions.call(
+                    token,
+                    self.gateway.refresh_timetable,
+                    date_start, date_end, self.ttl,
+                    child=child,
+                )
+        except Exception as error:
+            logger.warning(
+                'Prefetch for chat %s failed: %r', key.chat_id, error
+            )
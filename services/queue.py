@@ -0,0 +1,310 @@
+import asyncio
+import json
+import logging
+import time
+from functools import partial
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from redis.asyncio.client import Redis
+from redis.exceptions import ResponseError
+
+logger = logging.getLogger(__name__)
+
+STREAM_PREFIX = 'ruobr:updates'
+GROUP_NAME = 'workers'
+LEASE_PREFIX = 'ruobr:updates-lease'
+HEARTBEAT_PREFIX = 'ruobr:updates-worker'
+
+# Продлить или снять аренду потока, только если она принадлежит воркеру
+RENEW_LEASE = '''
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+'''
+RELEASE_LEASE = '''
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+'''
+
+
+def get_chat_id(update: dict) -> int:
+    """Найти id чата в необработанном обновлении Telegram."""
+    for event in update.values():
+        if not isinstance(event, dict):
+            continue
+        if 'chat' in event:
+            return event['chat']['id']
+        if 'message' in event and 'chat' in event['message']:
+            return event['message']['chat']['id']
+        if 'from' in event:
+            return event['from']['id']
+    return 0
+
+
+def get_callback_message(update: dict) -> tuple[int, int] | None:
+    """Чат и сообщение, под которым нажата кнопка, если обновление -
+    нажатие инлайн-кнопки.
+    """
+    message = update.get('callback_query', {}).get('message')
+    if message is None:
+        return None
+    return message['chat']['id'], message['message_id']
+
+
+class UpdateQueue:
+    """Очередь обновлений в Redis Streams.
+
+    Обновления раскладываются по partitions потокам по id чата, поэтому
+    обновления одного чата всегда попадают в один поток и сохраняют
+    порядок.
+    """
+
+    def __init__(
+            self,
+            redis: Redis,
+            partitions: int = 16,
+            maxlen: int = 100_000,
+    ):
+        self.redis = redis
+        self.partitions = partitions
+        self.maxlen = maxlen
+
+    def stream(self, partition: int) -> str:
+        return f'{STREAM_PREFIX}:{partition}'
+
+    async def enqueue(self, update: dict) -> None:
+        """Положить обновление в поток его чата."""
+        partition = get_chat_id(update) % self.partitions
+        await self.redis.xadd(
+            self.stream(partition),
+            {'update': json.dumps(update, ensure_ascii=False)},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+
+
+class UpdateWorker:
+    """Обработчик обновлений из очереди.
+
+    Поток одновременно читает только один воркер - тот, у кого аренда
+    потока в Redis. Аренда живет lease_ms и продлевается, пока воркер
+    работает. Воркер с номером index из workers берет в аренду потоки,
+    номер которых по модулю workers равен index. Если воркер с другим
+    номером не отмечается в Redis дольше lease_ms (остановлен или
+    workers уменьшено), его потоки берет живой воркер и отдает
+    обратно, когда тот вернется.
+
+    Обновления одного чата обрабатываются по очереди, разных чатов -
+    параллельно, но не больше concurrency одновременно. Взяв поток,
+    воркер сначала обрабатывает свои неподтвержденные сообщения,
+    а зависшие дольше claim_idle_ms у других потребителей забирает
+    через XAUTOCLAIM. Свои еще обрабатываемые сообщения при этом
+    пропускаются. Новое нажатие кнопки сразу отменяет обработку
+    предыдущего нажатия под тем же сообщением
+    (см. ChatSchedulerMiddleware), не дожидаясь своей очереди.
+    """
+
+    def __init__(
+            self,
+            dp: Dispatcher,
+            bot: Bot,
+            queue: UpdateQueue,
+            index: int = 0,
+            workers: int = 1,
+            concurrency: int = 64,
+            batch: int = 100,
+            block_ms: int = 5000,
+            claim_idle_ms: int = 60_000,
+            lease_ms: int = 30_000,
+    ):
+        self.dp = dp
+        self.bot = bot
+        self.queue = queue
+        self.redis = queue.redis
+        self.index = index
+        self.workers = workers
+        self.consumer = f'worker-{index}'
+        self.partitions = [
+            partition for partition in range(queue.partitions)
+            if partition % workers == index
+        ]
+        self.batch = batch
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.lease_ms = lease_ms
+        self._renew_lease = self.redis.register_script(RENEW_LEASE)
+        self._release_lease = self.redis.register_script(RELEASE_LEASE)
+        self._consumers: dict[int, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._chains: dict[int, asyncio.Task] = {}
+        self._in_flight: set[tuple[str, bytes]] = set()
+        self.taken_over = 0
+
+    @staticmethod
+    def lease_key(partition: int) -> str:
+        return f'{LEASE_PREFIX}:{partition}'
+
+    @staticmethod
+    def heartbeat_key(index: int) -> str:
+        return f'{HEARTBEAT_PREFIX}:{index}'
+
+    async def run(self) -> None:
+        """Обрабатывать потоки до отмены."""
+        try:
+            while True:
+                await self._rebalance()
+                # Аренда продлевается с запасом в два пропущенных раза
+                await asyncio.sleep(self.lease_ms / 3000)
+        finally:
+            for partition in list(self._consumers):
+                await self._stop(partition)
+            await self.redis.delete(self.heartbeat_key(self.index))
+
+    async def _rebalance(self) -> None:
+        """Отметиться в Redis, продлить аренду своих потоков и взять
+        потоки, которые никто не читает.
+        """
+        await self.redis.set(
+            self.heartbeat_key(self.index), 1, px=self.lease_ms
+        )
+        alive = await self.redis.mget([
+            self.heartbeat_key(index) for index in range(self.workers)
+        ])
+        for partition in range(self.queue.partitions):
+            home = partition % self.workers
+            task = self._consumers.get(partition)
+            if task is not None:
+                if task.done():
+                    if not task.cancelled() and task.exception():
+                        logger.error(
+                            'Partition %d consumer failed',
+                            partition, exc_info=task.exception(),
+                        )
+                elif home == self.index or alive[home] is None:
+                    if await self._renew_lease(
+                            keys=[self.lease_key(partition)],
+                            args=[self.consumer, self.lease_ms],
+                    ):
+                        continue
+                # Поток упал, аренда потеряна или вернулся воркер,
+                # за которым закреплен поток
+                await self._stop(partition)
+            elif home == self.index or alive[home] is None:
+                if await self.redis.set(
+                        self.lease_key(partition), self.consumer,
+                        nx=True, px=self.lease_ms,
+                ):
+                    if home != self.index:
+                        self.taken_over += 1
+                        logger.warning(
+                            'Worker %d took over partition %d',
+                            self.index, partition,
+                        )
+                    self._consumers[partition] = asyncio.create_task(
+                        self._consume(partition)
+                    )
+
+    async def _stop(self, partition: int) -> None:
+        """Перестать читать поток и снять его аренду."""
+        task = self._consumers.pop(partition)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await self._release_lease(
+            keys=[self.lease_key(partition)], args=[self.consumer]
+        )
+
+    async def _ensure_group(self, stream: str) -> None:
+        try:
+            await self.redis.xgroup_create(
+                stream, GROUP_NAME, id='0', mkstream=True
+            )
+        except ResponseError as error:
+            if 'BUSYGROUP' not in str(error):
+                raise
+
+    async def _consume(self, partition: int) -> None:
+        stream = self.queue.stream(partition)
+        await self._ensure_group(stream)
+        # Сначала свои сообщения, не подтвержденные до перезапуска
+        last_id = '0'
+        while True:
+            response = await self.redis.xreadgroup(
+                GROUP_NAME, self.consumer, {stream: last_id}, count=self.batch
+            )
+            pending = response[0][1] if response else []
+            if not pending:
+                break
+            await self._handle(stream, pending)
+            last_id = pending[-1][0]
+
+        claimed_at = 0.0
+        while True:
+            if time.monotonic() - claimed_at > self.claim_idle_ms / 1000:
+                _, claimed, *_ = await self.redis.xautoclaim(
+                    stream, GROUP_NAME, self.consumer,
+                    min_idle_time=self.claim_idle_ms, count=self.batch,
+                )
+                await self._handle(stream, claimed)
+                claimed_at = time.monotonic()
+            response = await self.redis.xreadgroup(
+                GROUP_NAME, self.consumer, {stream: '>'},
+                count=self.batch, block=self.block_ms,
+            )
+            await self._handle(stream, response[0][1] if response else [])
+
+    async def _handle(self, stream: str, messages: list) -> None:
+        for message_id, fields in messages:
+            if not fields:
+                # Сообщение удалено из потока по maxlen
+                await self.redis.xack(stream, GROUP_NAME, message_id)
+                continue
+            if (stream, message_id) in self._in_flight:
+                # XAUTOCLAIM вернул сообщение, которое еще обрабатывается
+                continue
+            update = json.loads(fields[b'update'])
+            chat_id = get_chat_id(update)
+            pressed = get_callback_message(update)
+            scheduler = self.dp.get('chat_scheduler')
+            if pressed is not None and scheduler is not None:
+                scheduler.supersede(*pressed)
+            await self._semaphore.acquire()
+            previous = self._chains.get(chat_id)
+            task = asyncio.create_task(
+                self._process(stream, message_id, update, previous)
+            )
+            self._chains[chat_id] = task
+            self._in_flight.add((stream, message_id))
+            task.add_done_callback(
+                partial(self._release, chat_id, (stream, message_id))
+            )
+
+    def _release(
+            self,
+            chat_id: int,
+            key: tuple[str, bytes],
+            task: asyncio.Task,
+    ) -> None:
+        self._semaphore.release()
+        self._in_flight.discard(key)
+        if self._chains.get(chat_id) is task:
+            del self._chains[chat_id]
+
+    async def _process(
+            self,
+            stream: str,
+            message_id: bytes,
+            update: dict,
+            previous: asyncio.Task | None,
+    ) -> None:
+        if previous is not None:
+            # Порядок внутри чата: ждем предыдущее обновление
+            await asyncio.wait([previous])
+        try:
+            await self.dp.feed_update(self.bot, Update(**update))
+        except Exception:
+            logger.exception('Update %s failed', message_id)
+        await self.redis.xack(stream, GROUP_NAME, message_id)
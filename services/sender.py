@@ -0,0 +1,344 @@
+import asyncio
+import contextvars
+import json
+import logging
+import math
+import secrets
+import time
+from typing import Awaitable, Callable, Iterable
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError,
+    TelegramRetryAfter, TelegramServerError,
+)
+from redis.asyncio.client import Redis
+
+from ruobr.protection import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_KEY = 'ruobr:outbox'
+INFLIGHT_KEY = 'ruobr:outbox:inflight'
+SEQUENCE_KEY = 'ruobr:outbox:sequence'
+
+# Чем меньше приоритет, тем раньше отправляется сообщение
+PRIORITY_NOTIFY = 1
+PRIORITY_BULK = 2
+# Порядковый номер сообщения всегда меньше шага приоритета
+PRIORITY_STEP = 10 ** 12
+
+# Взять первое сообщение очереди и записать его в отправляемые одной
+# операцией: значение - приоритет, время и отправитель
+POP = '''
+local popped = redis.call('zpopmin', KEYS[1])
+if #popped == 0 then
+    return nil
+end
+redis.call(
+    'hset', KEYS[2], popped[1], popped[2] .. ' ' .. ARGV[1] .. ' ' .. ARGV[2]
+)
+return popped
+'''
+# Вернуть отправляемые сообщения в очередь, если их запись не изменилась:
+# ARGV - тройки (сообщение, прежнее значение, приоритет)
+REQUEUE = '''
+local count = 0
+for i = 1, #ARGV, 3 do
+    if redis.call('hget', KEYS[2], ARGV[i]) == ARGV[i + 1] then
+        redis.call('hdel', KEYS[2], ARGV[i])
+        redis.call('zadd', KEYS[1], ARGV[i + 2], ARGV[i])
+        count = count + 1
+    end
+end
+return count
+'''
+
+# Запрос к Telegram отправляет OutboundSender, а не обработчик
+_outbound = contextvars.ContextVar('outbound', default=False)
+
+
+def is_outbound() -> bool:
+    return _outbound.get()
+
+
+class OutboundSender:
+    """Очередь исходящих сообщений в Redis с приоритетами.
+
+    Сообщения хранятся в sorted set: сначала отправляются сообщения
+    с меньшим приоритетом, внутри приоритета - в порядке постановки.
+    Отправляемые сообщения лежат в отдельном хэше с отметкой, какой
+    процесс и когда их взял. Если отправка прервалась, сообщение
+    возвращается в очередь: своё - сразу, чужое - через stale_after
+    секунд, поэтому сообщения, которые сейчас отправляет другой
+    процесс, не отправляются дважды. Сообщения отправляются не чаще rate
+    в секунду всего и не чаще раза в chat_interval секунд в один чат,
+    ответы обработчиков тоже учитываются в этих лимитах (см.
+    note_interactive). Если Telegram отвечает RetryAfter, отправка
+    приостанавливается на указанное время, а сообщение возвращается
+    в начало очереди.
+    """
+
+    def __init__(
+            self,
+            bot: Bot,
+            redis: Redis,
+            rate: float = 25,
+            chat_interval: float = 1,
+            concurrency: int = 16,
+            max_attempts: int = 5,
+            poll_interval: float = 1,
+            stale_after: float = 300,
+    ):
+        self.bot = bot
+        self.redis = redis
+        self.owner = secrets.token_hex(8)
+        self.stale_after = stale_after
+        self._pop_script = redis.register_script(POP)
+        self._requeue_script = redis.register_script(REQUEUE)
+        self._delivering: set[bytes] = set()
+        self._recovered_at = 0.0
+        self.chat_interval = chat_interval
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.blocked_handlers: list[Callable[[int], Awaitable[None]]] = []
+        self._bucket = TokenBucket(rate, rate)
+        self._chat_next: dict[int, float] = {}
+        self._paused_until = 0.0
+        self._wakeup = asyncio.Event()
+        self.sent = 0
+        self.retried = 0
+        self.dropped = 0
+        self.flood_waits = 0
+
+    async def send(
+            self,
+            chat_id: int,
+            text: str,
+            priority: int = PRIORITY_NOTIFY,
+            **kwargs,
+    ) -> None:
+        """Поставить сообщение в очередь. kwargs передаются
+        в send_message и должны сериализоваться в JSON.
+        """
+        await self.send_many([chat_id], text, priority, **kwargs)
+
+    async def send_many(
+            self,
+            chat_ids: Iterable[int],
+            text: str,
+            priority: int = PRIORITY_BULK,
+            **kwargs,
+    ) -> int:
+        """Поставить одно сообщение в очередь для нескольких чатов.
+        Возвращает число поставленных сообщений.
+        """
+        chat_ids = list(chat_ids)
+        if not chat_ids:
+            return 0
+        last = await self.redis.incrby(SEQUENCE_KEY, len(chat_ids))
+        mapping = {}
+        for sequence, chat_id in enumerate(chat_ids, last - len(chat_ids)):
+            member = json.dumps(
+                [sequence, chat_id, text, kwargs, 0], ensure_ascii=False
+            )
+            mapping[member] = priority * PRIORITY_STEP + sequence
+        await self.redis.zadd(OUTBOX_KEY, mapping)
+        self._wakeup.set()
+        return len(mapping)
+
+    async def pending(self) -> int:
+        return await self.redis.zcard(OUTBOX_KEY)
+
+    def note_interactive(self, chat_id: int) -> None:
+        """Учесть в лимитах сообщение, отправленное обработчиком
+        напрямую: следующие сообщения из очереди подождут.
+        """
+        self._bucket.reserve(math.inf)
+        self._chat_next[chat_id] = max(
+            self._chat_next.get(chat_id, 0.0),
+            time.monotonic() + self.chat_interval,
+        )
+
+    def _chat_delay(self, chat_id: int) -> float:
+        now = time.monotonic()
+        if len(self._chat_next) > 10000:
+            self._chat_next = {
+                chat: at for chat, at in self._chat_next.items() if at > now
+            }
+        send_at = max(now, self._chat_next.get(chat_id, 0.0))
+        self._chat_next[chat_id] = send_at + self.chat_interval
+        return send_at - now
+
+    async def recover(self) -> int:
+        """Вернуть в очередь сообщения, отправка которых прервалась:
+        взятые этим процессом, но уже не отправляемые, и взятые
+        дольше stale_after секунд назад.
+        """
+        self._recovered_at = time.monotonic()
+        stale_at = time.time() - self.stale_after
+        args = []
+        for member, value in (await self.redis.hgetall(INFLIGHT_KEY)).items():
+            score, _, taken = value.decode().partition(' ')
+            taken_at, _, owner = taken.partition(' ')
+            if (
+                owner == self.owner and member not in self._delivering
+                # Записи прежних версий содержат только приоритет
+                or not owner or float(taken_at) < stale_at
+            ):
+                args.extend((member, value, score))
+        if not args:
+            return 0
+        count = await self._requeue_script(
+            keys=[OUTBOX_KEY, INFLIGHT_KEY], args=args
+        )
+        if count:
+            logger.info('Recovered %d outbound messages', count)
+        return count
+
+    async def _pop(self) -> tuple[bytes, float] | None:
+        popped = await self._pop_script(
+            keys=[OUTBOX_KEY, INFLIGHT_KEY], args=[time.time(), self.owner]
+        )
+        if not popped:
+            return None
+        member, score = popped
+        self._delivering.add(member)
+        return member, float(score)
+
+    async def run(self) -> None:
+        """Бесконечный цикл отправки сообщений из очереди."""
+        await self.recover()
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks: set[asyncio.Task] = set()
+        try:
+            while True:
+                if time.monotonic() - self._recovered_at > self.stale_after:
+                    try:
+                        await self.recover()
+                    except Exception:
+                        logger.exception('Outbox recovery failed')
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                    continue
+                await slots.acquire()
+                try:
+                    item = await self._pop()
+                except Exception:
+                    slots.release()
+                    logger.exception('Outbox read failed')
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                if item is None:
+                    slots.release()
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(
+                            self._wakeup.wait(), self.poll_interval
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await asyncio.sleep(self._bucket.reserve(math.inf))
+                task = asyncio.create_task(self._deliver(*item))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(lambda _: slots.release())
+                task.add_done_callback(self._log_failure)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.recover()
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(
+                'Outbound delivery failed', exc_info=task.exception()
+            )
+
+    async def _deliver(self, member: bytes, score: float) -> None:
+        try:
+            await self._send(member, score)
+        except Exception:
+            # Непредвиденная ошибка: сообщение не повторяется, чтобы
+            # не отправлять его в цикле
+            self.dropped += 1
+            logger.exception('Outbound message dropped')
+            await self.redis.hdel(INFLIGHT_KEY, member)
+        finally:
+            self._delivering.discard(member)
+
+    async def _send(self, member: bytes, score: float) -> None:
+        sequence, chat_id, text, kwargs, attempts = json.loads(member)
+        await asyncio.sleep(self._chat_delay(chat_id))
+        _outbound.set(True)
+        try:
+            await self.bot.send_message(chat_id, text, **kwargs)
+        except TelegramRetryAfter as error:
+            # Лимит Telegram общий для бота: ждут все сообщения
+            self.flood_waits += 1
+            self._paused_until = max(
+                self._paused_until, time.monotonic() + error.retry_after
+            )
+            logger.warning('Flood wait %s s', error.retry_after)
+            await self._requeue(member, member, score)
+            return
+        except TelegramForbiddenError:
+            self.dropped += 1
+            await self.redis.hdel(INFLIGHT_KEY, member)
+            for handler in self.blocked_handlers:
+                try:
+                    await handler(chat_id)
+                except Exception:
+                    logger.exception('Blocked chat handler failed')
+            return
+        except TelegramBadRequest as error:
+            self.dropped += 1
+            logger.warning('Message to chat %s dropped: %s', chat_id, error)
+            await self.redis.hdel(INFLIGHT_KEY, member)
+            return
+        except (TelegramNetworkError, TelegramServerError) as error:
+            attempts += 1
+            if attempts >= self.max_attempts:
+                self.dropped += 1
+                logger.warning(
+                    'Message to chat %s dropped after %d attempts: %r',
+                    chat_id, attempts, error,
+                )
+                await self.redis.hdel(INFLIGHT_KEY, member)
+                return
+            self.retried += 1
+            self._paused_until = max(
+                self._paused_until, time.monotonic() + 2 ** attempts
+            )
+            await self._requeue(
+                member,
+                json.dumps(
+                    [sequence, chat_id, text, kwargs, attempts],
+                    ensure_ascii=False,
+                ),
+                score,
+            )
+            return
+        self.sent += 1
+        await self.redis.hdel(INFLIGHT_KEY, member)
+
+    async def _requeue(
+            self, member: bytes, new_member: str | bytes, score: float
+    ) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(OUTBOX_KEY, {new_member: score})
+            pipe.hdel(INFLIGHT_KEY, member)
+            await pipe.execute()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'sent': self.sent,
+            'retried': self.retried,
+            'dropped': self.dropped,
+            'flood_waits': self.flood_waits,
+        }
@@ -0,0 +1,81 @@
+import asyncio
+from datetime import date
+
+from ruobr.archive import HomeworkArchive, build_match, content_hash
+from ruobr.ruobr_cls import HomeworkTask, Lesson
+
+
+def lesson(day: str, subject: str, *tasks: tuple[int, str]) -> Lesson:
+    return Lesson(
+        0, day, subject, '08:30:00', '09:10:00',
+        tuple(HomeworkTask(task_id, day, title) for task_id, title in tasks),
+    )
+
+
+def test_build_match_prefix_words():
+    assert build_match('дроб  задача') == '"дроб"* "задача"*'
+
+
+def test_build_match_escapes_quotes():
+    assert build_match('"OR" NEAR(') == '"""OR"""* "NEAR("*'
+
+
+def test_build_match_empty():
+    assert build_match('   ') == ''
+
+
+def test_content_hash_depends_on_every_field():
+    assert content_hash('2024-03-04', 'Математика', 'Дроби') == (
+        content_hash('2024-03-04', 'Математика', 'Дроби')
+    )
+    assert len({
+        content_hash('2024-03-04', 'Математика', 'Дроби'),
+        content_hash('2024-03-05', 'Математика', 'Дроби'),
+        content_hash('2024-03-04', 'Алгебра', 'Дроби'),
+        content_hash('2024-03-04', 'Математика', 'Дроби 2'),
+    }) == 4
+
+
+def test_search_round_trip(tmp_path):
+    async def scenario():
+        archive = HomeworkArchive(str(tmp_path / 'homework.sqlite3'))
+        archive.add('account', 1, [
+            lesson('2024-03-04', 'Математика', (1, 'Сложение дробей')),
+            lesson('2024-03-05', 'Русский язык', (2, 'Упражнение 5')),
+        ])
+        archive.add('account', 2, [
+            lesson('2024-03-06', 'Математика', (3, 'Дроби, задача 4')),
+        ])
+        archive.add('other', 1, [
+            lesson('2024-03-06', 'Математика', (4, 'Дроби')),
+        ])
+        # Учитель исправил задание, затем то же задание загружено снова
+        for _ in range(2):
+            archive.add('account', 1, [
+                lesson('2024-03-04', 'Математика', (1, 'Вычитание дробей')),
+            ])
+        await archive.flush()
+        try:
+            found = await archive.search('account', [1, 2], 'дроб')
+            assert [(task.child, task.title) for task in found] == [
+                (2, 'Дроби, задача 4'),
+                (1, 'Вычитание дробей'),
+                (1, 'Сложение дробей'),
+            ]
+            # Прежняя редакция тоже остается в архиве
+            assert await archive.search('account', [1], 'сложение') == [
+                (1, '2024-03-04', 'Математика', 'Сложение дробей'),
+            ]
+            assert len(
+                await archive.search('account', [1, 2], 'математика')
+            ) == 3
+            assert await archive.search(
+                'account', [2], 'дроб',
+                period=(date(2024, 3, 1), date(2024, 3, 5)),
+            ) == []
+            assert await archive.search('account', [1], '"') == []
+            assert archive.stats()['written'] == 6
+        finally:
+            await archive.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,80 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+from ruobr.cache import TimetableCache
+from ruobr.ruobr_cls import Lesson
+
+fakeredis = pytest.importorskip('fakeredis.aioredis')
+
+MONDAY = date(2024, 3, 4)
+TUESDAY = date(2024, 3, 5)
+
+
+def lesson(day: date) -> Lesson:
+    return Lesson(1, day.isoformat(), 'Математика', '08:30', '09:10', ())
+
+
+def test_days_round_trip_through_redis():
+    async def scenario():
+        redis = fakeredis.FakeRedis()
+        await TimetableCache(redis).set_days(
+            'account', 1, {MONDAY: [lesson(MONDAY)], TUESDAY: []}
+        )
+        # Другой процесс: кэш в памяти пуст
+        cache = TimetableCache(redis)
+        assert await cache.get_days('account', 1, [MONDAY, TUESDAY]) == {
+            MONDAY: [lesson(MONDAY)], TUESDAY: [],
+        }
+        assert await cache.get_days('account', 2, [MONDAY]) == {}
+
+    asyncio.run(scenario())
+
+
+def test_expired_days_returned_only_as_stale():
+    async def scenario():
+        redis = fakeredis.FakeRedis()
+        await TimetableCache(redis, ttl=-1).set_days(
+            'account', 1, {MONDAY: []}
+        )
+        cache = TimetableCache(redis)
+        assert await cache.get_days('account', 1, [MONDAY]) == {}
+        assert await cache.get_days(
+            'account', 1, [MONDAY], stale=True
+        ) == {MONDAY: []}
+
+    asyncio.run(scenario())
+
+
+def test_short_write_does_not_shorten_index():
+    async def scenario():
+        redis = fakeredis.FakeRedis()
+        cache = TimetableCache(redis, ttl=600, stale_ttl=0)
+        # Предзагрузка на 6 часов, затем обычная запись
+        await cache.set_days('account', 1, {MONDAY: []}, ttl=6 * 60 * 60)
+        await cache.set_days('account', 1, {TUESDAY: []})
+        index_ttl = await redis.ttl(cache.build_index_key('account'))
+        assert index_ttl >= await redis.ttl(
+            cache.build_key('account', 1, MONDAY)
+        )
+        assert index_ttl > 600
+
+    asyncio.run(scenario())
+
+
+def test_invalidate_removes_only_account_days():
+    async def scenario():
+        redis = fakeredis.FakeRedis()
+        cache = TimetableCache(redis)
+        await cache.set_days('account', 1, {MONDAY: [], TUESDAY: []})
+        await cache.set_days('account', 2, {MONDAY: []})
+        await cache.set_days('other', 1, {MONDAY: []})
+        await cache.invalidate('account')
+        assert await cache.get_days('account', 1, [MONDAY, TUESDAY]) == {}
+        assert await cache.get_days('account', 2, [MONDAY]) == {}
+        assert await cache.get_days('other', 1, [MONDAY]) == {MONDAY: []}
+        assert await redis.keys('*account*') == []
+        await cache.invalidate('missing')
+
+    asyncio.run(scenario())
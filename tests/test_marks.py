@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from ruobr.marks import MarksService, SubjectStats
+from ruobr.ruobr_cls import Mark, MarkPeriod
+from ruobr.singleflight import SingleFlight
+
+fakeredis = pytest.importorskip('fakeredis.aioredis')
+
+
+def test_subject_stats_add_and_replace():
+    stats = SubjectStats()
+    stats.add([Mark(2, '2024-03-05', 3), Mark(1, '2024-03-04', 5)], 2)
+    assert (stats.count, stats.total, stats.recent) == (2, 8, [5, 3])
+    stats.replace(Mark(2, '2024-03-05', 3), Mark(2, '2024-03-05', 4))
+    assert (stats.count, stats.total, stats.recent) == (2, 9, [5, 4])
+    assert SubjectStats.loads(stats.dumps()) == stats
+
+
+def test_add_marks_counts_new_and_corrected_marks():
+    async def scenario() -> SubjectStats:
+        marks = MarksService(None, fakeredis.FakeRedis())
+        first = [Mark(1, '2024-03-04', 5), Mark(2, '2024-03-05', 3)]
+        assert await marks.add_marks(7, 1, 'Математика', first) == 2
+        assert await marks.add_marks(7, 1, 'Математика', first) == 0
+        # Учитель исправил 3 на 4 и поставил новую оценку
+        assert await marks.add_marks(7, 1, 'Математика', [
+            Mark(1, '2024-03-04', 5),
+            Mark(2, '2024-03-05', 4),
+            Mark(3, '2024-03-06', 5),
+        ]) == 2
+        value = await marks.redis.hget(
+            marks.build_key(7, 1), 'Математика'
+        )
+        return SubjectStats.loads(value)
+
+    stats = asyncio.run(scenario())
+    assert (stats.count, stats.total, stats.recent) == (3, 14, [5, 4, 5])
+
+
+class FakeUser:
+    user = {'id': 7}
+
+
+class FakeGateway:
+    """Оценки по одному предмету, ruobr отвечает через delay секунд."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.single_flight = SingleFlight()
+        self.requests = 0
+
+    async def get_control_marks(self, user) -> list[MarkPeriod]:
+        self.requests += 1
+        await asyncio.sleep(self.delay)
+        return [MarkPeriod(1, '1 четверть', {10: 'Математика'}, {})]
+
+    async def get_marks(self, user, period: int, subject_id: int):
+        self.requests += 1
+        await asyncio.sleep(self.delay)
+        return [Mark(1, '2024-03-04', 5), Mark(2, '2024-03-05', 4)]
+
+
+def test_second_process_waits_for_summary_being_loaded():
+    async def scenario() -> tuple:
+        redis = fakeredis.FakeRedis()
+        first = MarksService(FakeGateway(0.1), redis)
+        second = MarksService(FakeGateway(0.1), redis)
+        loading = asyncio.create_task(first.summary(FakeUser()))
+        await asyncio.sleep(0.05)
+        summary, stale = await second.summary(FakeUser())
+        await loading
+        return summary, stale, second.gateway.requests
+
+    summary, stale, requests = asyncio.run(scenario())
+    assert not stale
+    assert requests == 0
+    assert summary.title == '1 четверть'
+    assert summary.subjects['Математика'].average == 4.5
+
+
+def test_summary_loaded_inline_if_other_process_hangs():
+    async def scenario() -> tuple:
+        redis = fakeredis.FakeRedis()
+        marks = MarksService(FakeGateway(0), redis, wait_timeout=0.3)
+        # Другой процесс занял обновление и не закончил его
+        await redis.set(marks.build_key(7, 'fresh'), 1)
+        summary, _ = await marks.summary(FakeUser())
+        return summary, marks.gateway.requests
+
+    summary, requests = asyncio.run(scenario())
+    assert requests == 2
+    assert summary.subjects['Математика'].count == 2
@@ -0,0 +1,97 @@
+import asyncio
+from datetime import date
+
+import pytest
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+
+from ruobr.ruobr_cls import HomeworkTask, Lesson
+from services import notifications
+from services.notifications import HomeworkNotifier
+
+fakeredis = pytest.importorskip('fakeredis.aioredis')
+
+
+def lesson(lesson_id: int, day: str, title: str) -> Lesson:
+    return Lesson(
+        lesson_id, day, 'Математика', '08:30', '09:10',
+        (HomeworkTask(lesson_id, day, title),),
+    )
+
+
+class FakeBot:
+    id = 1
+    session = AiohttpSession()
+
+
+class FakeSessions:
+    vault = None
+
+    async def resolve_children(self, token: str, child: int) -> list[int]:
+        return [child]
+
+    async def call(self, token: str, func, *args, child: int = 1):
+        return await func(None, *args)
+
+
+class FakeGateway:
+    def __init__(self):
+        self.lessons: list[Lesson] = []
+
+    async def refresh_timetable(self, user, date_start, date_end):
+        return [
+            lesson for lesson in self.lessons
+            if date_start.isoformat() <= lesson.date <= date_end.isoformat()
+        ]
+
+
+class FakeSender:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, chat_id: int, text: str, priority: int) -> None:
+        self.sent.append(text)
+
+
+def test_only_changes_inside_checked_period_are_reported(monkeypatch):
+    async def scenario():
+        storage = RedisStorage(fakeredis.FakeRedis())
+        gateway = FakeGateway()
+        sender = FakeSender()
+        notifier = HomeworkNotifier(
+            FakeBot(), storage, gateway, FakeSessions(), sender, days=7
+        )
+        await FSMContext(
+            FakeBot(), storage, StorageKey(bot_id=1, chat_id=5, user_id=5)
+        ).set_data({'token': 'token', 'child': 1})
+
+        async def check(today: date) -> list[str]:
+            monkeypatch.setattr(
+                notifications, 'get_current_date', lambda: today
+            )
+            sender.sent.clear()
+            await notifier.check_subscriber(5, 5)
+            return sender.sent
+
+        gateway.lessons = [
+            lesson(1, '2024-03-05', 'Задача 1'),
+            # Задано давно, но в период проверки попадет только завтра
+            lesson(2, '2024-03-12', 'Задача 2'),
+        ]
+        assert await check(date(2024, 3, 4)) == []
+        assert await check(date(2024, 3, 5)) == []
+
+        gateway.lessons = [
+            lesson(1, '2024-03-05', 'Задача 1'),
+            lesson(2, '2024-03-12', 'Задача 2, исправлено'),
+            lesson(3, '2024-03-06', 'Задача 3'),
+        ]
+        sent = await check(date(2024, 3, 5))
+        assert len(sent) == 1
+        assert 'Задача 2, исправлено' in sent[0]
+        assert 'Задача 3' in sent[0]
+        assert 'Задача 1' not in sent[0]
+
+    asyncio.run(scenario())
@@ -0,0 +1,59 @@
+from datetime import date
+
+import pytest
+
+from ruobr import ruobr
+from ruobr.ruobr import parse_period, split_period
+
+TODAY = date(2024, 3, 15)
+
+
+def test_single_day_and_period():
+    assert parse_period('25.03', TODAY) == (date(2024, 3, 25),) * 2
+    assert parse_period('25.03 - 10.04', TODAY) == (
+        date(2024, 3, 25), date(2024, 4, 10)
+    )
+    assert parse_period('29.02', TODAY) == (date(2024, 2, 29),) * 2
+
+
+def test_period_across_new_year():
+    assert parse_period('25.12-10.01', TODAY) == (
+        date(2024, 12, 25), date(2025, 1, 10)
+    )
+    assert parse_period('25.12.23-10.01.2024', TODAY) == (
+        date(2023, 12, 25), date(2024, 1, 10)
+    )
+
+
+@pytest.mark.parametrize('text', [
+    '', 'завтра', '32.01', '29.02.2023', '31.04', '10.04-25.03.2024',
+    '25.12.2024-10.01.2024',
+])
+def test_invalid_period(text):
+    with pytest.raises(ValueError):
+        parse_period(text, TODAY)
+
+
+def test_split_by_weeks_across_month():
+    assert split_period(date(2024, 1, 29), date(2024, 2, 12)) == [
+        (date(2024, 1, 29), date(2024, 2, 4)),
+        (date(2024, 2, 5), date(2024, 2, 11)),
+        (date(2024, 2, 12), date(2024, 2, 12)),
+    ]
+    assert split_period(date(2024, 2, 28), date(2024, 3, 1), days=2) == [
+        (date(2024, 2, 28), date(2024, 2, 29)),
+        (date(2024, 3, 1), date(2024, 3, 1)),
+    ]
+    assert split_period(date(2024, 3, 2), date(2024, 3, 1)) == []
+
+
+@pytest.mark.parametrize('today, expected', [
+    # Со среды - с завтрашнего дня до воскресенья, через конец месяца
+    (date(2024, 1, 31), (date(2024, 2, 1), date(2024, 2, 4))),
+    # В воскресенье - вся следующая неделя
+    (date(2024, 3, 31), (date(2024, 4, 1), date(2024, 4, 7))),
+    (date(2024, 12, 28), (date(2024, 12, 30), date(2025, 1, 5))),
+])
+def test_week_after_today(monkeypatch, today, expected):
+    monkeypatch.setattr(ruobr, 'get_current_date', lambda: today)
+    assert ruobr.get_date_week() == expected
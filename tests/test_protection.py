@@ -0,0 +1,97 @@
+import pytest
+
+from ruobr import protection
+from ruobr.protection import CircuitBreaker, RateLimiter, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(protection.time, 'monotonic', clock)
+    return clock
+
+
+def test_bucket_allows_burst_then_waits(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.reserve(0) for _ in range(3)] == [0, 0, 0]
+    # Токенов нет: следующий через 1 / rate секунд
+    assert bucket.reserve(0.1) is None
+    assert bucket.reserve(1) == pytest.approx(0.5)
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    clock.now += 10
+    # Накапливается не больше capacity токенов
+    assert [bucket.reserve(0) for _ in range(3)] == [0, 0, 0]
+    assert bucket.reserve(0) is None
+
+
+def test_limiter_applies_account_and_global_limits(clock):
+    limiter = RateLimiter(
+        rate=10, burst=3, account_rate=1, account_burst=1, max_accounts=2
+    )
+    assert limiter.reserve('a', 0) == 0
+    assert limiter.reserve('a', 0.5) is None
+    assert limiter.reserve('b', 0) == 0
+    assert limiter.reserve(None, 0) == 0
+    # Общий лимит исчерпан
+    assert limiter.reserve('c', 1) == pytest.approx(0.1)
+    assert limiter.rejected == 1
+    assert limiter.delayed == 1
+    # Самый давний аккаунт вытеснен и снова получает токен сразу
+    assert list(limiter._accounts) == ['b', 'c']
+    clock.now += 1
+    assert limiter.reserve('a', 0) == 0
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    clock.now += 29
+    assert not breaker.allow()
+
+
+def test_half_open_lets_single_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    # Отмененная проба не считается, пропускается следующая
+    breaker.cancel_trial()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+    assert breaker.opened_count == 1
+
+
+def test_failed_probe_opens_again(clock):
+    breaker = CircuitBreaker(failure_threshold=5, recovery_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened_count == 2
+    # Таймаут отсчитывается от неудачной пробы
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+
+from services.queue import (
+    GROUP_NAME, UpdateQueue, UpdateWorker,
+    get_callback_message, get_chat_id,
+)
+
+fakeredis = pytest.importorskip('fakeredis.aioredis')
+
+
+def message(chat_id: int, text: str) -> dict:
+    return {'update_id': 1, 'message': {
+        'message_id': 1, 'date': 0, 'text': text,
+        'chat': {'id': chat_id, 'type': 'private'},
+    }}
+
+
+class FakeDispatcher:
+    """Запоминает обработанные обновления, каждое обрабатывает delay
+    секунд.
+    """
+
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.handled = []
+
+    def get(self, key: str):
+        return None
+
+    async def feed_update(self, bot, update) -> None:
+        await asyncio.sleep(self.delay)
+        self.handled.append((update.message.chat.id, update.message.text))
+
+
+async def run_worker(worker: UpdateWorker, seconds: float) -> None:
+    task = asyncio.create_task(worker.run())
+    await asyncio.sleep(seconds)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+def test_get_chat_id():
+    assert get_chat_id(message(7, 'hi')) == 7
+    assert get_chat_id({'callback_query': {
+        'from': {'id': 5},
+        'message': {'message_id': 3, 'chat': {'id': 9}},
+    }}) == 9
+    assert get_chat_id({'my_chat_member': {'from': {'id': 4}}}) == 4
+    assert get_chat_id({'update_id': 1, 'poll': {'id': 'p'}}) == 0
+
+
+def test_get_callback_message():
+    assert get_callback_message({'callback_query': {
+        'message': {'message_id': 3, 'chat': {'id': 9}},
+    }}) == (9, 3)
+    assert get_callback_message(message(7, 'hi')) is None
+
+
+def test_updates_of_chat_in_order():
+    async def scenario() -> list:
+        queue = UpdateQueue(fakeredis.FakeRedis(), partitions=2)
+        for text in ('1', '2', '3'):
+            await queue.enqueue(message(1, text))
+            await queue.enqueue(message(2, text))
+        dp = FakeDispatcher(delay=0.01)
+        await run_worker(
+            UpdateWorker(dp, None, queue, block_ms=10), 0.3
+        )
+        for partition in range(2):
+            pending = await queue.redis.xpending(
+                queue.stream(partition), GROUP_NAME
+            )
+            assert pending['pending'] == 0
+        return dp.handled
+
+    handled = asyncio.run(scenario())
+    for chat_id in (1, 2):
+        assert [
+            text for chat, text in handled if chat == chat_id
+        ] == ['1', '2', '3']
+
+
+def test_own_message_in_progress_is_not_reclaimed():
+    async def scenario() -> list:
+        queue = UpdateQueue(fakeredis.FakeRedis(), partitions=1)
+        await queue.enqueue(message(1, 'slow'))
+        dp = FakeDispatcher(delay=0.3)
+        # XAUTOCLAIM на каждом круге возвращает и свое сообщение
+        worker = UpdateWorker(
+            dp, None, queue, block_ms=10, claim_idle_ms=0
+        )
+        await run_worker(worker, 0.5)
+        assert not worker._in_flight
+        return dp.handled
+
+    assert asyncio.run(scenario()) == [(1, 'slow')]
+
+
+def test_worker_takes_only_its_partitions():
+    queue = UpdateQueue(fakeredis.FakeRedis(), partitions=8)
+    worker = UpdateWorker(FakeDispatcher(), None, queue, index=1, workers=3)
+    assert worker.partitions == [1, 4, 7]
+
+
+def test_partitions_of_dead_worker_are_taken_over():
+    async def scenario() -> list:
+        queue = UpdateQueue(fakeredis.FakeRedis(), partitions=2)
+        dead = UpdateWorker(
+            FakeDispatcher(), None, queue, index=1, workers=2,
+            lease_ms=200,
+        )
+        # worker-1 взял поток 1, прочитал обновление и пропал,
+        # не подтвердив его и не сняв аренду
+        await queue.enqueue(message(1, 'before'))
+        await dead._rebalance()
+        await dead._stop(1)
+        await queue.redis.set(dead.lease_key(1), dead.consumer, px=200)
+        await dead._ensure_group(queue.stream(1))
+        await queue.redis.xreadgroup(
+            GROUP_NAME, dead.consumer, {queue.stream(1): '>'}
+        )
+        await queue.enqueue(message(1, 'after'))
+
+        dp = FakeDispatcher()
+        alive = UpdateWorker(
+            dp, None, queue, index=0, workers=2,
+            block_ms=10, claim_idle_ms=100, lease_ms=200,
+        )
+        await run_worker(alive, 1)
+        assert alive.taken_over == 1
+        pending = await queue.redis.xpending(queue.stream(1), GROUP_NAME)
+        assert pending['pending'] == 0
+        # Остановленный воркер снимает аренду
+        assert await queue.redis.get(alive.lease_key(0)) is None
+        return sorted(dp.handled)
+
+    assert asyncio.run(scenario()) == [(1, 'after'), (1, 'before')]
+
+
+def test_returned_worker_gets_its_partitions_back():
+    async def scenario() -> tuple:
+        queue = UpdateQueue(fakeredis.FakeRedis(), partitions=2)
+        first = UpdateWorker(
+            FakeDispatcher(), None, queue, index=0, workers=2,
+            block_ms=10, lease_ms=150,
+        )
+        second = UpdateWorker(
+            FakeDispatcher(), None, queue, index=1, workers=2,
+            block_ms=10, lease_ms=150,
+        )
+        running = asyncio.create_task(first.run())
+        await asyncio.sleep(0.1)
+        borrowed = await queue.redis.get(first.lease_key(1))
+        returning = asyncio.create_task(second.run())
+        await asyncio.sleep(0.4)
+        returned = await queue.redis.get(first.lease_key(1))
+        for task in (running, returning):
+            task.cancel()
+        await asyncio.gather(running, returning, return_exceptions=True)
+        return borrowed, returned
+
+    assert asyncio.run(scenario()) == (b'worker-0', b'worker-1')
@@ -0,0 +1,75 @@
+from ruobr.render import (
+    MESSAGE_LIMIT, escape, pack_pages, render_homework_day,
+    render_homeworks, render_timetable_day, split_pages, text_length,
+)
+
+
+def test_text_length_counts_utf16_units():
+    for text in (
+            '', 'abc', 'é', 'Домашнее задание', '😀', 'a😀я', '😀' * 3 + 'я',
+            'ж' * 5000,
+    ):
+        assert text_length(text) == len(text.encode('utf-16-le')) // 2
+    assert text_length('😀') == 2
+
+
+def test_escape():
+    assert escape('a < b && c > d') == 'a &lt; b &amp;&amp; c &gt; d'
+    assert escape('&lt;') == '&amp;lt;'
+    text = 'без спецсимволов'
+    assert escape(text) is text
+
+
+def test_day_blocks_are_escaped():
+    assert render_homework_day('2024-03-04', {
+        'Информатика': ['<b>', 'A&B'],
+    }) == 'Домашнее задание на 2024-03-04:\nИнформатика: &lt;b&gt; A&amp;B'
+    assert render_timetable_day('2024-03-04', {
+        'Физика <лаб>': ('08:30:00', '09:10:00'),
+    }) == 'Расписание на 2024-03-04:\n08:30-09:10 Физика &lt;лаб&gt;'
+
+
+def test_page_fits_exactly_at_limit():
+    # Две части и разделитель из двух символов - ровно limit
+    half = (MESSAGE_LIMIT - 2) // 2
+    parts = [('я' * half, half), ('я' * half, half)]
+    assert len(pack_pages(parts)) == 1
+    parts[1] = ('я' * (half + 1), half + 1)
+    assert pack_pages(parts) == ['я' * half, 'я' * (half + 1)]
+
+
+def test_emoji_take_two_units():
+    fits = '😀' * (MESSAGE_LIMIT // 2)
+    assert split_pages([fits]) == [fits]
+    pages = split_pages([fits + '😀'])
+    assert len(pages) == 2
+    assert ''.join(pages) == fits + '😀'
+    assert all(text_length(page) <= MESSAGE_LIMIT for page in pages)
+
+
+def test_long_line_is_not_cut_inside_entity():
+    line = 'a' * (MESSAGE_LIMIT - 2) + '&amp;b'
+    assert split_pages([line]) == ['a' * (MESSAGE_LIMIT - 2), '&amp;b']
+
+
+def test_long_block_split_by_lines():
+    lines = [f'строка {number}: ' + 'ж' * 300 for number in range(40)]
+    pages = split_pages(['\n'.join(lines)])
+    assert len(pages) > 1
+    assert all(text_length(page) <= MESSAGE_LIMIT for page in pages)
+    assert '\n'.join(pages).split('\n') == lines
+
+
+def test_render_homeworks_pages_within_limit():
+    homeworks = {
+        f'2024-03-{day:02}': {
+            f'Предмет {number}': ['задание ' * 40 + '😀']
+            for number in range(8)
+        }
+        for day in range(1, 8)
+    }
+    pages = render_homeworks(homeworks, header='Заголовок')
+    assert len(pages) > 1
+    assert pages[0].startswith('Заголовок\n\nДомашнее задание на 2024-03-01')
+    assert all(text_length(page) <= MESSAGE_LIMIT for page in pages)
+    assert render_homeworks({}) == ['Ура! домашки нет.']
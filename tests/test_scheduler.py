@@ -0,0 +1,145 @@
+import asyncio
+from datetime import datetime
+
+from aiogram.types import CallbackQuery, Chat, Message, User
+
+from middlewares.scheduler import ChatSchedulerMiddleware
+from ruobr.scheduler import FairScheduler, set_interactive
+
+
+def make_callback(data: str, message_id: int = 1) -> CallbackQuery:
+    user = User(id=5, is_bot=False, first_name='User')
+    chat = Chat(id=5, type='private')
+    return CallbackQuery(
+        id=data,
+        from_user=user,
+        chat_instance='5',
+        data=data,
+        message=Message(
+            message_id=message_id, date=datetime.now(), chat=chat,
+            text='menu',
+        ),
+    )
+
+
+def test_interactive_before_background_and_chats_in_turn():
+    async def scenario() -> list[str]:
+        scheduler = FairScheduler(concurrency=1)
+        order = []
+        busy = asyncio.Event()
+
+        async def job(name: str, chat: int | None) -> None:
+            if chat is not None:
+                set_interactive(chat)
+            async with scheduler.slot():
+                order.append(name)
+                await busy.wait()
+
+        # Первый запрос занимает единственный слот, пока все встают
+        # в очередь
+        jobs = [
+            asyncio.create_task(job(name, chat)) for name, chat in [
+                ('background 1', None),
+                ('background 2', None),
+                ('chat 1 a', 1),
+                ('chat 1 b', 1),
+                ('chat 2 a', 2),
+            ]
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.stats()['queue_interactive'] == 3
+        busy.set()
+        await asyncio.gather(*jobs)
+        assert scheduler.stats()['queue_active'] == 0
+        return order
+
+    assert asyncio.run(scenario()) == [
+        'background 1', 'chat 1 a', 'chat 2 a', 'chat 1 b', 'background 2',
+    ]
+
+
+def test_cancelled_waiter_does_not_keep_slot():
+    async def scenario() -> dict:
+        scheduler = FairScheduler(concurrency=1)
+        await scheduler.acquire(None, 0)
+        waiter = asyncio.create_task(scheduler.acquire(1, 0))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release()
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['queue_active'] == 0
+    assert stats['queue_interactive'] == 0
+    assert stats['queue_cancelled'] == 1
+
+
+def test_new_press_supersedes_previous(monkeypatch):
+    answered = []
+
+    async def answer(self, *args, **kwargs):
+        answered.append(self.data)
+
+    monkeypatch.setattr(CallbackQuery, 'answer', answer)
+
+    async def scenario() -> list:
+        middleware = ChatSchedulerMiddleware()
+        finished = []
+
+        async def handler(event: CallbackQuery, data: dict) -> str:
+            await asyncio.sleep(0.05)
+            finished.append(event.data)
+            return event.data
+
+        first = asyncio.create_task(
+            middleware(handler, make_callback('sch_week'), {})
+        )
+        await asyncio.sleep(0.01)
+        results = await asyncio.gather(
+            first, middleware(handler, make_callback('hw_week'), {})
+        )
+        assert middleware.superseded == 1
+        return [results, finished]
+
+    results, finished = asyncio.run(scenario())
+    assert results == [None, 'hw_week']
+    assert finished == ['hw_week']
+    assert answered == ['sch_week']
+
+
+def test_press_under_other_message_is_not_superseded():
+    async def scenario() -> list:
+        middleware = ChatSchedulerMiddleware()
+
+        async def handler(event: CallbackQuery, data: dict) -> str:
+            await asyncio.sleep(0.02)
+            return event.data
+
+        return await asyncio.gather(
+            middleware(handler, make_callback('child 1', 1), {}),
+            middleware(handler, make_callback('hw_week', 2), {}),
+        )
+
+    assert asyncio.run(scenario()) == ['child 1', 'hw_week']
+
+
+def test_cancelling_update_propagates():
+    async def scenario() -> bool:
+        middleware = ChatSchedulerMiddleware()
+
+        async def handler(event: CallbackQuery, data: dict) -> None:
+            await asyncio.sleep(1)
+
+        task = asyncio.create_task(
+            middleware(handler, make_callback('hw_week'), {})
+        )
+        await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    assert asyncio.run(scenario())
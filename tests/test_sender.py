@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramUnauthorizedError
+
+from services.sender import INFLIGHT_KEY, OUTBOX_KEY, OutboundSender
+
+fakeredis = pytest.importorskip('fakeredis.aioredis')
+
+
+class FakeBot:
+    """Отправляет сообщения или выбрасывает error для чатов
+    из failing.
+    """
+
+    def __init__(self, failing: dict[int, Exception] | None = None):
+        self.failing = failing or {}
+        self.sent = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        if chat_id in self.failing:
+            raise self.failing[chat_id]
+        self.sent.append((chat_id, text))
+
+
+async def run_sender(sender: OutboundSender, seconds: float) -> None:
+    task = asyncio.create_task(sender.run())
+    await asyncio.sleep(seconds)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+def test_messages_sent_in_priority_order():
+    async def scenario() -> list:
+        bot = FakeBot()
+        sender = OutboundSender(
+            bot, fakeredis.FakeRedis(), rate=1000, chat_interval=0,
+            concurrency=1,
+        )
+        await sender.send_many([1, 2], 'bulk')
+        await sender.send(3, 'notify')
+        await run_sender(sender, 0.2)
+        assert await sender.redis.hlen(INFLIGHT_KEY) == 0
+        assert await sender.pending() == 0
+        return bot.sent
+
+    assert asyncio.run(scenario()) == [
+        (3, 'notify'), (1, 'bulk'), (2, 'bulk'),
+    ]
+
+
+def test_unexpected_error_drops_message():
+    async def scenario() -> OutboundSender:
+        bot = FakeBot({
+            1: TelegramUnauthorizedError(None, 'Unauthorized'),
+        })
+        sender = OutboundSender(
+            bot, fakeredis.FakeRedis(), rate=1000, chat_interval=0,
+        )
+        await sender.send_many([1, 2], 'text')
+        await sender.redis.zadd(OUTBOX_KEY, {b'not json': 0})
+        await run_sender(sender, 0.2)
+        assert await sender.redis.hlen(INFLIGHT_KEY) == 0
+        assert await sender.pending() == 0
+        assert bot.sent == [(2, 'text')]
+        return sender
+
+    stats = asyncio.run(scenario()).stats()
+    assert stats['sent'] == 1
+    assert stats['dropped'] == 2
+
+
+def test_pop_marks_message_as_taken_by_sender():
+    async def scenario() -> tuple:
+        sender = OutboundSender(FakeBot(), fakeredis.FakeRedis())
+        await sender.send(1, 'text')
+        member, score = await sender._pop()
+        value = await sender.redis.hget(INFLIGHT_KEY, member)
+        assert await sender._pop() is None
+        return score, value.decode().split(' ')
+
+    score, (stored_score, taken_at, owner) = asyncio.run(scenario())
+    assert float(stored_score) == score
+    assert float(taken_at) > 0
+    assert len(owner) == 16
+
+
+def test_recover_skips_messages_of_other_live_senders():
+    async def scenario() -> list:
+        redis = fakeredis.FakeRedis()
+        other = OutboundSender(FakeBot(), redis)
+        await other.send_many([1, 2], 'text')
+        # Другой процесс отправляет первое сообщение прямо сейчас
+        delivering, _ = await other._pop()
+        abandoned, score = await other._pop()
+        other._delivering.discard(abandoned)
+        await redis.hset(INFLIGHT_KEY, 'legacy', score)
+
+        sender = OutboundSender(FakeBot(), redis)
+        assert await sender.recover() == 1
+        assert await other.recover() == 1
+        assert await redis.hkeys(INFLIGHT_KEY) == [delivering]
+
+        sender.stale_after = 0
+        assert await sender.recover() == 1
+        return await redis.zrange(OUTBOX_KEY, 0, -1)
+
+    assert len(asyncio.run(scenario())) == 3
+
+
+def test_stopped_sender_returns_its_messages():
+    async def scenario() -> int:
+        bot = FakeBot()
+
+        async def hang(chat_id: int, text: str, **kwargs):
+            await asyncio.sleep(10)
+
+        bot.send_message = hang
+        sender = OutboundSender(bot, fakeredis.FakeRedis(), rate=1000)
+        await sender.send_many([1, 2], 'text')
+        await run_sender(sender, 0.1)
+        assert await sender.redis.hlen(INFLIGHT_KEY) == 0
+        return await sender.pending()
+
+    assert asyncio.run(scenario()) == 2
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+from ruobr_api import AuthenticationException
+
+from ruobr.sessions import RuobrSessionPool
+from ruobr.singleflight import SingleFlight
+
+
+class FakeUser:
+    def __init__(self, number: int):
+        self.number = number
+        self.child = 0
+
+
+class FakeGateway:
+    """Вход в ruobr занимает delay секунд, каждый вход - новый
+    пользователь.
+    """
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.single_flight = SingleFlight()
+        self.logins = 0
+        self.children_requests = 0
+
+    async def get_user_ruobr(self, username: str, password: str):
+        self.logins += 1
+        await asyncio.sleep(self.delay)
+        if password != 'secret':
+            return None
+        return FakeUser(self.logins)
+
+    async def get_children_for_user(self, user) -> dict[int, str]:
+        self.children_requests += 1
+        return {1: 'Иван Иванов', 2: 'Мария Иванова'}
+
+
+class FakeVault:
+    def __init__(self, credentials: dict[str, tuple[str, str]]):
+        self.credentials = credentials
+
+    async def load(self, token: str):
+        return self.credentials.get(token)
+
+
+def make_pool(**kwargs) -> tuple[RuobrSessionPool, FakeGateway]:
+    gateway = FakeGateway()
+    vault = FakeVault({
+        'token': ('user', 'secret'), 'wrong': ('user', 'bad'),
+    })
+    return RuobrSessionPool(gateway, vault, **kwargs), gateway
+
+
+def test_concurrent_misses_login_once():
+    async def scenario():
+        pool, gateway = make_pool()
+        users = await asyncio.gather(*[pool.get('token') for _ in range(3)])
+        assert gateway.logins == 1
+        assert gateway.single_flight.coalesced == 2
+        assert all(user is users[0] for user in users)
+        assert await pool.get('token') is users[0]
+        assert gateway.logins == 1
+
+    asyncio.run(scenario())
+
+
+def test_unknown_or_wrong_credentials():
+    async def scenario():
+        pool, gateway = make_pool()
+        assert await pool.get('missing') is None
+        assert gateway.logins == 0
+        assert await pool.get('wrong') is None
+        assert await pool.get('wrong') is None
+        assert gateway.logins == 2
+
+    asyncio.run(scenario())
+
+
+def test_expired_session_logs_in_again():
+    async def scenario():
+        pool, gateway = make_pool(ttl=0)
+        first = await pool.get('token')
+        second = await pool.get('token')
+        assert gateway.logins == 2
+        assert first is not second
+
+    asyncio.run(scenario())
+
+
+def test_call_retries_once_after_authentication_error():
+    async def scenario():
+        pool, gateway = make_pool()
+        seen = []
+
+        async def fetch(user):
+            seen.append(user.number)
+            if len(seen) == 1:
+                raise AuthenticationException('Сессия истекла')
+            return user.child
+
+        assert await pool.call('token', fetch, child=2) == 1
+        assert seen == [1, 2]
+        assert gateway.logins == 2
+
+        async def always_fails(user):
+            raise AuthenticationException('Проверьте логин и/или пароль')
+
+        with pytest.raises(AuthenticationException):
+            await pool.call('token', always_fails)
+
+    asyncio.run(scenario())
+
+
+def test_children_without_cache():
+    async def scenario():
+        pool, gateway = make_pool()
+        assert await pool.children('token') == {
+            1: 'Иван Иванов', 2: 'Мария Иванова',
+        }
+        assert await pool.resolve_children('token', 0) == [1, 2]
+        assert await pool.resolve_children('token', 2) == [2]
+        with pytest.raises(AuthenticationException):
+            await pool.children('missing')
+
+    asyncio.run(scenario())
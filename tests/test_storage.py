@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+
+from middlewares.storage import (
+    INVALIDATE_CHANNEL, CachedStorage, StorageFlushMiddleware,
+)
+
+fakeredis = pytest.importorskip('fakeredis.aioredis')
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+class FakeBot:
+    id = 1
+    session = AiohttpSession()
+
+
+def test_writes_deferred_until_update_handled():
+    async def scenario():
+        redis = fakeredis.FakeRedis()
+        storage = CachedStorage(RedisStorage(redis), mode='local')
+        bot = FakeBot()
+
+        async def handler(event, data):
+            await storage.set_state(bot, KEY, 'menu')
+            await storage.set_data(bot, KEY, {'child': 2})
+            # Обработчик видит свои записи, в Redis их еще нет
+            assert await storage.get_state(bot, KEY) == 'menu'
+            assert await storage.get_data(bot, KEY) == {'child': 2}
+            assert await redis.keys() == []
+            return 'handled'
+
+        middleware = StorageFlushMiddleware(storage)
+        assert await middleware(handler, None, {}) == 'handled'
+        assert storage.stats()['flushes'] == 1
+        # Другой процесс читает записанное из Redis
+        other = CachedStorage(RedisStorage(redis), mode='off')
+        assert await other.get_state(bot, KEY) == 'menu'
+        assert await other.get_data(bot, KEY) == {'child': 2}
+
+        # Пустые данные удаляют ключ
+        await middleware(
+            lambda event, data: storage.set_data(bot, KEY, {}), None, {}
+        )
+        assert await other.get_data(bot, KEY) == {}
+        assert len(await redis.keys()) == 1
+
+    asyncio.run(scenario())
+
+
+def test_cached_data_is_a_copy():
+    async def scenario():
+        storage = CachedStorage(
+            RedisStorage(fakeredis.FakeRedis()), mode='local'
+        )
+        bot = FakeBot()
+        await storage.set_data(bot, KEY, {'dates': [1]})
+        data = await storage.get_data(bot, KEY)
+        data['dates'].append(2)
+        assert await storage.get_data(bot, KEY) == {'dates': [1]}
+        assert storage.stats()['round_trips'] == 1
+
+    asyncio.run(scenario())
+
+
+def test_pubsub_invalidates_other_processes():
+    async def scenario():
+        redis = fakeredis.FakeRedis()
+        bot = FakeBot()
+        first = CachedStorage(RedisStorage(redis))
+        second = CachedStorage(RedisStorage(redis))
+        local = CachedStorage(RedisStorage(redis), mode='local')
+        await first.set_data(bot, KEY, {'child': 1})
+        # Первое чтение подписывает процесс на сообщения об изменениях
+        for storage in (first, second, local):
+            assert await storage.get_data(bot, KEY) == {'child': 1}
+        for _ in range(100):
+            subscribers = await redis.pubsub_numsub(INVALIDATE_CHANNEL)
+            if subscribers[0][1] == 2:
+                break
+            await asyncio.sleep(0.01)
+
+        await first.set_data(bot, KEY, {'child': 2})
+        for _ in range(100):
+            if second.stats()['invalidated']:
+                break
+            await asyncio.sleep(0.01)
+        assert await second.get_data(bot, KEY) == {'child': 2}
+        # Свою запись процесс не сбрасывает
+        assert first.stats()['invalidated'] == 0
+        assert await first.get_data(bot, KEY) == {'child': 2}
+        # Кэш без pubsub отдает прежнее значение до истечения ttl
+        assert await local.get_data(bot, KEY) == {'child': 1}
+        for storage in (first, second):
+            await storage.stop()
+
+    asyncio.run(scenario())
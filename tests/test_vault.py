@@ -0,0 +1,68 @@
+import asyncio
+import base64
+
+import pytest
+from cryptography.fernet import Fernet
+
+from filters.filters import UserRuobr
+from ruobr.vault import VAULT_PREFIX, CredentialVault
+
+fakeredis = pytest.importorskip('fakeredis.aioredis')
+
+OLD_KEY = Fernet.generate_key().decode()
+NEW_KEY = Fernet.generate_key().decode()
+
+
+def test_store_and_load():
+    async def scenario():
+        redis = fakeredis.FakeRedis()
+        vault = CredentialVault(redis, [NEW_KEY])
+        token = await vault.store('ivanov', 'пароль')
+        assert await vault.load(token) == UserRuobr('ivanov', 'пароль')
+        # Пароль в redis не хранится в открытом виде
+        stored = await redis.get(f'{VAULT_PREFIX}:{token}')
+        assert 'пароль'.encode() not in stored
+        await vault.delete(token)
+        assert await vault.load(token) is None
+
+    asyncio.run(scenario())
+
+
+def test_missing_keys_rejected():
+    with pytest.raises(ValueError):
+        CredentialVault(None, [])
+
+
+def test_rotation_keeps_entries_readable():
+    async def scenario():
+        redis = fakeredis.FakeRedis()
+        token = await CredentialVault(redis, [OLD_KEY]).store('ivanov', 'pw')
+        # Новый ключ первым, прежний - чтобы читать старые записи
+        vault = CredentialVault(redis, [NEW_KEY, OLD_KEY])
+        assert await vault.load(token) == UserRuobr('ivanov', 'pw')
+        assert await CredentialVault(redis, [NEW_KEY]).load(token) is None
+        await redis.set(f'{VAULT_PREFIX}:broken', b'garbage')
+        assert await vault.rotate() == 1
+        # После ротации прежний ключ больше не нужен
+        rotated = CredentialVault(redis, [NEW_KEY])
+        assert await rotated.load(token) == UserRuobr('ivanov', 'pw')
+        assert await rotated.load('broken') is None
+
+    asyncio.run(scenario())
+
+
+def test_migrate_moves_legacy_credentials():
+    async def scenario():
+        vault = CredentialVault(fakeredis.FakeRedis(), [NEW_KEY])
+        data = {
+            'username': base64.b64encode('ivanov'.encode()).decode(),
+            'password': base64.b64encode('пароль'.encode()).decode(),
+            'child': 2,
+        }
+        token = await vault.migrate(data)
+        assert data == {'token': token, 'child': 2}
+        assert await vault.load(token) == UserRuobr('ivanov', 'пароль')
+        assert await vault.migrate(data) is None
+        assert await vault.migrate({'username': 'aXZhbm92'}) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,22 @@
+from aiogram.fsm.context import FSMContext
+
+from ruobr.vault import CredentialVault
+
+
+async def get_token(
+        state: FSMContext,
+        vault: CredentialVault,
+        data: dict | None = None,
+) -> str | None:
+    """Получить токен логина и пароля из данных состояния пользователя,
+    если они еще не прочитаны в data. Логин и пароль, сохраненные
+    прежними версиями бота, переносятся в хранилище.
+    """
+    if data is None:
+        data = await state.get_data()
+    token = data.get('token')
+    if token is None:
+        token = await vault.migrate(data)
+        if token is not None:
+            await state.set_data(data)
+    return token
@@ -0,0 +1,191 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Iterator, TypeVar
+
+T = TypeVar('T')
+
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30,
+)
+
+
+class Registry:
+    """Реестр метрик в текстовом формате Prometheus.
+    Пока enabled=False, метрики ничего не делают.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._metrics: list = []
+        self._collectors: list[Callable[[], Iterator[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterator[str]]):
+        """Добавить функцию, возвращающую строки метрик при выгрузке."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def _format_labels(
+        names: tuple[str, ...],
+        values: tuple,
+        extra: str = '',
+) -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        REGISTRY.register(self)
+
+    def inc(self, *labels: Any, value: float = 1) -> None:
+        if REGISTRY.enabled:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self) -> list[str]:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} counter',
+        ]
+        for labels, value in self._values.items():
+            lines.append(
+                f'{self.name}{_format_labels(self.labels, labels)} {value}'
+            )
+        return lines
+
+
+class Histogram:
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labels: tuple = (),
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # labels -> [счетчики по корзинам..., сумма, количество]
+        self._values: dict[tuple, list[float]] = {}
+        REGISTRY.register(self)
+
+    def observe(self, value: float, *labels: Any) -> None:
+        if not REGISTRY.enabled:
+            return
+        values = self._values.get(labels)
+        if values is None:
+            values = self._values[labels] = [0] * (len(self.buckets) + 2)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    @contextmanager
+    def time(self, *labels: Any) -> Iterator[None]:
+        """Измерить время выполнения блока."""
+        if not REGISTRY.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def timed(self, *labels: Any) -> Callable:
+        """Декоратор, измеряющий время выполнения функции."""
+        def decorator(func: Callable[..., T]) -> Callable[..., T]:
+            @wraps(func)
+            def wrapper(*args, **kwargs) -> T:
+                if not REGISTRY.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, *labels)
+            return wrapper
+        return decorator
+
+    def render(self) -> list[str]:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} histogram',
+        ]
+        for labels, values in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                label_str = _format_labels(
+                    self.labels, labels, f'le="{bound}"'
+                )
+                lines.append(f'{self.name}_bucket{label_str} {cumulative}')
+            label_str = _format_labels(self.labels, labels, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{label_str} {values[-1]}')
+            label_str = _format_labels(self.labels, labels)
+            lines.append(f'{self.name}_sum{label_str} {values[-2]}')
+            lines.append(f'{self.name}_count{label_str} {values[-1]}')
+        return lines
+
+
+def gauges(prefix: str, values: dict[str, Any]) -> Iterator[str]:
+    """Строки метрик-измерителей из словаря. Строковые значения
+    выгружаются меткой state.
+    """
+    for key, value in values.items():
+        name = f'{prefix}_{key}'
+        yield f'# TYPE {name} gauge'
+        if isinstance(value, str):
+            yield f'{name}{{state="{value}"}} 1'
+        else:
+            yield f'{name} {value}'
+
+
+HANDLER_LATENCY = Histogram(
+    'bot_handler_seconds', 'Время работы обработчика', ('handler',)
+)
+RUOBR_LATENCY = Histogram(
+    'ruobr_request_seconds', 'Время запроса к ruobr', ('function',)
+)
+PARSE_LATENCY = Histogram(
+    'ruobr_parse_seconds', 'Время разбора ответа ruobr', ('model',)
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Обращения к кэшам', ('cache', 'result')
+)
+FSM_LATENCY = Histogram(
+    'fsm_storage_seconds', 'Время обращения к хранилищу FSM', ('operation',)
+)
+FSM_ROUND_TRIPS = Histogram(
+    'fsm_round_trips', 'Обращений к Redis из хранилища FSM за обновление',
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12),
+)
+TELEGRAM_LATENCY = Histogram(
+    'telegram_request_seconds', 'Время запроса к Telegram', ('method',)
+)
+RUOBR_QUEUE_WAIT = Histogram(
+    'ruobr_queue_wait_seconds', 'Ожидание слота для запроса к ruobr',
+    ('priority',),
+)
@@ -0,0 +1,29 @@
+import logging
+
+from aiohttp import web
+
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        text=REGISTRY.render(),
+        headers={'Content-Type': CONTENT_TYPE + '; charset=utf-8'},
+    )
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Запустить веб-сервер, отдающий метрики по адресу /metrics.
+    Для остановки нужно вызвать cleanup() у возвращенного runner.
+    """
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info('Metrics available on %s:%d/metrics', host, port)
+    return runner
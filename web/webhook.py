@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import signal
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from config_data.config import WebhookConfig
+from services.queue import UpdateQueue
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookHandler:
+    """Принимает обновления от Telegram и передает их в Dispatcher.
+
+    Обновление обрабатывается в фоне, Telegram сразу получает ответ.
+    При остановке сервера дожидается обработки уже принятых обновлений.
+    Если передана очередь, обновление только кладется в нее,
+    а обрабатывают его воркеры.
+    """
+
+    def __init__(
+            self,
+            dp: Dispatcher,
+            bot: Bot,
+            secret: str | None = None,
+            drain_timeout: float = 30,
+            queue: UpdateQueue | None = None,
+    ):
+        self.dp = dp
+        self.bot = bot
+        self.secret = secret
+        self.drain_timeout = drain_timeout
+        self.queue = queue
+        self._tasks: set[asyncio.Task] = set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and request.headers.get(SECRET_HEADER) != self.secret:
+            return web.Response(status=401)
+        data = await request.json(loads=self.bot.session.json_loads)
+        if self.queue is not None:
+            await self.queue.enqueue(data)
+            return web.Response()
+        task = asyncio.create_task(
+            self.dp.feed_update(self.bot, Update(**data))
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def drain(self, app: web.Application) -> None:
+        """Дождаться обработки принятых обновлений."""
+        if not self._tasks:
+            return
+        logger.info('Waiting for %d updates', len(self._tasks))
+        _, pending = await asyncio.wait(
+            self._tasks, timeout=self.drain_timeout
+        )
+        for task in pending:
+            task.cancel()
+
+
+async def run_webhook(
+        dp: Dispatcher,
+        bot: Bot,
+        config: WebhookConfig,
+        worker: int = 0,
+        queue: UpdateQueue | None = None,
+) -> None:
+    """Запустить веб-сервер для приема обновлений.
+    Каждый процесс слушает порт config.port + worker, нулевой процесс
+    регистрирует вебхук в Telegram.
+    """
+    handler = WebhookHandler(
+        dp, bot,
+        secret=config.secret,
+        drain_timeout=config.drain_timeout,
+        queue=queue,
+    )
+    app = web.Application()
+    app.router.add_post(config.path, handler.handle)
+    app.on_shutdown.append(handler.drain)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, config.host, config.port + worker)
+    await site.start()
+    logger.info(
+        'Webhook worker %d listening on %s:%d',
+        worker, config.host, config.port + worker,
+    )
+    if worker == 0:
+        await bot.set_webhook(
+            config.url + config.path, secret_token=config.secret
+        )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import multiprocessing
+import signal
+
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.redis import RedisStorage
+
+from bot import close_dispatcher, create_dispatcher
+from config_data.config import load_config, Config
+from services.queue import UpdateQueue, UpdateWorker
+from utils.logs import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+async def main(worker: int = 0):
+    setup_logging()
+
+    logger.info('Starting queue worker %d', worker)
+    config: Config = load_config()
+    bot: Bot = Bot(token=config.tg_bot.token, parse_mode='HTML')
+    storage: RedisStorage = RedisStorage.from_url(url=config.db.db_link)
+    dp: Dispatcher = create_dispatcher(config, bot, storage)
+    update_worker: UpdateWorker = UpdateWorker(
+        dp, bot,
+        UpdateQueue(storage.redis, config.queue.partitions),
+        index=worker,
+        workers=config.queue.workers,
+        concurrency=config.queue.concurrency,
+    )
+
+    metrics_runner = None
+    if config.metrics.enabled:
+        from web.metrics import start_metrics_server
+        # Порты после портов процессов вебхука
+        metrics_runner = await start_metrics_server(
+            config.metrics.host,
+            config.metrics.port + config.webhook.workers + worker,
+        )
+
+    task = asyncio.create_task(update_worker.run())
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, task.cancel)
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await storage.close()
+        await close_dispatcher(dp, bot)
+
+
+def run_worker(worker: int = 0) -> None:
+    try:
+        asyncio.run(main(worker))
+    except (KeyboardInterrupt, SystemExit):
+        logger.error('Worker %d stopped!', worker)
+
+
+if __name__ == '__main__':
+    queue_config = load_config().queue
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(worker,))
+        for worker in range(
+            queue_config.first_worker,
+            queue_config.first_worker + queue_config.local_workers,
+        )
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()